@@ -1,14 +1,22 @@
-import json
 import logging
+import mimetypes
+import uuid
 from collections.abc import AsyncIterator
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile
 from pydantic import BaseModel, Field
-
-from dependencies import get_rag_engine
+from starlette.requests import ClientDisconnect
+
+from api.streaming import EventStreamResponse, coalesce_content, sse_event
+from api.uploads import UploadTooLarge, receive_upload
+from dependencies import get_rag_engine, get_session_store
+from rag.admission import AdmissionRejected
+from rag.attachment_store import StoredAttachment
+from rag.config import settings
+from rag.openai_client import ProviderUnavailable
 from rag.rag_engine_simple import QueenRAGEngine
+from utils.session_store import SessionStore
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -23,11 +31,21 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     """Chat request model."""
     message: str = Field(..., description="User message")
-    history: list[ChatMessage] = Field(default=[], description="Chat history")
+    session_id: str | None = Field(
+        default=None,
+        max_length=64,
+        pattern=r"^[A-Za-z0-9_-]+$",
+        description="Server-side session; when set, history is loaded from the session and this turn is appended"
+    )
+    history: list[ChatMessage] = Field(default=[], description="Chat history (ignored when session_id is set)")
     use_rag: bool = Field(default=True, description="Whether to use RAG context")
     stream: bool = Field(default=True, description="Whether to stream the response")
     top_k: int | None = Field(default=None, description="Number of RAG results to use")
-    attachments: list[dict[str, Any]] | None = Field(default=None, description="File attachments")
+    attachments: list[dict[str, Any]] | None = Field(default=None, description="Inline file attachments (base64)")
+    attachment_ids: list[str] | None = Field(
+        default=None,
+        description="Attachments uploaded with POST /api/chat/attachments; reusable across turns"
+    )
 
 
 class ChatResponse(BaseModel):
@@ -35,6 +53,22 @@ class ChatResponse(BaseModel):
     response: str = Field(..., description="AI response")
     context_used: bool = Field(..., description="Whether RAG context was used")
     sources: list[str] = Field(default=[], description="Source documents used")
+    session_id: str | None = Field(default=None, description="Session the turn was stored in")
+
+
+class SessionResponse(BaseModel):
+    """Chat session with its stored turns."""
+    session_id: str = Field(..., description="Session ID")
+    history: list[ChatMessage] = Field(default=[], description="Stored turns, oldest first")
+
+
+class AttachmentResponse(BaseModel):
+    """Handle of an uploaded chat attachment."""
+    id: str = Field(..., description="Attachment ID (SHA-256 of the content), for ChatRequest.attachment_ids")
+    filename: str = Field(..., description="Name of the first upload of this content")
+    content_type: str = Field(..., description="MIME type")
+    kind: str = Field(..., description="'image' or 'document'")
+    size: int = Field(..., description="Size in bytes")
 
 
 class SearchRequest(BaseModel):
@@ -49,46 +83,101 @@ class SearchResponse(BaseModel):
     count: int = Field(..., description="Number of results")
 
 
+async def _load_history(request: ChatRequest, session_store: SessionStore) -> list[dict[str, str]]:
+    """History for this turn: from the session when one is given, else as sent by the client."""
+    if request.session_id:
+        # Unknown sessions start empty and are created when the first turn is stored
+        return await session_store.get_history(request.session_id) or []
+    return [{"role": msg.role, "content": msg.content} for msg in request.history]
+
+
+async def _stored_attachments(request: ChatRequest, rag_engine: QueenRAGEngine) -> list[StoredAttachment]:
+    """Attachments referenced by ID; an unknown or expired ID is a 404 so the client can upload it again."""
+    if not request.attachment_ids:
+        return []
+    try:
+        return await rag_engine.get_attachments(request.attachment_ids)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Attachment {e.args[0]} not found or expired") from e
+
+
+async def _store_turn(request: ChatRequest, session_store: SessionStore, answer: str) -> None:
+    """Append the user message and the answer to the request's session, if any."""
+    if not request.session_id or not answer:
+        return
+    try:
+        await session_store.append(request.session_id, [
+            {"role": "user", "content": request.message},
+            {"role": "assistant", "content": answer}
+        ])
+    except Exception as e:
+        # The answer was delivered; a lost turn shouldn't turn it into an error
+        logger.error(f"Failed to store turn for session {request.session_id}: {e}")
+
+
 @router.post("/message", response_model=ChatResponse)
 async def chat_message(
     request: ChatRequest,
-    rag_engine: QueenRAGEngine = Depends(get_rag_engine)
-) -> ChatResponse | StreamingResponse:
+    http_request: Request,
+    rag_engine: QueenRAGEngine = Depends(get_rag_engine),
+    session_store: SessionStore = Depends(get_session_store)
+) -> ChatResponse | EventStreamResponse:
     """
     Send a chat message and get a response.
     Supports both streaming and non-streaming responses.
     """
+    # Fail fast while OpenAI is down, and shed load before any work; the slot is held until the answer is complete
+    rag_engine.openai.breaker.raise_if_open()
+    stored_attachments = await _stored_attachments(request, rag_engine)
+    ticket = await rag_engine.admission.acquire("chat")
+    ticket_handed_off = False
     try:
-        # Convert history to dict format
-        history = [{"role": msg.role, "content": msg.content} for msg in request.history]
+        history = await _load_history(request, session_store)
 
         if request.stream:
             # Return streaming response
-            async def generate() -> AsyncIterator[str]:
+            answer_parts: list[str] = []
+
+            async def answer() -> AsyncIterator[str]:
+                async for chunk in rag_engine.chat(
+                    message=request.message,
+                    history=history,
+                    use_rag=request.use_rag,
+                    stream=True,
+                    conversation_id=request.session_id,
+                    stored_attachments=stored_attachments
+                ):
+                    answer_parts.append(chunk)
+                    yield chunk
+
+            async def generate() -> AsyncIterator[bytes]:
                 try:
-                    async for chunk in rag_engine.chat(
-                        message=request.message,
-                        history=history,
-                        use_rag=request.use_rag,
-                        stream=True
+                    # Format as Server-Sent Events, several deltas per frame
+                    async for frame in coalesce_content(
+                        answer(), lambda text: {'content': text}, http_request.is_disconnected
                     ):
-                        # Format as Server-Sent Events
-                        yield f"data: {json.dumps({'content': chunk})}\n\n"
+                        yield frame
+
+                    await _store_turn(request, session_store, "".join(answer_parts))
 
                     # Send done signal
-                    yield f"data: {json.dumps({'done': True})}\n\n"
+                    yield sse_event({'done': True})
 
+                except ClientDisconnect:
+                    # Generation was stopped upstream; nobody is left to send to
+                    logger.info("Client disconnected during streaming")
                 except Exception as e:
                     logger.error(f"Error during streaming: {e}")
-                    yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                    yield sse_event({'error': str(e)})
 
-            return StreamingResponse(
+            ticket_handed_off = True
+            return EventStreamResponse(
                 generate(),
-                media_type="text/event-stream",
                 headers={
                     "Cache-Control": "no-cache",
                     "X-Accel-Buffering": "no"  # Disable Nginx buffering
-                }
+                },
+                on_close=ticket.release
             )
         else:
             # Return complete response
@@ -97,10 +186,14 @@ async def chat_message(
                 message=request.message,
                 history=history,
                 use_rag=request.use_rag,
-                stream=False
+                stream=False,
+                conversation_id=request.session_id,
+                stored_attachments=stored_attachments
             ):
                 response_text += chunk
 
+            await _store_turn(request, session_store, response_text)
+
             # Get sources if RAG was used
             sources = []
             if request.use_rag:
@@ -112,12 +205,20 @@ async def chat_message(
             return ChatResponse(
                 response=response_text,
                 context_used=request.use_rag,
-                sources=sources
+                sources=sources,
+                session_id=request.session_id
             )
 
+    except (ProviderUnavailable, AdmissionRejected):
+        # Answered with 503/429 and Retry-After by the app's exception handlers
+        raise
     except Exception as e:
         logger.error(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}") from e
+    finally:
+        # A streaming response releases the slot itself when it ends
+        if not ticket_handed_off:
+            ticket.release()
 
 
 @router.post("/search", response_model=SearchResponse)
@@ -128,37 +229,47 @@ async def search_documents(
     """
     Search the knowledge base for relevant documents.
     """
-    try:
-        results = await rag_engine.search(
-            query=request.query,
-            top_k=request.top_k
-        )
+    async with rag_engine.admission.slot("search"):
+        try:
+            results = await rag_engine.search(
+                query=request.query,
+                top_k=request.top_k
+            )
 
-        return SearchResponse(
-            results=results,
-            count=len(results)
-        )
+            return SearchResponse(
+                results=results,
+                count=len(results)
+            )
 
-    except Exception as e:
-        logger.error(f"Search error: {e}")
-        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}") from e
+        except (ProviderUnavailable, AdmissionRejected):
+            # Answered with 503/429 and Retry-After by the app's exception handlers
+            raise
+        except Exception as e:
+            logger.error(f"Search error: {e}")
+            raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}") from e
 
 
 @router.post("/stream")
 async def chat_stream(
     request: ChatRequest,
-    rag_engine: QueenRAGEngine = Depends(get_rag_engine)
-) -> StreamingResponse:
+    http_request: Request,
+    rag_engine: QueenRAGEngine = Depends(get_rag_engine),
+    session_store: SessionStore = Depends(get_session_store)
+) -> EventStreamResponse:
     """
     Stream chat response using Server-Sent Events.
     This is a dedicated streaming endpoint for Assistant UI compatibility.
     """
+    # Fail fast while OpenAI is down, and shed load before any work; the slot is held until the stream ends
+    rag_engine.openai.breaker.raise_if_open()
+    stored_attachments = await _stored_attachments(request, rag_engine)
+    ticket = await rag_engine.admission.acquire("chat")
+    ticket_handed_off = False
     try:
-        # Convert history to dict format
-        history = [{"role": msg.role, "content": msg.content} for msg in request.history]
+        history = await _load_history(request, session_store)
 
         # Handle attachments if present
-        attachment_context = ""
+        document_attachments = []
         image_attachments = []
 
         logger.info(f"Received request with attachments: {bool(request.attachments)}")
@@ -180,56 +291,157 @@ async def chat_stream(
                         }
                     })
                     logger.info(f"Added image attachment: {filename}")
-                # Handle documents
+                # Handle documents: indexed for the conversation, relevant chunks are retrieved per question
                 elif attachment_type == 'document' or attachment_type == 'file':
-                    # Add to temporary context for this conversation
-                    attachment_context += f"\n\n[Attached File: {filename}]\n{file_content[:2000]}"  # Limit preview
+                    document_attachments.append({'name': filename, 'content': file_content})
                     logger.info(f"Added document attachment: {filename}")
 
-        # Build enhanced message with attachment context
-        enhanced_message = request.message
-        if attachment_context:
-            enhanced_message = f"{request.message}\n\nAttached Files Context:{attachment_context}"
+        answer_parts: list[str] = []
 
-        async def generate() -> AsyncIterator[str]:
+        async def answer() -> AsyncIterator[str]:
+            async for chunk in rag_engine.chat(
+                message=request.message,
+                history=history,
+                use_rag=request.use_rag,
+                stream=True,
+                images=image_attachments if image_attachments else None,
+                conversation_id=request.session_id,
+                attachments=document_attachments if document_attachments else None,
+                stored_attachments=stored_attachments
+            ):
+                answer_parts.append(chunk)
+                yield chunk
+
+        async def generate() -> AsyncIterator[bytes]:
             try:
                 # Send initial connection message
-                yield f"data: {json.dumps({'type': 'start'})}\n\n"
+                start_event: dict[str, Any] = {'type': 'start'}
+                if request.session_id:
+                    start_event['session_id'] = request.session_id
+                yield sse_event(start_event)
 
                 # Stream the response (with images if present)
                 if image_attachments:
                     logger.info(f"Sending {len(image_attachments)} image(s) to chat engine")
                     logger.debug(f"Image attachment format: {image_attachments[0].keys() if image_attachments else 'None'}")
 
-                async for chunk in rag_engine.chat(
-                    message=enhanced_message,
-                    history=history,
-                    use_rag=request.use_rag,
-                    stream=True,
-                    images=image_attachments if image_attachments else None
+                async for frame in coalesce_content(
+                    answer(), lambda text: {'type': 'content', 'content': text}, http_request.is_disconnected
                 ):
-                    yield f"data: {json.dumps({'type': 'content', 'content': chunk})}\n\n"
+                    yield frame
+
+                await _store_turn(request, session_store, "".join(answer_parts))
 
                 # Send completion message
-                yield f"data: {json.dumps({'type': 'done'})}\n\n"
+                yield sse_event({'type': 'done'})
 
+            except ClientDisconnect:
+                # Generation was stopped upstream; nobody is left to send to
+                logger.info("Client disconnected during streaming")
             except Exception as e:
                 logger.error(f"Streaming error: {e}")
-                yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+                yield sse_event({'type': 'error', 'error': str(e)})
 
-        return StreamingResponse(
+        ticket_handed_off = True
+        return EventStreamResponse(
             generate(),
-            media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
                 "X-Accel-Buffering": "no"
-            }
+            },
+            on_close=ticket.release
         )
 
+    except (ProviderUnavailable, AdmissionRejected):
+        # Answered with 503/429 and Retry-After by the app's exception handlers
+        raise
     except Exception as e:
         logger.error(f"Stream error: {e}")
         raise HTTPException(status_code=500, detail=f"Streaming failed: {str(e)}") from e
+    finally:
+        if not ticket_handed_off:
+            ticket.release()
+
+
+@router.post("/attachments", response_model=AttachmentResponse)
+async def upload_attachment(
+    file: UploadFile = File(...),
+    rag_engine: QueenRAGEngine = Depends(get_rag_engine)
+) -> AttachmentResponse:
+    """
+    Upload a chat attachment once and reference it by ID in chat requests.
+    Documents are extracted and images preprocessed here, not on every turn;
+    identical content always gets the same ID.
+    """
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="Filename is required")
+    content_type = file.content_type or mimetypes.guess_type(file.filename)[0] or "application/octet-stream"
+
+    async with rag_engine.admission.slot("ingest"):
+        temp_path = rag_engine.attachment_store.upload_path(uuid.uuid4().hex, file.filename)
+        try:
+            size, digest = await receive_upload(file, temp_path, settings.max_file_size_mb)
+            stored = await rag_engine.store_attachment(temp_path, digest, size, file.filename, content_type)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e)) from e
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        except Exception as e:
+            logger.error(f"Attachment upload error for {file.filename}: {e}")
+            raise HTTPException(status_code=500, detail=f"Attachment upload failed: {str(e)}") from e
+
+    return AttachmentResponse(**stored.describe())
+
+
+@router.get("/attachments/{attachment_id}", response_model=AttachmentResponse)
+async def get_attachment(
+    attachment_id: str,
+    rag_engine: QueenRAGEngine = Depends(get_rag_engine)
+) -> AttachmentResponse:
+    """
+    Check that an uploaded attachment is still available.
+    """
+    try:
+        [stored] = await rag_engine.get_attachments([attachment_id])
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Attachment {attachment_id} not found or expired") from e
+    return AttachmentResponse(**stored.describe())
+
+
+@router.post("/sessions", response_model=SessionResponse)
+async def create_session(session_store: SessionStore = Depends(get_session_store)) -> SessionResponse:
+    """
+    Create an empty chat session. Clients may also pick their own session_id;
+    it is created when the first turn is stored.
+    """
+    try:
+        session_id = await session_store.create()
+        return SessionResponse(session_id=session_id)
+    except Exception as e:
+        logger.error(f"Session create error: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to create session: {str(e)}") from e
+
+
+@router.get("/sessions/{session_id}", response_model=SessionResponse)
+async def get_session(session_id: str, session_store: SessionStore = Depends(get_session_store)) -> SessionResponse:
+    """
+    Get the stored turns of a chat session.
+    """
+    history = await session_store.get_history(session_id)
+    if history is None:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return SessionResponse(session_id=session_id, history=[ChatMessage(**turn) for turn in history])
+
+
+@router.delete("/sessions/{session_id}")
+async def delete_session(session_id: str, session_store: SessionStore = Depends(get_session_store)) -> dict[str, str]:
+    """
+    Delete a chat session and all of its turns.
+    """
+    if not await session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return {"status": "success", "session_id": session_id, "message": "Session deleted"}
 
 
 @router.get("/health")
@@ -1,13 +1,17 @@
+import asyncio
 import logging
 import shutil
+import uuid
+from collections.abc import AsyncIterator
 from pathlib import Path
 from typing import Any
 
-import aiofiles
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
+from api.streaming import ndjson_line
+from api.uploads import UploadTooLarge, receive_upload
 from dependencies import get_rag_engine
 from rag.config import settings
 from rag.rag_engine_simple import QueenRAGEngine
@@ -15,6 +19,17 @@ from rag.rag_engine_simple import QueenRAGEngine
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Bulk ingestions still running; referenced here so they finish even if their client left
+_ingestions: set[asyncio.Task[None]] = set()
+
+
+async def cancel_ingestions() -> None:
+    """Stop bulk ingestions still running, before the engine is shut down underneath them."""
+    ingestions = list(_ingestions)
+    for ingestion in ingestions:
+        ingestion.cancel()
+    await asyncio.gather(*ingestions, return_exceptions=True)
+
 
 class DocumentInfo(BaseModel):
     """Document information model."""
@@ -62,6 +77,7 @@ async def upload_document(
     Upload a document to the knowledge base.
     Supports PDF, DOCX, TXT, MD, and other text-based files.
     """
+    ticket = await rag_engine.admission.acquire("ingest")
     try:
         # Validate filename
         if not file.filename:
@@ -70,24 +86,15 @@ async def upload_document(
                 detail="Filename is required"
             )
 
-        # Check file size
-        file_size = 0
-        chunk_size = 1024 * 1024  # 1MB chunks
-
-        # Create temporary file to check size
+        # Write to a temporary file in chunks, checking the size and hashing as we go
         temp_path = Path(settings.upload_directory) / f"temp_{file.filename}"
-
-        async with aiofiles.open(temp_path, 'wb') as f:
-            while chunk := await file.read(chunk_size):
-                file_size += len(chunk)
-                if file_size > settings.max_file_size_mb * 1024 * 1024:
-                    await f.close()
-                    temp_path.unlink(missing_ok=True)
-                    raise HTTPException(
-                        status_code=413,
-                        detail=f"File size exceeds maximum of {settings.max_file_size_mb}MB"
-                    )
-                await f.write(chunk)
+        try:
+            file_size, sha256 = await receive_upload(file, temp_path, settings.max_file_size_mb)
+        except UploadTooLarge as e:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File size exceeds maximum of {settings.max_file_size_mb}MB"
+            ) from e
 
         # Move to final location
         final_path = Path(settings.upload_directory) / file.filename
@@ -121,7 +128,8 @@ async def upload_document(
         # Add to RAG engine
         result = await rag_engine.add_document(
             file_path=str(final_path),
-            metadata=metadata
+            metadata=metadata,
+            sha256=sha256
         )
 
         return DocumentUploadResponse(
@@ -141,6 +149,8 @@ async def upload_document(
         if 'final_path' in locals():
             Path(final_path).unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}") from e
+    finally:
+        ticket.release()
 
 
 @router.get("/list", response_model=DocumentListResponse)
@@ -225,91 +235,163 @@ async def download_document(
         raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}") from e
 
 
+async def _ingest_received(
+    rag_engine: QueenRAGEngine, filename: str, content_type: str | None, temp_path: Path, file_size: int, sha256: str
+) -> DocumentUploadResponse:
+    """Move a received bulk-upload file into the knowledge base and index it."""
+    try:
+        final_path = Path(settings.upload_directory) / filename
+        if final_path.exists():
+            await asyncio.to_thread(temp_path.unlink, True)
+            return DocumentUploadResponse(
+                status="exists",
+                filename=filename,
+                message="Document already exists",
+                size=file_size
+            )
+
+        await asyncio.to_thread(shutil.move, str(temp_path), str(final_path))
+
+        # Add to RAG
+        result = await rag_engine.add_document(
+            file_path=str(final_path),
+            metadata={
+                "original_filename": filename,
+                "content_type": content_type,
+                "size": file_size,
+                "bulk_upload": True
+            },
+            sha256=sha256
+        )
+
+        return DocumentUploadResponse(
+            status=result["status"],
+            filename=filename,
+            message=result["message"],
+            size=file_size
+        )
+
+    except Exception as e:
+        logger.error(f"Bulk upload error for {filename}: {e}")
+        await asyncio.to_thread(temp_path.unlink, True)
+        return DocumentUploadResponse(
+            status="error",
+            filename=filename,
+            message=f"Upload failed: {str(e)}",
+            size=file_size
+        )
+
+
 @router.post("/bulk-upload", response_model=list[DocumentUploadResponse])
 async def bulk_upload_documents(
+    request: Request,
     files: list[UploadFile] = File(...),
     rag_engine: QueenRAGEngine = Depends(get_rag_engine)
-) -> list[DocumentUploadResponse]:
+) -> list[DocumentUploadResponse] | StreamingResponse:
     """
     Upload multiple documents at once.
-    """
-    results = []
 
-    for file in files:
-        try:
-            # Validate filename
-            if not file.filename:
-                results.append(DocumentUploadResponse(
-                    status="error",
-                    filename="unknown",
-                    message="Filename is required",
-                    size=0
-                ))
-                continue
-
-            # Process each file
-            file_size = 0
-            temp_path = Path(settings.upload_directory) / f"temp_{file.filename}"
-
-            async with aiofiles.open(temp_path, 'wb') as f:
-                content = await file.read()
-                file_size = len(content)
-
-                # Check size
-                if file_size > settings.max_file_size_mb * 1024 * 1024:
-                    temp_path.unlink(missing_ok=True)
-                    results.append(DocumentUploadResponse(
+    Each file is written to disk in chunks, then up to `bulk_upload_concurrency`
+    files are extracted and embedded at a time. Results stream back as NDJSON,
+    one line per file as it finishes; clients that accept only application/json
+    get the whole list once all files are done. Ingestion carries on if the
+    client goes away.
+    """
+    ticket = await rag_engine.admission.acquire("ingest")
+    ticket_handed_off = False
+    try:
+        results: asyncio.Queue[DocumentUploadResponse | None] = asyncio.Queue()
+        received: list[tuple[str, str | None, Path, int, str]] = []
+        seen: set[str] = set()
+
+        # Copy every part out of the request first; the request's temporary files are gone once this returns
+        for file in files:
+            filename = file.filename
+            try:
+                if not filename:
+                    results.put_nowait(DocumentUploadResponse(
                         status="error",
-                        filename=file.filename,
-                        message=f"File size exceeds maximum of {settings.max_file_size_mb}MB",
-                        size=file_size
+                        filename="unknown",
+                        message="Filename is required",
+                        size=0
                     ))
                     continue
+                if filename in seen:
+                    results.put_nowait(DocumentUploadResponse(
+                        status="error",
+                        filename=filename,
+                        message="Duplicate filename in this upload",
+                        size=file.size
+                    ))
+                    continue
+                seen.add(filename)
 
-                await f.write(content)
-
-            # Move to final location
-            final_path = Path(settings.upload_directory) / file.filename
+                temp_path = Path(settings.upload_directory) / f"temp_{uuid.uuid4().hex}_{filename}"
+                file_size, sha256 = await receive_upload(file, temp_path, settings.max_file_size_mb)
+                received.append((filename, file.content_type, temp_path, file_size, sha256))
 
-            if final_path.exists():
-                temp_path.unlink()
-                results.append(DocumentUploadResponse(
-                    status="exists",
-                    filename=file.filename,
-                    message="Document already exists",
-                    size=file_size
+            except UploadTooLarge:
+                results.put_nowait(DocumentUploadResponse(
+                    status="error",
+                    filename=filename or "unknown",
+                    message=f"File size exceeds maximum of {settings.max_file_size_mb}MB",
+                    size=file.size
                 ))
-                continue
-
-            shutil.move(str(temp_path), str(final_path))
-
-            # Add to RAG
-            result = await rag_engine.add_document(
-                file_path=str(final_path),
-                metadata={
-                    "original_filename": file.filename,
-                    "content_type": file.content_type,
-                    "size": file_size,
-                    "bulk_upload": True
-                }
-            )
+            except Exception as e:
+                logger.error(f"Bulk upload error for {filename}: {e}")
+                results.put_nowait(DocumentUploadResponse(
+                    status="error",
+                    filename=filename or "unknown",
+                    message=f"Upload failed: {str(e)}"
+                ))
+            finally:
+                await file.close()
 
-            results.append(DocumentUploadResponse(
-                status=result["status"],
-                filename=file.filename,
-                message=result["message"],
-                size=file_size
-            ))
+        async def ingest_all() -> None:
+            limit = asyncio.Semaphore(max(settings.bulk_upload_concurrency, 1))
 
-        except Exception as e:
-            logger.error(f"Bulk upload error for {file.filename}: {e}")
-            results.append(DocumentUploadResponse(
-                status="error",
-                filename=file.filename or "unknown",
-                message=f"Upload failed: {str(e)}"
-            ))
+            async def ingest(item: tuple[str, str | None, Path, int, str]) -> None:
+                async with limit:
+                    results.put_nowait(await _ingest_received(rag_engine, *item))
+
+            try:
+                await asyncio.gather(*(ingest(item) for item in received))
+            except asyncio.CancelledError:
+                # Shutting down; files already moved into place are indexed by the next startup sync
+                for _filename, _content_type, temp_path, _size, _sha256 in received:
+                    temp_path.unlink(missing_ok=True)
+                raise
+            finally:
+                results.put_nowait(None)
+
+        # The ingest slot is held until the last file is indexed, however the response ends
+        ingestion = asyncio.create_task(ingest_all())
+        _ingestions.add(ingestion)
+        ingestion.add_done_callback(_ingestions.discard)
+        ingestion.add_done_callback(lambda _task: ticket.release())
+        ticket_handed_off = True
+
+        async def each_result() -> AsyncIterator[DocumentUploadResponse]:
+            while (result := await results.get()) is not None:
+                yield result
+
+        accept = request.headers.get("accept", "")
+        if "application/json" in accept and "application/x-ndjson" not in accept:
+            return [result async for result in each_result()]
+
+        async def generate() -> AsyncIterator[bytes]:
+            async for result in each_result():
+                yield ndjson_line(result.model_dump())
+
+        return StreamingResponse(
+            generate(),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
 
-    return results
+    finally:
+        if not ticket_handed_off:
+            ticket.release()
 
 
 @router.get("/stats")
@@ -8,9 +8,10 @@ import psutil
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 
-from dependencies import get_rag_engine
+from dependencies import get_rag_engine, get_session_store
 from rag.config import settings
 from rag.rag_engine_simple import QueenRAGEngine
+from utils.session_store import SessionStore
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -36,6 +37,7 @@ class DetailedHealthStatus(BaseModel):
     system: dict[str, Any]
     rag_engine: dict[str, Any]
     storage: dict[str, Any]
+    sessions: dict[str, Any]
 
 
 # Track startup time
@@ -90,7 +92,8 @@ async def health_check(
 
 @router.get("/detailed", response_model=DetailedHealthStatus)
 async def detailed_health_check(
-    rag_engine: QueenRAGEngine = Depends(get_rag_engine)
+    rag_engine: QueenRAGEngine = Depends(get_rag_engine),
+    session_store: SessionStore = Depends(get_session_store)
 ) -> DetailedHealthStatus:
     """
     Detailed health check with comprehensive metrics.
@@ -149,6 +152,7 @@ async def detailed_health_check(
             "api": "healthy",
             "rag_engine": rag_health["status"],
             "vector_store": "healthy" if rag_health["initialized"] else "initializing",
+            "indexing": rag_health["indexing"]["state"],
             "openai": "configured" if settings.openai_api_key else "not_configured"
         }
 
@@ -167,7 +171,8 @@ async def detailed_health_check(
             services=services_status,
             system=system_metrics,
             rag_engine=rag_health,
-            storage=storage_info
+            storage=storage_info,
+            sessions=session_store.stats()
         )
 
     except Exception as e:
@@ -193,8 +198,10 @@ async def readiness_check(
         if not settings.openai_api_key:
             raise HTTPException(status_code=503, detail="OpenAI API key not configured")
 
+        # Serving starts before indexing finishes; report progress so callers can tell
         return {
             "ready": True,
+            "indexing": rag_health["indexing"],
             "timestamp": datetime.now().isoformat()
         }
 
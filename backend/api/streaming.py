@@ -0,0 +1,160 @@
+"""
+Streaming response framing: Server-Sent Events for the chat endpoints (delta
+coalescing, heartbeats and disconnect detection) and NDJSON for bulk uploads.
+"""
+import asyncio
+import json
+import logging
+import math
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # Fallback to the standard library encoder
+
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
+from starlette.types import Receive, Scope, Send
+
+from rag.config import settings
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_FRAME = b": keep-alive\n\n"
+
+_END = object()
+
+
+class EventStreamResponse(StreamingResponse):
+    """
+    Streaming response that calls `on_close` once the response is over,
+    however it ends (even if the client left before the body started).
+    """
+
+    def __init__(
+        self,
+        content: AsyncIterator[bytes],
+        headers: dict[str, str] | None = None,
+        on_close: Callable[[], None] | None = None
+    ) -> None:
+        super().__init__(content, media_type="text/event-stream", headers=headers)
+        self.on_close = on_close
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+
+
+def sse_event(payload: dict[str, Any]) -> bytes:
+    """Encode one `data:` frame."""
+    if orjson is not None:
+        return b"data: " + orjson.dumps(payload) + b"\n\n"
+    return f"data: {json.dumps(payload)}\n\n".encode()
+
+
+def ndjson_line(payload: dict[str, Any]) -> bytes:
+    """Encode one newline-delimited JSON record."""
+    if orjson is not None:
+        return orjson.dumps(payload) + b"\n"
+    return f"{json.dumps(payload)}\n".encode()
+
+
+async def _pump(source: AsyncIterator[str], queue: asyncio.Queue[Any]) -> None:
+    try:
+        async for delta in source:
+            await queue.put(delta)
+        await queue.put(_END)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        await queue.put(e)
+
+
+async def coalesce_content(
+    source: AsyncIterator[str],
+    content_event: Callable[[str], dict[str, Any]],
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+    window_ms: float | None = None,
+    max_bytes: int | None = None,
+    heartbeat_seconds: float | None = None
+) -> AsyncIterator[bytes]:
+    """
+    Turn a stream of text deltas into SSE content frames.
+
+    The first delta is sent as soon as it arrives. After that, deltas are
+    buffered until `window_ms` has passed since the first buffered one or
+    the buffer reaches `max_bytes`, then sent as one frame built by
+    `content_event`. While nothing is sent for `heartbeat_seconds` (e.g.
+    during retrieval), a comment frame keeps proxies from closing the
+    connection. An error raised by the source is re-raised after the
+    buffered text has been sent.
+
+    `is_disconnected` is polled every `sse_disconnect_check_seconds`; once
+    the client is gone the source is cancelled, which closes the upstream
+    completion, and ClientDisconnect is raised.
+    """
+    window = (settings.sse_coalesce_window_ms if window_ms is None else window_ms) / 1000
+    max_bytes = settings.sse_coalesce_max_bytes if max_bytes is None else max_bytes
+    heartbeat = settings.sse_heartbeat_seconds if heartbeat_seconds is None else heartbeat_seconds
+    check_interval = settings.sse_disconnect_check_seconds
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[Any] = asyncio.Queue()
+    pump = asyncio.create_task(_pump(source, queue))
+    buffer: list[str] = []
+    buffered_bytes = 0
+    deadline = math.inf
+    last_sent = loop.time()
+    next_check = loop.time() + check_interval if is_disconnected else math.inf
+    first = True
+
+    try:
+        while True:
+            now = loop.time()
+            if now >= next_check and is_disconnected is not None:
+                next_check = now + check_interval
+                if await is_disconnected():
+                    raise ClientDisconnect()
+            if buffer and now >= deadline:
+                yield sse_event(content_event("".join(buffer)))
+                buffer, buffered_bytes, deadline, last_sent = [], 0, math.inf, loop.time()
+            elif heartbeat > 0 and now - last_sent >= heartbeat:
+                yield HEARTBEAT_FRAME
+                last_sent = loop.time()
+
+            wake = min(deadline, next_check, last_sent + heartbeat if heartbeat > 0 else math.inf)
+            try:
+                item = await asyncio.wait_for(queue.get(), None if wake == math.inf else max(wake - loop.time(), 0.0))
+            except TimeoutError:
+                continue
+
+            if item is _END or isinstance(item, Exception):
+                if buffer:
+                    yield sse_event(content_event("".join(buffer)))
+                if item is _END:
+                    return
+                raise item
+
+            if not item:
+                continue
+            if first or window <= 0:
+                first = False
+                yield sse_event(content_event(item))
+                last_sent = loop.time()
+                continue
+            if not buffer:
+                deadline = loop.time() + window
+            buffer.append(item)
+            buffered_bytes += len(item.encode("utf-8"))
+            if buffered_bytes >= max_bytes:
+                yield sse_event(content_event("".join(buffer)))
+                buffer, buffered_bytes, deadline, last_sent = [], 0, math.inf, loop.time()
+    finally:
+        if not pump.done():
+            pump.cancel()
+        await asyncio.gather(pump, return_exceptions=True)
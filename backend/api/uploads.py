@@ -0,0 +1,40 @@
+"""Multipart uploads written to disk in chunks, with a size limit and a running content hash."""
+import hashlib
+from pathlib import Path
+
+import aiofiles
+from fastapi import UploadFile
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB chunks
+
+
+class UploadTooLarge(Exception):
+    """An upload went past the size limit; nothing of it is kept."""
+
+    def __init__(self, filename: str, max_mb: int) -> None:
+        super().__init__(f"{filename} exceeds the maximum file size of {max_mb}MB")
+        self.filename = filename
+        self.max_mb = max_mb
+
+
+async def receive_upload(file: UploadFile, path: Path, max_mb: int) -> tuple[int, str]:
+    """
+    Write an uploaded file to `path` one chunk at a time, so memory use doesn't
+    depend on file size. Returns the size and SHA-256 of the content. The
+    partial file is removed if the limit is exceeded or the write fails.
+    """
+    max_bytes = max_mb * 1024 * 1024
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(path, 'wb') as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(file.filename or "upload", max_mb)
+                digest.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return size, digest.hexdigest()
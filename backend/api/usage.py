@@ -35,6 +35,8 @@ async def get_credits_usage() -> dict[str, Any]:
             "used_credits": used_tokens,
             "usage_percentage": round(usage_percentage, 2),
             "total_cost_eur": stats["total_cost_eur"],
+            "cached_tokens": stats["total_cached_tokens"],
+            "cache_savings_eur": stats["cache_savings_eur"],
             "daily_usage": stats["daily_usage"],
             "current_period": {
                 "start_date": start_date.isoformat(),
@@ -3,10 +3,14 @@
 from fastapi import HTTPException
 
 from rag.rag_engine_simple import QueenRAGEngine
+from utils.session_store import SessionStore
 
 # Initialize RAG engine as global
 rag_engine: QueenRAGEngine | None = None
 
+# Chat session store, created in the app lifespan
+session_store: SessionStore | None = None
+
 
 def get_rag_engine() -> QueenRAGEngine:
     """Get RAG engine instance."""
@@ -19,3 +23,16 @@ def set_rag_engine(engine: QueenRAGEngine) -> None:
     """Set the RAG engine instance."""
     global rag_engine
     rag_engine = engine
+
+
+def get_session_store() -> SessionStore:
+    """Get chat session store instance."""
+    if session_store is None:
+        raise HTTPException(status_code=503, detail="Session store not initialized")
+    return session_store
+
+
+def set_session_store(store: SessionStore) -> None:
+    """Set the chat session store instance."""
+    global session_store
+    session_store = store
@@ -0,0 +1,28 @@
+"""
+Gunicorn configuration for multi-worker serving.
+
+    gunicorn main:app -c gunicorn.conf.py
+
+Each worker is a Uvicorn event loop running the full app. The first worker to
+take the ingest lock indexes documents; the others serve reads from the shared
+store and reload when the published index version changes. The NumPy vector
+store backend (VECTOR_STORE_BACKEND=numpy) is recommended here: readers map its
+files directly, while Chroma readers must reopen their client to see new data,
+so without WEB_CONCURRENCY a Chroma deployment stays on a single worker.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+_default_workers = multiprocessing.cpu_count() if os.getenv("VECTOR_STORE_BACKEND") == "numpy" else 1
+workers = int(os.getenv("WEB_CONCURRENCY", _default_workers))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Long streamed chat responses must not be killed as "hung" workers
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "180"))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
@@ -11,11 +11,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from api.chat import router as chat_router
+from api.documents import cancel_ingestions
 from api.documents import router as document_router
 from api.health import router as health_router
 from api.usage import router as usage_router
-from dependencies import rag_engine as global_rag_engine
-from dependencies import set_rag_engine
+from dependencies import set_rag_engine, set_session_store
+from rag.admission import AdmissionRejected
+from rag.openai_client import ProviderUnavailable
+from utils.token_tracker import token_tracker
 
 # Load environment variables
 load_dotenv()
@@ -41,16 +44,24 @@ async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
     Path("./storage/chroma_db").mkdir(parents=True, exist_ok=True)
     Path("./storage/logs").mkdir(parents=True, exist_ok=True)
 
-    # Initialize RAG engine
+    # Initialize RAG engine (documents are indexed in the background)
+    engine = None
+    sessions = None
     try:
         from rag.config import settings
         from rag.rag_engine_simple import QueenRAGEngine
         engine = QueenRAGEngine()
         await engine.initialize()
         set_rag_engine(engine)
-        logger.info("RAG engine initialized successfully")
+        logger.info("RAG engine initialized successfully, serving while documents index")
         logger.info(f"RAG top-K results: {settings.rag_top_k_results}, similarity threshold: {settings.rag_similarity_threshold} (unused for filtering)")
-        logger.info(f"RAG chunk size: {settings.rag_chunk_size}, overlap: {settings.rag_chunk_overlap}")
+        logger.info(f"RAG chunk size: {settings.rag_chunk_min_tokens}-{settings.rag_chunk_max_tokens} tokens")
+
+        # Server-side chat sessions
+        from utils.session_store import SessionStore
+        sessions = SessionStore(settings.session_database_url, settings.session_cache_size)
+        await sessions.initialize()
+        set_session_store(sessions)
     except Exception as e:
         logger.error(f"Failed to initialize RAG engine: {e}")
         raise
@@ -59,8 +70,12 @@ async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
 
     # Shutdown
     logger.info("Shutting down Queen-RAG application...")
-    if global_rag_engine:
-        await global_rag_engine.cleanup()
+    await cancel_ingestions()
+    if engine:
+        await engine.cleanup()
+    if sessions:
+        await sessions.close()
+    token_tracker.close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -115,7 +130,25 @@ async def root() -> dict[str, Any]:
 async def http_exception_handler(_request: Request, exc: HTTPException) -> JSONResponse:
     return JSONResponse(
         status_code=exc.status_code,
-        content={"error": exc.detail}
+        content={"error": exc.detail},
+        headers=exc.headers
+    )
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(_request: Request, exc: AdmissionRejected) -> JSONResponse:
+    # Shed requests fail fast with a hint when to come back
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"error": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(ProviderUnavailable)
+async def provider_unavailable_handler(_request: Request, exc: ProviderUnavailable) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"error": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
     )
 
 @app.exception_handler(Exception)
@@ -0,0 +1,154 @@
+"""Admission control: bounded concurrency and wait queues per workload, with load shedding."""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """A request was shed: the wait queue was full (429) or the queue deadline passed (503)."""
+
+    def __init__(self, pool: str, status_code: int, retry_after: int, reason: str) -> None:
+        super().__init__(f"Too many concurrent {pool} requests: {reason}")
+        self.pool = pool
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """A held slot in a pool. Release it exactly once; further calls are ignored."""
+
+    def __init__(self, pool: "AdmissionPool") -> None:
+        self._pool = pool
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(time.monotonic() - self._started)
+
+
+class AdmissionPool:
+    """
+    At most `max_concurrent` requests run at once; up to `max_queue` more
+    wait in FIFO order for at most `queue_timeout_seconds`. Anything beyond
+    that is rejected immediately. `max_concurrent` of 0 admits everything.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout_seconds: float) -> None:
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # Moving averages, used to estimate Retry-After
+        self._avg_hold_seconds = 1.0
+        self._avg_wait_seconds = 0.0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up, from the queue length and average hold time."""
+        if self.max_concurrent <= 0:
+            return 1
+        estimate = self._avg_hold_seconds * (self.queued + 1) / self.max_concurrent
+        return min(max(math.ceil(estimate), 1), 60)
+
+    async def acquire(self) -> AdmissionTicket:
+        """Take a slot, waiting in the queue if needed; raises AdmissionRejected when shed."""
+        if self.max_concurrent <= 0 or (self.in_flight < self.max_concurrent and not self.queued):
+            self.in_flight += 1
+            self.admitted += 1
+            return AdmissionTicket(self)
+
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(self.name, 429, self.retry_after(), "wait queue is full")
+
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout_seconds)
+        except TimeoutError:
+            self.timed_out += 1
+            raise AdmissionRejected(
+                self.name, 503, self.retry_after(), f"no slot within {self.queue_timeout_seconds:g}s"
+            ) from None
+        except asyncio.CancelledError:
+            # The slot may have been handed over just as the caller gave up
+            if waiter.done() and not waiter.cancelled():
+                self._release(0.0)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+        self._avg_wait_seconds = 0.9 * self._avg_wait_seconds + 0.1 * (time.monotonic() - started)
+        self.admitted += 1
+        return AdmissionTicket(self)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        ticket = await self.acquire()
+        try:
+            yield
+        finally:
+            ticket.release()
+
+    def _release(self, held_seconds: float) -> None:
+        if held_seconds:
+            self._avg_hold_seconds = 0.9 * self._avg_hold_seconds + 0.1 * held_seconds
+        # Hand the slot straight to the next waiter so newcomers can't overtake the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_seconds": round(self._avg_wait_seconds, 3),
+            "avg_hold_seconds": round(self._avg_hold_seconds, 3)
+        }
+
+
+class AdmissionController:
+    """
+    Separate pools per workload, so a burst of chats can't starve search or
+    ingestion (and vice versa). Limits are per server process.
+    """
+
+    def __init__(self, pools: list[AdmissionPool]) -> None:
+        self.pools = {pool.name: pool for pool in pools}
+
+    async def acquire(self, pool: str) -> AdmissionTicket:
+        return await self.pools[pool].acquire()
+
+    def slot(self, pool: str) -> Any:
+        return self.pools[pool].slot()
+
+    def stats(self) -> dict[str, Any]:
+        return {name: pool.stats() for name, pool in self.pools.items()}
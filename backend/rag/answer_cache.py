@@ -0,0 +1,121 @@
+"""Semantic cache of complete chat answers for history-free questions."""
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+
+def _normalize(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def _dot(a: list[float], b: list[float]) -> float:
+    return sum(x * y for x, y in zip(a, b, strict=False))
+
+
+@dataclass
+class CachedAnswer:
+    embedding: list[float]
+    filenames: frozenset[str]
+    answer: str
+    created_at: float
+
+
+class AnswerCache:
+    """
+    Answers keyed by (model, retrieved chunk IDs), matched by query similarity.
+
+    A lookup only considers answers generated from exactly the same chunks with
+    the same model, then requires the query embeddings to be at least
+    `threshold` cosine-similar. Entries are dropped when any contributing
+    document changes.
+    """
+
+    def __init__(self, threshold: float, max_entries: int, ttl_seconds: float) -> None:
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._buckets: OrderedDict[tuple[str, tuple[str, ...]], list[CachedAnswer]] = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def lookup(self, embedding: list[float], chunk_ids: list[str], model: str) -> str | None:
+        key = (model, tuple(chunk_ids))
+        bucket = self._buckets.get(key)
+        if bucket:
+            now = time.time()
+            query = _normalize(embedding)
+            for entry in bucket:
+                if now - entry.created_at <= self.ttl_seconds and _dot(query, entry.embedding) >= self.threshold:
+                    self._buckets.move_to_end(key)
+                    self.hits += 1
+                    return entry.answer
+        self.misses += 1
+        return None
+
+    def store(
+        self,
+        embedding: list[float],
+        chunk_ids: list[str],
+        filenames: set[str],
+        model: str,
+        answer: str
+    ) -> None:
+        key = (model, tuple(chunk_ids))
+        entry = CachedAnswer(_normalize(embedding), frozenset(filenames), answer, time.time())
+        self._buckets.setdefault(key, []).append(entry)
+        self._buckets.move_to_end(key)
+        self._size += 1
+
+        while self._size > self.max_entries and self._buckets:
+            _, evicted = self._buckets.popitem(last=False)
+            self._size -= len(evicted)
+
+    def invalidate_document(self, filename: str) -> None:
+        """Drop every answer that was generated from the given document."""
+        for key in list(self._buckets):
+            bucket = self._buckets[key]
+            kept = [entry for entry in bucket if filename not in entry.filenames]
+            removed = len(bucket) - len(kept)
+            if removed:
+                self._size -= removed
+                self.invalidations += removed
+                if kept:
+                    self._buckets[key] = kept
+                else:
+                    del self._buckets[key]
+
+    def clear(self) -> None:
+        """Drop every answer, e.g. after the index was replaced by another process."""
+        self.invalidations += self._size
+        self._buckets.clear()
+        self._size = 0
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations
+        }
+
+
+def replay_chunks(answer: str, size: int = 48) -> list[str]:
+    """Split a cached answer into stream-sized pieces, breaking after whitespace where possible."""
+    pieces = []
+    start = 0
+    while start < len(answer):
+        end = min(start + size, len(answer))
+        if end < len(answer):
+            space = answer.rfind(" ", start, end)
+            if space > start:
+                end = space + 1
+        pieces.append(answer[start:end])
+        start = end
+    return pieces
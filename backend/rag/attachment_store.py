@@ -0,0 +1,135 @@
+"""Chat attachments uploaded once and referenced by content hash across turns."""
+import contextlib
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+from .images import PreparedImage
+
+logger = logging.getLogger(__name__)
+
+_ATTACHMENT_ID = re.compile(r"^[0-9a-f]{64}$")
+_SWEEP_INTERVAL_SECONDS = 600.0
+# Its own suffix, so a `.json` attachment's blob can't collide with its sidecar
+_SIDECAR_SUFFIX = ".meta.json"
+
+
+@dataclass
+class StoredAttachment:
+    id: str  # SHA-256 of the file content
+    filename: str
+    content_type: str
+    kind: str  # "image" | "document"
+    size: int
+    text: str | None = None  # Extracted text, for documents
+    image: PreparedImage | None = None  # Downsampled and recompressed, for images
+
+    def describe(self) -> dict[str, Any]:
+        """Public view of the handle, without the extracted content."""
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "content_type": self.content_type,
+            "kind": self.kind,
+            "size": self.size
+        }
+
+
+class AttachmentStore:
+    """
+    Content-addressed attachment files on disk, shared by all workers.
+
+    Each attachment is kept as `<sha256><suffix>` next to a `<sha256>.meta.json`
+    sidecar holding its metadata and the result of extraction or image
+    preprocessing, so that work happens once per file rather than once per
+    turn. Attachments unused for `ttl_seconds` are removed by `sweep`.
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.stored = 0
+        self.reused = 0
+        self.expired = 0
+        self._last_sweep = 0.0
+
+    @staticmethod
+    def valid_id(attachment_id: str) -> bool:
+        return bool(_ATTACHMENT_ID.match(attachment_id))
+
+    def _sidecar(self, attachment_id: str) -> Path:
+        return self.directory / f"{attachment_id}{_SIDECAR_SUFFIX}"
+
+    def upload_path(self, token: str, filename: str) -> Path:
+        """Where an upload in progress is written before its hash is known."""
+        return self.directory / f".upload-{token}{Path(filename).suffix.lower()}"
+
+    def blob_path(self, attachment_id: str, filename: str) -> Path:
+        # Keep the suffix; extractors are chosen by file extension
+        return self.directory / f"{attachment_id}{Path(filename).suffix.lower()}"
+
+    def get(self, attachment_id: str) -> StoredAttachment | None:
+        """Load an attachment's sidecar and mark it as used. Blocking; call off the event loop."""
+        if not self.valid_id(attachment_id):
+            return None
+        sidecar = self._sidecar(attachment_id)
+        try:
+            data = json.loads(sidecar.read_text(encoding="utf-8"))
+            os.utime(sidecar)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        image = data.pop("image", None)
+        return StoredAttachment(**data, image=PreparedImage(**image) if image else None)
+
+    def put(self, attachment: StoredAttachment, temp_path: Path) -> None:
+        """Move an uploaded file into place and write its sidecar. Blocking; call off the event loop."""
+        blob = self.blob_path(attachment.id, attachment.filename)
+        os.replace(temp_path, blob)
+        # Sidecar last, written atomically: a readable sidecar means a complete attachment
+        partial = self._sidecar(attachment.id).with_suffix(".json.tmp")
+        partial.write_text(json.dumps(asdict(attachment)), encoding="utf-8")
+        os.replace(partial, self._sidecar(attachment.id))
+        self.stored += 1
+
+    def sweep(self) -> int:
+        """Remove attachments unused for `ttl_seconds`, at most every few minutes. Blocking; call off the event loop."""
+        if time.monotonic() - self._last_sweep < _SWEEP_INTERVAL_SECONDS:
+            return 0
+        self._last_sweep = time.monotonic()
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for sidecar in self.directory.glob(f"*{_SIDECAR_SUFFIX}"):
+            attachment_id = sidecar.name.removesuffix(_SIDECAR_SUFFIX)
+            if not self.valid_id(attachment_id):
+                continue
+            try:
+                if sidecar.stat().st_mtime >= cutoff:
+                    continue
+                sidecar.unlink()
+                for blob in self.directory.glob(f"{attachment_id}*"):
+                    blob.unlink(missing_ok=True)
+                removed += 1
+            except FileNotFoundError:
+                continue  # Swept by another worker
+        for partial in self.directory.glob(".upload-*"):
+            with contextlib.suppress(FileNotFoundError):
+                if partial.stat().st_mtime < cutoff:
+                    partial.unlink()  # Left behind by a worker that died mid-upload
+        self.expired += removed
+        if removed:
+            logger.info(f"Removed {removed} expired chat attachments")
+        return removed
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "directory": str(self.directory),
+            "stored": self.stored,
+            "reused": self.reused,
+            "expired": self.expired
+        }
@@ -0,0 +1,147 @@
+"""Short-lived, per-conversation vector index of chat attachments."""
+import base64
+import binascii
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+from urllib.parse import unquote
+
+import numpy as np
+
+from .chunking import Chunk
+
+logger = logging.getLogger(__name__)
+
+
+def decode_attachment(content: str) -> bytes | str:
+    """Raw bytes of a data URL (as sent for binary files), or the content itself if it is plain text."""
+    if not content.startswith("data:") or "," not in content:
+        return content
+    header, payload = content.split(",", 1)
+    if not header.endswith(";base64"):
+        return unquote(payload)
+    try:
+        return base64.b64decode(payload)
+    except (binascii.Error, ValueError):
+        return content
+
+
+def attachment_digest(filename: str, content: str) -> str:
+    return hashlib.sha256(f"{filename}\0{content}".encode()).hexdigest()
+
+
+@dataclass
+class AttachmentChunk:
+    filename: str
+    text: str
+    section: str
+    part: int
+    total: int
+
+
+@dataclass
+class _ConversationAttachments:
+    chunks: list[AttachmentChunk] = field(default_factory=list)
+    vectors: np.ndarray | None = None  # Unit-normalised, one row per chunk
+    digests: set[str] = field(default_factory=set)
+    touched: float = field(default_factory=time.monotonic)
+
+
+class AttachmentIndex:
+    """
+    Attachment chunks and their embeddings, kept in memory per conversation.
+
+    An attachment is chunked and embedded once (keyed by a content digest) and
+    stays searchable for later turns of the same conversation until it has
+    been idle for `ttl_seconds`. Only the chunks most similar to the question
+    go into the prompt, so prompt size doesn't grow with attachment size.
+    The index is per process; with several workers a later turn may land on
+    a worker that hasn't seen the attachment.
+    """
+
+    def __init__(self, ttl_seconds: float, max_conversations: int, max_chunks: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_conversations = max_conversations
+        self.max_chunks = max_chunks
+        self._conversations: OrderedDict[str, _ConversationAttachments] = OrderedDict()
+        self.attachments_indexed = 0
+        self.chunks_indexed = 0
+        self.chunks_truncated = 0
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._conversations:
+            key, entry = next(iter(self._conversations.items()))
+            if entry.touched >= cutoff and len(self._conversations) <= self.max_conversations:
+                break
+            del self._conversations[key]
+
+    def _get(self, key: str) -> _ConversationAttachments | None:
+        self._expire()
+        entry = self._conversations.get(key)
+        if entry is not None:
+            entry.touched = time.monotonic()
+            self._conversations.move_to_end(key)
+        return entry
+
+    def has(self, key: str, digest: str | None = None) -> bool:
+        """Whether the conversation has attachments (or this particular one)."""
+        entry = self._get(key)
+        if entry is None:
+            return False
+        return digest in entry.digests if digest else bool(entry.chunks)
+
+    def remaining_chunks(self, key: str) -> int:
+        entry = self._get(key)
+        return self.max_chunks - (len(entry.chunks) if entry else 0)
+
+    def add(self, key: str, digest: str, filename: str, chunks: list[Chunk], embeddings: list[list[float]]) -> None:
+        entry = self._get(key)
+        if entry is None:
+            entry = self._conversations[key] = _ConversationAttachments()
+            self._expire()
+
+        keep = max(0, min(len(chunks), self.max_chunks - len(entry.chunks)))
+        if keep < len(chunks):
+            self.chunks_truncated += len(chunks) - keep
+            logger.warning(f"Attachment {filename}: indexing {keep} of {len(chunks)} chunks (per-conversation limit)")
+        entry.digests.add(digest)
+        if keep == 0:
+            return
+
+        vectors = np.asarray(embeddings[:keep], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        entry.vectors = vectors if entry.vectors is None else np.vstack([entry.vectors, vectors])
+        entry.chunks.extend(
+            AttachmentChunk(filename, chunk.text, chunk.section, i + 1, len(chunks))
+            for i, chunk in enumerate(chunks[:keep])
+        )
+        self.attachments_indexed += 1
+        self.chunks_indexed += keep
+
+    def search(self, key: str, query_embedding: list[float], top_k: int) -> list[tuple[AttachmentChunk, float]]:
+        """The conversation's attachment chunks most similar to the query, best first."""
+        entry = self._get(key)
+        if entry is None or entry.vectors is None or top_k <= 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        scores = entry.vectors @ query
+        best = np.argsort(-scores)[:top_k]
+        return [(entry.chunks[i], float(scores[i])) for i in best]
+
+    def discard(self, key: str) -> None:
+        self._conversations.pop(key, None)
+
+    def stats(self) -> dict[str, Any]:
+        self._expire()
+        return {
+            "conversations": len(self._conversations),
+            "chunks": sum(len(entry.chunks) for entry in self._conversations.values()),
+            "attachments_indexed": self.attachments_indexed,
+            "chunks_indexed": self.chunks_indexed,
+            "chunks_truncated": self.chunks_truncated
+        }
@@ -0,0 +1,186 @@
+"""
+Structure- and token-aware chunking.
+
+Text is parsed into markdown blocks (headings, paragraphs, tables, fenced code)
+and blocks are packed into chunks measured in embedding-model tokens. Chunks
+break at heading boundaries once they are big enough, never mid-word, and each
+chunk carries the heading path it was taken from.
+"""
+import re
+from dataclasses import dataclass
+
+from .tokens import count_tokens
+
+CHUNKER_VERSION = "markdown-tokens-v1"
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class Chunk:
+    """A chunk of document text and the section path it belongs to."""
+    text: str
+    section: str
+
+
+@dataclass
+class _Block:
+    text: str
+    section: str
+    kind: str  # heading | paragraph | table | code
+
+
+def _parse_blocks(text: str, title: str) -> list[_Block]:
+    """Split text into markdown blocks, tracking the heading path of each."""
+    blocks: list[_Block] = []
+    headings: list[tuple[int, str]] = []
+    buffer: list[str] = []
+    buffer_kind = "paragraph"
+    in_fence = False
+
+    def section() -> str:
+        return " > ".join([title] + [heading for _, heading in headings])
+
+    def flush() -> None:
+        nonlocal buffer, buffer_kind
+        block_text = "\n".join(buffer).strip()
+        if block_text:
+            blocks.append(_Block(block_text, section(), buffer_kind))
+        buffer = []
+        buffer_kind = "paragraph"
+
+    for line in text.splitlines():
+        if in_fence:
+            buffer.append(line)
+            if _FENCE_RE.match(line):
+                in_fence = False
+                flush()
+            continue
+
+        if _FENCE_RE.match(line):
+            flush()
+            buffer_kind = "code"
+            buffer.append(line)
+            in_fence = True
+            continue
+
+        heading = _HEADING_RE.match(line)
+        if heading:
+            flush()
+            level = len(heading.group(1))
+            headings = [(lvl, h) for lvl, h in headings if lvl < level]
+            headings.append((level, heading.group(2).strip()))
+            blocks.append(_Block(line.strip(), section(), "heading"))
+            continue
+
+        is_table_row = line.lstrip().startswith("|")
+        if not line.strip() or (is_table_row != (buffer_kind == "table") and buffer):
+            flush()
+        if line.strip():
+            if is_table_row:
+                buffer_kind = "table"
+            buffer.append(line)
+
+    flush()
+    return blocks
+
+
+class MarkdownChunker:
+    """Packs markdown blocks into chunks of at most max_tokens embedding tokens."""
+
+    def __init__(self, model: str, max_tokens: int, min_tokens: int) -> None:
+        self.model = model
+        self.max_tokens = max_tokens
+        self.min_tokens = min(min_tokens, max_tokens)
+
+    def _tokens(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def split(self, text: str, title: str) -> list[Chunk]:
+        chunks: list[Chunk] = []
+        parts: list[str] = []
+        part_tokens = 0
+        chunk_section = title
+
+        def flush() -> None:
+            nonlocal parts, part_tokens
+            if parts:
+                chunks.append(Chunk("\n\n".join(parts), chunk_section))
+            parts = []
+            part_tokens = 0
+
+        for block in _parse_blocks(text, title):
+            # Start a new chunk at a heading once the current one is big enough
+            if block.kind == "heading" and part_tokens >= self.min_tokens:
+                flush()
+
+            for piece in self._fit_block(block):
+                tokens = self._tokens(piece)
+                if parts and part_tokens + tokens > self.max_tokens:
+                    flush()
+                if not parts:
+                    chunk_section = block.section
+                parts.append(piece)
+                part_tokens += tokens
+
+        flush()
+        return chunks
+
+    def _fit_block(self, block: _Block) -> list[str]:
+        """Return the block as-is if it fits, otherwise split it along natural boundaries."""
+        if self._tokens(block.text) <= self.max_tokens:
+            return [block.text]
+        if block.kind in ("table", "code"):
+            return self._split_lines(block.text, repeat_header=block.kind == "table")
+        return self._pack(_SENTENCE_RE.split(block.text), " ")
+
+    def _split_lines(self, text: str, repeat_header: bool) -> list[str]:
+        """Split line-oriented blocks by line, repeating a table's header rows in each piece."""
+        lines = text.splitlines()
+        header: list[str] = []
+        if repeat_header and len(lines) > 2 and set(lines[1].replace("|", "").strip()) <= set("-: "):
+            header, lines = lines[:2], lines[2:]
+        pieces = self._pack(lines, "\n", reserved=self._tokens("\n".join(header)) if header else 0)
+        return ["\n".join(header + [piece]) if header else piece for piece in pieces]
+
+    def _pack(self, units: list[str], separator: str, reserved: int = 0) -> list[str]:
+        """Greedily pack units (sentences or lines) into pieces; split single oversized units by words."""
+        budget = max(1, self.max_tokens - reserved)
+        pieces: list[str] = []
+        current: list[str] = []
+        current_tokens = 0
+
+        for unit in units:
+            unit_tokens = self._tokens(unit)
+            if unit_tokens > budget:
+                if current:
+                    pieces.append(separator.join(current))
+                    current, current_tokens = [], 0
+                pieces.extend(self._split_words(unit, budget))
+                continue
+            if current and current_tokens + unit_tokens > budget:
+                pieces.append(separator.join(current))
+                current, current_tokens = [], 0
+            current.append(unit)
+            current_tokens += unit_tokens
+
+        if current:
+            pieces.append(separator.join(current))
+        return pieces
+
+    def _split_words(self, text: str, budget: int) -> list[str]:
+        pieces: list[str] = []
+        current: list[str] = []
+        current_tokens = 0
+        for word in text.split():
+            word_tokens = self._tokens(word + " ")
+            if current and current_tokens + word_tokens > budget:
+                pieces.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(word)
+            current_tokens += word_tokens
+        if current:
+            pieces.append(" ".join(current))
+        return pieces
@@ -20,24 +20,126 @@ class RAGSettings(BaseSettings):
     openai_api_key: str = Field(default="", validation_alias="OPENAI_API_KEY")
     openai_model: str = Field(default="gpt-4o", validation_alias="OPENAI_MODEL")
     openai_embedding_model: str = Field(default="text-embedding-3-small", validation_alias="OPENAI_EMBEDDING_MODEL")
+    openai_embedding_dimensions: int = Field(default=0, validation_alias="OPENAI_EMBEDDING_DIMENSIONS")  # 0 = model default
+
+    # OpenAI Client Settings (empty base URL = api.openai.com; the SDK retries 429/5xx with jittered backoff)
+    openai_base_url: str = Field(default="", validation_alias="OPENAI_BASE_URL")
+    openai_timeout_seconds: float = Field(default=60.0, validation_alias="OPENAI_TIMEOUT_SECONDS")
+    openai_connect_timeout_seconds: float = Field(default=5.0, validation_alias="OPENAI_CONNECT_TIMEOUT_SECONDS")
+    openai_max_retries: int = Field(default=3, validation_alias="OPENAI_MAX_RETRIES")
+    openai_max_connections: int = Field(default=100, validation_alias="OPENAI_MAX_CONNECTIONS")
+    openai_max_keepalive_connections: int = Field(default=20, validation_alias="OPENAI_MAX_KEEPALIVE_CONNECTIONS")
+    openai_keepalive_expiry_seconds: float = Field(default=30.0, validation_alias="OPENAI_KEEPALIVE_EXPIRY_SECONDS")
+    openai_hedge_delay_ms: float = Field(default=0.0, validation_alias="OPENAI_HEDGE_DELAY_MS")  # 0 = recent p95
+    openai_hedge_max_inputs: int = Field(default=16, validation_alias="OPENAI_HEDGE_MAX_INPUTS")
+    openai_breaker_failure_threshold: int = Field(default=5, validation_alias="OPENAI_BREAKER_FAILURE_THRESHOLD")
+    openai_breaker_reset_seconds: float = Field(default=30.0, validation_alias="OPENAI_BREAKER_RESET_SECONDS")
 
     # Web Search Settings (Coming Soon)
     tavily_api_key: str = Field(default="", validation_alias="TAVILY_API_KEY")
     web_search_enabled: bool = Field(default=False, validation_alias="WEB_SEARCH_ENABLED")
 
-    # Chroma Settings
+    # Vector Store Settings (backend: chroma | numpy; both persist under the Chroma directory)
+    vector_store_backend: str = Field(default="chroma", validation_alias="VECTOR_STORE_BACKEND")
+    vector_store_max_workers: int = Field(default=8, validation_alias="VECTOR_STORE_MAX_WORKERS")
     chroma_persist_directory: str = Field(default="./storage/chroma_db", validation_alias="CHROMA_PERSIST_DIRECTORY")
     chroma_collection_name: str = Field(default="queen_rag_collection", validation_alias="CHROMA_COLLECTION_NAME")
 
+    # Multi-process serving: one worker holds the ingest lock, the others poll for index changes
+    index_poll_interval_seconds: float = Field(default=2.0, validation_alias="INDEX_POLL_INTERVAL_SECONDS")
+
     # RAG Settings
-    rag_chunk_size: int = Field(default=1000, validation_alias="RAG_CHUNK_SIZE")
-    rag_chunk_overlap: int = Field(default=200, validation_alias="RAG_CHUNK_OVERLAP")
+    rag_chunk_max_tokens: int = Field(default=400, validation_alias="RAG_CHUNK_MAX_TOKENS")
+    rag_chunk_min_tokens: int = Field(default=100, validation_alias="RAG_CHUNK_MIN_TOKENS")
     rag_top_k_results: int = Field(default=5, validation_alias="RAG_TOP_K_RESULTS")
     rag_similarity_threshold: float = Field(default=0.7, validation_alias="RAG_SIMILARITY_THRESHOLD")
+    retrieval_mode: str = Field(default="hybrid", validation_alias="RETRIEVAL_MODE")  # hybrid | vector | lexical
+    rrf_k: int = Field(default=60, validation_alias="RRF_K")
+    hybrid_candidate_multiplier: int = Field(default=3, validation_alias="HYBRID_CANDIDATE_MULTIPLIER")
+
+    # Chat Settings (input budget covers system prompt, retrieved context, history and message)
+    chat_input_token_budget: int = Field(default=12_000, validation_alias="CHAT_INPUT_TOKEN_BUDGET")
+
+    # History Summarization (older turns are folded into a rolling summary past the threshold)
+    history_summary_enabled: bool = Field(default=True, validation_alias="HISTORY_SUMMARY_ENABLED")
+    history_summary_model: str = Field(default="gpt-4o-mini", validation_alias="HISTORY_SUMMARY_MODEL")
+    history_summary_threshold_turns: int = Field(default=12, validation_alias="HISTORY_SUMMARY_THRESHOLD_TURNS")
+    history_summary_keep_recent_turns: int = Field(default=6, validation_alias="HISTORY_SUMMARY_KEEP_RECENT_TURNS")
+    history_summary_max_tokens: int = Field(default=500, validation_alias="HISTORY_SUMMARY_MAX_TOKENS")
+    history_summary_cache_size: int = Field(default=1000, validation_alias="HISTORY_SUMMARY_CACHE_SIZE")
+
+    # Chat Attachment Settings (attachments are chunked and embedded per conversation, top-k chunks go in the prompt;
+    # uploaded attachments are kept by content hash until unused for the store TTL)
+    attachment_top_k: int = Field(default=4, validation_alias="ATTACHMENT_TOP_K")
+    attachment_ttl_seconds: float = Field(default=3600.0, validation_alias="ATTACHMENT_TTL_SECONDS")
+    attachment_max_conversations: int = Field(default=256, validation_alias="ATTACHMENT_MAX_CONVERSATIONS")
+    attachment_max_chunks: int = Field(default=2000, validation_alias="ATTACHMENT_MAX_CHUNKS")
+    attachment_store_directory: str = Field(default="./storage/attachments", validation_alias="ATTACHMENT_STORE_DIRECTORY")
+    attachment_store_ttl_seconds: float = Field(default=7 * 86400.0, validation_alias="ATTACHMENT_STORE_TTL_SECONDS")
+
+    # Image Attachment Settings (detail: auto | low | high; images are downsampled to the model's tiers and recompressed)
+    image_detail: str = Field(default="auto", validation_alias="IMAGE_DETAIL")
+    image_edge_density_threshold: float = Field(default=0.04, validation_alias="IMAGE_EDGE_DENSITY_THRESHOLD")
+    image_jpeg_quality: int = Field(default=85, validation_alias="IMAGE_JPEG_QUALITY")
+    image_tile_snap_tolerance: float = Field(default=0.05, validation_alias="IMAGE_TILE_SNAP_TOLERANCE")
+    image_cache_max_entries: int = Field(default=512, validation_alias="IMAGE_CACHE_MAX_ENTRIES")
+    image_cache_max_mb: int = Field(default=64, validation_alias="IMAGE_CACHE_MAX_MB")
+    image_cache_ttl_seconds: float = Field(default=3600.0, validation_alias="IMAGE_CACHE_TTL_SECONDS")
+
+    # Chat Session Settings (any SQLAlchemy async URL; hot sessions are cached in memory)
+    session_database_url: str = Field(
+        default="sqlite+aiosqlite:///./storage/sessions.db", validation_alias="SESSION_DATABASE_URL"
+    )
+    session_cache_size: int = Field(default=512, validation_alias="SESSION_CACHE_SIZE")
+
+    # Streaming Settings (deltas are coalesced into one SSE frame per window or size limit; 0 disables)
+    sse_coalesce_window_ms: float = Field(default=30.0, validation_alias="SSE_COALESCE_WINDOW_MS")
+    sse_coalesce_max_bytes: int = Field(default=512, validation_alias="SSE_COALESCE_MAX_BYTES")
+    sse_heartbeat_seconds: float = Field(default=15.0, validation_alias="SSE_HEARTBEAT_SECONDS")
+    sse_disconnect_check_seconds: float = Field(default=0.5, validation_alias="SSE_DISCONNECT_CHECK_SECONDS")
+
+    # Admission Control Settings (per worker; requests past the queue are shed with Retry-After; 0 = unlimited)
+    admission_chat_max_concurrent: int = Field(default=16, validation_alias="ADMISSION_CHAT_MAX_CONCURRENT")
+    admission_chat_max_queue: int = Field(default=32, validation_alias="ADMISSION_CHAT_MAX_QUEUE")
+    admission_chat_queue_timeout_seconds: float = Field(default=10.0, validation_alias="ADMISSION_CHAT_QUEUE_TIMEOUT_SECONDS")
+    admission_search_max_concurrent: int = Field(default=32, validation_alias="ADMISSION_SEARCH_MAX_CONCURRENT")
+    admission_search_max_queue: int = Field(default=64, validation_alias="ADMISSION_SEARCH_MAX_QUEUE")
+    admission_search_queue_timeout_seconds: float = Field(default=5.0, validation_alias="ADMISSION_SEARCH_QUEUE_TIMEOUT_SECONDS")
+    admission_ingest_max_concurrent: int = Field(default=2, validation_alias="ADMISSION_INGEST_MAX_CONCURRENT")
+    admission_ingest_max_queue: int = Field(default=16, validation_alias="ADMISSION_INGEST_MAX_QUEUE")
+    admission_ingest_queue_timeout_seconds: float = Field(default=60.0, validation_alias="ADMISSION_INGEST_QUEUE_TIMEOUT_SECONDS")
+
+    # Retrieval Cache Settings
+    retrieval_cache_enabled: bool = Field(default=True, validation_alias="RETRIEVAL_CACHE_ENABLED")
+    retrieval_cache_ttl_seconds: float = Field(default=600.0, validation_alias="RETRIEVAL_CACHE_TTL_SECONDS")
+    retrieval_cache_max_entries: int = Field(default=2048, validation_alias="RETRIEVAL_CACHE_MAX_ENTRIES")
+    query_embedding_cache_max_mb: int = Field(default=64, validation_alias="QUERY_EMBEDDING_CACHE_MAX_MB")
+    result_cache_max_mb: int = Field(default=32, validation_alias="RESULT_CACHE_MAX_MB")
 
-    # Document Settings
+    # Semantic Answer Cache Settings (opt-in)
+    answer_cache_enabled: bool = Field(default=False, validation_alias="ANSWER_CACHE_ENABLED")
+    answer_cache_similarity_threshold: float = Field(default=0.95, validation_alias="ANSWER_CACHE_SIMILARITY_THRESHOLD")
+    answer_cache_max_entries: int = Field(default=1000, validation_alias="ANSWER_CACHE_MAX_ENTRIES")
+    answer_cache_ttl_seconds: float = Field(default=86400.0, validation_alias="ANSWER_CACHE_TTL_SECONDS")
+
+    # Embedding Pipeline Settings
+    embedding_batch_max_tokens: int = Field(default=100_000, validation_alias="EMBEDDING_BATCH_MAX_TOKENS")
+    embedding_batch_max_inputs: int = Field(default=512, validation_alias="EMBEDDING_BATCH_MAX_INPUTS")
+    embedding_concurrency: int = Field(default=4, validation_alias="EMBEDDING_CONCURRENCY")
+    embedding_cache_enabled: bool = Field(default=True, validation_alias="EMBEDDING_CACHE_ENABLED")
+    embedding_cache_path: str = Field(default="./storage/embedding_cache.db", validation_alias="EMBEDDING_CACHE_PATH")
+    embedding_cache_max_entries: int = Field(default=20_000, validation_alias="EMBEDDING_CACHE_MAX_ENTRIES")
+
+    # Document Settings (bulk uploads ingest up to this many files at once)
     upload_directory: str = Field(default="./storage/documents", validation_alias="UPLOAD_DIRECTORY")
     max_file_size_mb: int = Field(default=50, validation_alias="MAX_FILE_SIZE_MB")
+    bulk_upload_concurrency: int = Field(default=4, validation_alias="BULK_UPLOAD_CONCURRENCY")
+
+    # Extraction Settings (0 workers = one per CPU core; the timeout counts from when a worker starts a task)
+    extraction_max_workers: int = Field(default=0, validation_alias="EXTRACTION_MAX_WORKERS")
+    extraction_timeout_seconds: float = Field(default=120.0, validation_alias="EXTRACTION_TIMEOUT_SECONDS")
+    extraction_memory_limit_mb: int = Field(default=1024, validation_alias="EXTRACTION_MEMORY_LIMIT_MB")
+    extraction_pdf_pages_per_task: int = Field(default=8, validation_alias="EXTRACTION_PDF_PAGES_PER_TASK")
 
     # System Settings
     environment: str = Field(default="development", validation_alias="ENVIRONMENT")
@@ -58,8 +160,8 @@ def get_raglight_config() -> dict[str, Any]:
         "llm_model": settings.openai_model,
         "embedding_provider": "openai",
         "embedding_model": settings.openai_embedding_model,
-        "chunk_size": settings.rag_chunk_size,
-        "chunk_overlap": settings.rag_chunk_overlap,
+        "chunk_max_tokens": settings.rag_chunk_max_tokens,
+        "chunk_min_tokens": settings.rag_chunk_min_tokens,
         "top_k": settings.rag_top_k_results,
         "temperature": 0.7,
         "max_tokens": 2000,
@@ -0,0 +1,116 @@
+"""Fit chat prompts into a fixed input-token budget."""
+import logging
+from dataclasses import dataclass, field
+from typing import Any
+
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Chat formatting adds a few tokens per message on top of its content
+MESSAGE_OVERHEAD_TOKENS = 4
+# Separator between context sections ("\n\n---\n\n")
+SECTION_SEPARATOR_TOKENS = 3
+
+
+@dataclass
+class PackedContext:
+    """What fitted into the budget, and what had to be left out."""
+    context_parts: list[str] = field(default_factory=list)
+    history: list[dict[str, Any]] = field(default_factory=list)
+    prompt_tokens: int = 0
+    dropped_tokens: int = 0
+    dropped_chunks: int = 0
+    dropped_turns: int = 0
+
+
+class ContextPacker:
+    """
+    Token-budgeted prompt assembly with fixed priorities.
+
+    The system prompt and current message are always sent. Remaining budget
+    goes to retrieved chunks in rank order (a chunk that doesn't fit is
+    skipped in favour of smaller, lower-ranked ones), then to history from
+    the most recent turn backwards. History is cut at the first turn that
+    doesn't fit, so the model never sees a conversation with gaps.
+    """
+
+    def __init__(self, model: str, budget_tokens: int) -> None:
+        self.model = model
+        self.budget_tokens = budget_tokens
+        self.requests = 0
+        self.requests_trimmed = 0
+        self.total_dropped_tokens = 0
+
+    def count(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def message_tokens(self, message: dict[str, Any]) -> int:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            # Multimodal content: only text parts are counted here
+            content = " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+        return self.count(content) + MESSAGE_OVERHEAD_TOKENS
+
+    def pack(
+        self,
+        system_prompt: str,
+        message: str,
+        context_parts: list[str],
+        context_overhead: str,
+        history: list[dict[str, Any]]
+    ) -> PackedContext:
+        """
+        Choose the context sections and history turns to send.
+
+        `context_overhead` is the context message without any sections (the
+        framing and instructions); it is only paid for if a section fits.
+        """
+        packed = PackedContext()
+        used = (
+            self.count(system_prompt) + self.count(message) + 2 * MESSAGE_OVERHEAD_TOKENS
+        )
+
+        # Retrieved chunks, best first
+        part_tokens = [self.count(part) + SECTION_SEPARATOR_TOKENS for part in context_parts]
+        if context_parts:
+            overhead = self.count(context_overhead) + MESSAGE_OVERHEAD_TOKENS
+            for part, tokens in zip(context_parts, part_tokens, strict=True):
+                cost = tokens + (overhead if not packed.context_parts else 0)
+                if used + cost <= self.budget_tokens:
+                    packed.context_parts.append(part)
+                    used += cost
+                else:
+                    packed.dropped_chunks += 1
+                    packed.dropped_tokens += tokens
+
+        # History, newest turn first, stopping at the first turn that doesn't fit
+        kept_turns = 0
+        for turn in reversed(history):
+            tokens = self.message_tokens(turn)
+            if used + tokens > self.budget_tokens:
+                break
+            used += tokens
+            kept_turns += 1
+        packed.history = history[len(history) - kept_turns:]
+        packed.dropped_turns = len(history) - kept_turns
+        packed.dropped_tokens += sum(self.message_tokens(turn) for turn in history[:packed.dropped_turns])
+
+        packed.prompt_tokens = used
+        self.requests += 1
+        if packed.dropped_tokens:
+            self.requests_trimmed += 1
+            self.total_dropped_tokens += packed.dropped_tokens
+            logger.info(
+                f"Context packing dropped {packed.dropped_tokens} tokens "
+                f"({packed.dropped_chunks} chunks, {packed.dropped_turns} turns) to fit {self.budget_tokens}"
+            )
+        return packed
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "budget_tokens": self.budget_tokens,
+            "requests": self.requests,
+            "requests_trimmed": self.requests_trimmed,
+            "dropped_tokens": self.total_dropped_tokens
+        }
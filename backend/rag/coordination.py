@@ -0,0 +1,92 @@
+"""
+Coordination between server worker processes sharing one index directory.
+
+Exactly one process - the ingestion leader - writes to the index. Leadership
+is an exclusive flock on a lock file, so it is released automatically when the
+leader exits and another worker can take over. The leader publishes an index
+version file after every change; followers poll it and reload read-only.
+"""
+import fcntl
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import IO
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionLeadership:
+    """Non-blocking exclusive file lock that designates the ingestion leader."""
+
+    def __init__(self, lock_path: Path) -> None:
+        self.lock_path = lock_path
+        self._handle: IO[str] | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._handle is not None
+
+    def try_acquire(self) -> bool:
+        """Try to become leader; returns True if this process holds the lock."""
+        if self._handle is not None:
+            return True
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        handle = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(str(os.getpid()))
+        handle.flush()
+        self._handle = handle
+        return True
+
+    def release(self) -> None:
+        if self._handle is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+            self._handle.close()
+            self._handle = None
+
+
+class IndexVersionFile:
+    """Small JSON file holding the latest published index version."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def read(self) -> int:
+        try:
+            with open(self.path) as f:
+                return int(json.load(f).get("version", 0))
+        except (FileNotFoundError, ValueError, json.JSONDecodeError):
+            return 0
+
+    def publish(self, version: int) -> None:
+        """Atomically write a new version (write to a temp file, then rename)."""
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"version": version, "updated_at": time.time(), "pid": os.getpid()}, f)
+        os.replace(tmp_path, self.path)
+
+
+class SyncRequest:
+    """Marker file followers touch to ask the leader to re-sync the documents directory."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def request(self) -> None:
+        self.path.touch()
+
+    def consume(self) -> bool:
+        """Return True (and clear the marker) if a sync was requested."""
+        try:
+            self.path.unlink()
+            return True
+        except FileNotFoundError:
+            return False
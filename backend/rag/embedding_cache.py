@@ -0,0 +1,165 @@
+"""Persistent SQLite cache of embeddings keyed by model, dimensions and content hash."""
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Any
+
+from .embeddings import Embedder
+
+logger = logging.getLogger(__name__)
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Size-bounded LRU cache of embedding vectors in SQLite.
+
+    Vectors are stored as float32 blobs. When the cache grows past max_entries
+    the least recently used tenth is evicted in one statement.
+    """
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                text_sha256 TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, dimensions, text_sha256)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, dimensions: int, hashes: list[str]) -> dict[str, list[float]]:
+        """Look up vectors by content hash; found entries are marked as recently used."""
+        found: dict[str, list[float]] = {}
+        if not hashes:
+            return found
+
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_sha256, vector FROM embeddings "
+                    f"WHERE model = ? AND dimensions = ? AND text_sha256 IN ({placeholders})",
+                    [model, dimensions, *batch]
+                ).fetchall()
+                for digest, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[digest] = vector.tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND dimensions = ? AND text_sha256 = ?",
+                    [(now, model, dimensions, digest) for digest in found]
+                )
+                self._conn.commit()
+
+            self.hits += sum(1 for digest in hashes if digest in found)
+            self.misses += sum(1 for digest in hashes if digest not in found)
+
+        return found
+
+    def put_many(self, model: str, dimensions: int, items: dict[str, list[float]]) -> None:
+        """Store vectors by content hash, evicting least recently used entries if over capacity."""
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, dimensions, text_sha256, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (model, dimensions, digest, array("f", vector).tobytes(), now)
+                    for digest, vector in items.items()
+                ]
+            )
+            self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+            if self._entries > self.max_entries:
+                evict = self._entries - int(self.max_entries * 0.9)
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (evict,)
+                )
+                self._entries -= evict
+                self.evictions += evict
+
+            self._conn.commit()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbedder:
+    """Embedder wrapper that serves repeated texts from the persistent cache."""
+
+    def __init__(self, embedder: Embedder, cache: EmbeddingCache, dimensions: int = 0) -> None:
+        self.embedder = embedder
+        self.cache = cache
+        self.model = embedder.model
+        self.dimensions = dimensions
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+
+        hashes = [text_sha256(text) for text in texts]
+        cached = await asyncio.to_thread(self.cache.get_many, self.model, self.dimensions, hashes)
+
+        # Embed each distinct missing text once
+        missing: dict[str, str] = {}
+        for digest, text in zip(hashes, texts, strict=True):
+            if digest not in cached:
+                missing.setdefault(digest, text)
+
+        if missing:
+            vectors = await self.embedder.embed(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors, strict=True))
+            await asyncio.to_thread(self.cache.put_many, self.model, self.dimensions, fresh)
+            cached.update(fresh)
+
+        return [cached[digest] for digest in hashes]
@@ -0,0 +1,115 @@
+"""Embedding generation and the batched ingestion pipeline."""
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Sequence
+from typing import Any, Protocol
+
+from .openai_client import OpenAIClient
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Async sink that persists one embedded batch (ids, embeddings, documents, metadatas)
+BatchWriter = Callable[[list[str], list[list[float]], list[str], list[dict[str, Any]]], Awaitable[None]]
+
+
+class Embedder(Protocol):
+    """Anything that turns texts into vectors for a given model."""
+    model: str
+
+    async def embed(self, texts: list[str]) -> list[list[float]]: ...
+
+
+class OpenAIEmbedder:
+    """Async embedding client - never blocks the event loop."""
+
+    def __init__(self, client: OpenAIClient, model: str, dimensions: int = 0) -> None:
+        self.client = client
+        self.model = model
+        self.dimensions = dimensions
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """Embed a list of texts in a single API request."""
+        if not texts:
+            return []
+        extra: dict[str, Any] = {"dimensions": self.dimensions} if self.dimensions else {}
+        response = await self.client.create_embeddings(model=self.model, input=texts, **extra)
+        # The API returns items with an index; keep input order regardless of response order
+        ordered = sorted(response.data, key=lambda item: item.index)
+        return [item.embedding for item in ordered]
+
+
+def batch_by_tokens(texts: Sequence[str], model: str, max_tokens: int, max_inputs: int) -> list[range]:
+    """
+    Pack consecutive texts into batches bounded by token count and input count.
+    Returns index ranges into texts; a single oversized text gets its own batch.
+    """
+    batches: list[range] = []
+    start = 0
+    batch_tokens = 0
+
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text, model)
+        if i > start and (batch_tokens + tokens > max_tokens or i - start >= max_inputs):
+            batches.append(range(start, i))
+            start = i
+            batch_tokens = 0
+        batch_tokens += tokens
+
+    if start < len(texts):
+        batches.append(range(start, len(texts)))
+
+    return batches
+
+
+class EmbeddingPipeline:
+    """
+    Embeds chunks in token-bounded batches with bounded concurrency.
+
+    Embedding calls are async HTTP requests and each finished batch is handed to
+    an async writer, so ingestion never stalls the event loop.
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        max_batch_tokens: int,
+        max_batch_inputs: int,
+        concurrency: int
+    ) -> None:
+        self.embedder = embedder
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_inputs = max_batch_inputs
+        self.concurrency = max(1, concurrency)
+
+    async def run(
+        self,
+        ids: list[str],
+        documents: list[str],
+        metadatas: list[dict[str, Any]],
+        write: BatchWriter,
+        on_batch: Callable[[int], None] | None = None
+    ) -> int:
+        """Embed and write all chunks. Returns the number of chunks written."""
+        batches = batch_by_tokens(documents, self.embedder.model, self.max_batch_tokens, self.max_batch_inputs)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def process(batch: range) -> int:
+            async with semaphore:
+                texts = documents[batch.start:batch.stop]
+                embeddings = await self.embedder.embed(texts)
+            await write(ids[batch.start:batch.stop], embeddings, texts, metadatas[batch.start:batch.stop])
+            if on_batch:
+                on_batch(len(batch))
+            return len(batch)
+
+        tasks = [asyncio.create_task(process(batch)) for batch in batches]
+        try:
+            written = sum(await asyncio.gather(*tasks))
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        logger.debug(f"Embedded {written} chunks in {len(batches)} batches")
+        return written
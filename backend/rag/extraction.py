@@ -0,0 +1,220 @@
+"""
+Document text extraction.
+
+PDF and DOCX parsing is CPU-bound, so it runs in a process pool: PDFs are split
+into page ranges extracted in parallel, every task gets a timeout counted from
+when a worker starts it (not while it waits in the pool's queue), and worker
+processes run under an address-space cap so a pathological file can't take the
+server down with it. Replacing the pool after a worker crash interrupts other
+files' extractions; those are retried on the new pool.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import weakref
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, TypeVar
+
+from docx import Document
+from pypdf import PdfReader
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# A file is tried at most this many times when pool restarts interrupt it
+_MAX_ATTEMPTS = 3
+
+
+class ExtractionError(Exception):
+    """Raised when a document cannot be extracted within the configured limits."""
+
+
+class _TaskTimeout(Exception):
+    """Raised inside a worker when a task runs past its deadline."""
+
+
+def _init_worker(memory_limit_mb: int) -> None:
+    """Apply the per-process memory cap (Linux/macOS only)."""
+    if memory_limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        logger.warning(f"Could not apply extraction memory limit: {e}")
+
+
+def _run_with_deadline(timeout_seconds: float, func: Callable[..., T], *args: Any) -> T:
+    """
+    Run `func` in a worker under a wall-clock deadline that starts now, so time
+    spent queued behind other files doesn't count against it. The worker
+    survives the timeout and moves on to its next task (Linux/macOS only).
+    """
+    if timeout_seconds <= 0 or not hasattr(signal, "setitimer"):
+        return func(*args)
+
+    def expire(_signum: int, _frame: Any) -> None:
+        raise _TaskTimeout(f"{func.__name__} ran for more than {timeout_seconds:.0f}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, timeout_seconds)
+    try:
+        return func(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def count_pdf_pages(file_path: str) -> int:
+    return len(PdfReader(file_path).pages)
+
+
+def extract_pdf_pages(file_path: str, start: int, stop: int) -> list[str]:
+    """Extract text from pages [start, stop) of a PDF."""
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+def extract_docx(file_path: str) -> str:
+    doc = Document(file_path)
+    return '\n'.join(para.text for para in doc.paragraphs)
+
+
+def extract_plain_text(file_path: str) -> str:
+    """Read a text file (MD, TXT, etc.), falling back to latin-1 if it isn't UTF-8."""
+    try:
+        with open(file_path, encoding='utf-8') as f:
+            return f.read()
+    except UnicodeDecodeError:
+        logger.warning(f"UTF-8 decode failed for {Path(file_path).name}, trying latin-1")
+        with open(file_path, encoding='latin-1') as f:
+            return f.read()
+
+
+def extract_text(file_path: str) -> str:
+    """
+    Extract content from various file formats, synchronously.
+    Supports: PDF, DOCX, TXT, MD, and other text files.
+    """
+    suffix = Path(file_path).suffix.lower()
+    if suffix == '.pdf':
+        return '\n'.join(extract_pdf_pages(file_path, 0, count_pdf_pages(file_path)))
+    if suffix == '.docx':
+        return extract_docx(file_path)
+    return extract_plain_text(file_path)
+
+
+class DocumentExtractor:
+    """Async front end to the extraction process pool."""
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        timeout_seconds: float = 120.0,
+        memory_limit_mb: int = 1024,
+        pdf_pages_per_task: int = 8
+    ) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout_seconds = timeout_seconds
+        self.memory_limit_mb = memory_limit_mb
+        self.pdf_pages_per_task = max(1, pdf_pages_per_task)
+        self._pool: ProcessPoolExecutor | None = None
+        # Pools terminated on purpose; their other tasks fail with BrokenProcessPool through no fault of their own
+        self._killed: weakref.WeakSet[ProcessPoolExecutor] = weakref.WeakSet()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn, not fork: the server process has live threads (event loop, Chroma)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.memory_limit_mb,)
+            )
+        return self._pool
+
+    def _reset_pool(self, pool: ProcessPoolExecutor) -> None:
+        """Kill a broken pool's remaining workers; later calls get a new pool."""
+        if self._pool is pool:
+            self._pool = None
+        if pool in self._killed:
+            return
+        self._killed.add(pool)
+        # ProcessPoolExecutor has no public way to abort running tasks
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def extract(self, file_path: str) -> str:
+        """
+        Extract a document's text, enforcing the per-task timeout.
+
+        A timeout fails only this file; the worker stays up for the others.
+        When a worker crash breaks the pool, it is unknown whose task caused
+        it, so each affected file is retried once on a new pool; a file that
+        crashes the pool again is the one reported as failed.
+        """
+        suffix = Path(file_path).suffix.lower()
+        if suffix not in ('.pdf', '.docx'):
+            return await asyncio.to_thread(extract_plain_text, file_path)
+
+        crashes = 0
+        for _attempt in range(_MAX_ATTEMPTS):
+            pool = self._get_pool()
+            try:
+                return await self._extract_in_pool(pool, file_path, suffix)
+            except _TaskTimeout as e:
+                raise ExtractionError(
+                    f"Extraction of {Path(file_path).name} timed out after {self.timeout_seconds:.0f}s"
+                ) from e
+            except MemoryError as e:
+                # Raised inside the worker, which survives it; only this file is at fault
+                raise ExtractionError(
+                    f"Extraction of {Path(file_path).name} exceeded the {self.memory_limit_mb}MB memory limit"
+                ) from e
+            except BrokenProcessPool as e:
+                if pool not in self._killed:
+                    crashes += 1
+                    self._reset_pool(pool)
+                if crashes >= 2:
+                    raise ExtractionError(
+                        f"Extraction of {Path(file_path).name} crashed its worker "
+                        f"(possibly exceeding the {self.memory_limit_mb}MB memory limit)"
+                    ) from e
+                logger.info(f"Extraction pool was restarted, retrying {Path(file_path).name}")
+
+        raise ExtractionError(f"Extraction of {Path(file_path).name} was interrupted {_MAX_ATTEMPTS} times")
+
+    def _submit(self, pool: ProcessPoolExecutor, func: Callable[..., T], *args: Any) -> asyncio.Future[T]:
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(pool, _run_with_deadline, self.timeout_seconds, func, *args)
+
+    async def _extract_in_pool(self, pool: ProcessPoolExecutor, file_path: str, suffix: str) -> str:
+        if suffix == '.docx':
+            return await self._submit(pool, extract_docx, file_path)
+
+        page_count = await self._submit(pool, count_pdf_pages, file_path)
+        tasks = [
+            self._submit(pool, extract_pdf_pages, file_path, start, min(start + self.pdf_pages_per_task, page_count))
+            for start in range(0, page_count, self.pdf_pages_per_task)
+        ]
+        try:
+            parts = await asyncio.gather(*tasks)
+        except BaseException:
+            # The file has failed; don't leave its queued page ranges in other files' way
+            for task in tasks:
+                task.cancel()
+            raise
+        return '\n'.join(page for pages in parts for page in pages)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,253 @@
+"""Image attachment preprocessing: downsample to the vision model's tiers, strip metadata, recompress."""
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any
+
+from .retrieval_cache import TTLCache
+
+try:
+    from PIL import Image, ImageFilter, ImageOps
+except ImportError:
+    Image = None  # Images are then forwarded as sent
+
+logger = logging.getLogger(__name__)
+
+# gpt-4o vision tiers: "high" fits the image in 2048x2048, scales the short side
+# down to 768 and bills 170 tokens per 512px tile plus 85; "low" is 512x512 for 85
+HIGH_DETAIL_MAX_SIDE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+TILE_SIZE = 512
+LOW_DETAIL_SIDE = 512
+BASE_TOKENS = 85
+TILE_TOKENS = 170
+
+
+def vision_tokens(width: int, height: int, detail: str) -> int:
+    """Estimated prompt tokens the model bills for an image of this size."""
+    if detail == "low":
+        return BASE_TOKENS
+    width, height = high_detail_size(width, height)
+    return BASE_TOKENS + TILE_TOKENS * math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+
+
+def high_detail_size(width: int, height: int) -> tuple[int, int]:
+    """The resolution the model actually looks at for a "high" detail image."""
+    scale = min(1.0, HIGH_DETAIL_MAX_SIDE / max(width, height))
+    short_side = min(width, height) * scale
+    if short_side > HIGH_DETAIL_SHORT_SIDE:
+        scale *= HIGH_DETAIL_SHORT_SIDE / short_side
+    return max(round(width * scale), 1), max(round(height * scale), 1)
+
+
+def _snap_to_tiles(width: int, height: int, tolerance: float) -> tuple[int, int]:
+    """Shrink slightly when a side only just spills into another row or column of tiles."""
+    scale = 1.0
+    for side in (width, height):
+        tiles = side // TILE_SIZE
+        if tiles and side % TILE_SIZE and side <= tiles * TILE_SIZE * (1 + tolerance):
+            scale = min(scale, tiles * TILE_SIZE / side)
+    return max(int(width * scale), 1), max(int(height * scale), 1)
+
+
+@dataclass
+class PreparedImage:
+    url: str
+    detail: str
+    width: int
+    height: int
+    bytes_in: int
+    bytes_out: int
+    tokens_before: int  # As sent, which the model bills at "high" by default
+    tokens_after: int
+
+
+class ImagePreprocessor:
+    """
+    Shrinks chat image attachments before they are sent to the vision model.
+
+    Each data-URL image is decoded, rotated upright from its EXIF orientation,
+    downsampled to the resolution the model would use anyway (or to 512px when
+    "low" detail suffices) and re-encoded without metadata: JPEG for photos,
+    PNG for images with transparency or few colours. In "auto" mode, images
+    that fit in one tile or have little fine structure (edge density below
+    `edge_density_threshold`) go as "low" detail; text, diagrams and
+    screenshots go as "high". A `detail` set by the client is respected.
+    An original that is already smaller than its re-encoding and carries no
+    EXIF is sent as is. Results are cached by content hash, so resending an
+    image costs nothing.
+    Anything that isn't a decodable data URL is passed through untouched.
+    """
+
+    def __init__(
+        self,
+        detail: str,
+        edge_density_threshold: float,
+        jpeg_quality: int,
+        tile_snap_tolerance: float,
+        cache_max_entries: int,
+        cache_max_mb: int,
+        cache_ttl_seconds: float
+    ) -> None:
+        self.detail = detail
+        self.edge_density_threshold = edge_density_threshold
+        self.jpeg_quality = jpeg_quality
+        self.tile_snap_tolerance = tile_snap_tolerance
+        self.cache = TTLCache(
+            cache_max_entries, cache_max_mb * 1024 * 1024, cache_ttl_seconds, lambda image: len(image.url) + 256
+        )
+        self.images = 0
+        self.passed_through = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.details: Counter[str] = Counter()
+
+    async def prepare(self, images: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Processed copies of `image_url` content parts, in the same order."""
+        if Image is None:
+            return images
+        return list(await asyncio.gather(*(self._prepare_one(part) for part in images)))
+
+    async def _prepare_one(self, part: dict[str, Any]) -> dict[str, Any]:
+        image_url = part.get("image_url") or {}
+        payload = self._decode(image_url.get("url", ""))
+        if payload is None:
+            self.passed_through += 1
+            return part
+        try:
+            prepared = await self.process(payload, image_url.get("detail") or self.detail)
+        except Exception as e:
+            logger.warning(f"Image preprocessing failed, sending it as is: {e}")
+            self.passed_through += 1
+            return part
+        return {**part, "image_url": {**image_url, **self.use(prepared)["image_url"]}}
+
+    async def process(self, payload: bytes, detail: str) -> PreparedImage:
+        """Downsampled, recompressed version of raw image bytes, cached by content hash."""
+        if Image is None:
+            raise ValueError("Pillow is not installed")
+        key = (hashlib.sha256(payload).hexdigest(), detail)
+        prepared: PreparedImage | None = self.cache.get(key)
+        if prepared is None:
+            prepared = await asyncio.to_thread(self._process, payload, detail)
+            self.cache.put(key, prepared)
+            logger.info(
+                f"Image {key[0][:12]}: {prepared.width}x{prepared.height} {prepared.detail} detail, "
+                f"{prepared.bytes_in - prepared.bytes_out} bytes and "
+                f"~{prepared.tokens_before - prepared.tokens_after} tokens saved per send"
+            )
+        return prepared
+
+    def use(self, prepared: PreparedImage) -> dict[str, Any]:
+        """Record a send of a prepared image and return it as an `image_url` content part."""
+        self.images += 1
+        self.bytes_in += prepared.bytes_in
+        self.bytes_out += prepared.bytes_out
+        self.tokens_before += prepared.tokens_before
+        self.tokens_after += prepared.tokens_after
+        self.details[prepared.detail] += 1
+        return {"type": "image_url", "image_url": {"url": prepared.url, "detail": prepared.detail}}
+
+    @staticmethod
+    def _decode(url: str) -> bytes | None:
+        if not url.startswith("data:image/") or ";base64," not in url:
+            return None
+        try:
+            return base64.b64decode(url.split(",", 1)[1], validate=False)
+        except (binascii.Error, ValueError):
+            return None
+
+    def _process(self, payload: bytes, requested: str) -> PreparedImage:
+        image = Image.open(io.BytesIO(payload))
+        original_size, original_format = image.size, image.format
+        has_exif = bool(image.getexif())
+        if image.format == "JPEG":
+            # Let the decoder downscale by a power of two, never below the size we need
+            image.draft("RGB", (LOW_DETAIL_SIDE,) * 2 if requested == "low" else high_detail_size(*original_size))
+        image = ImageOps.exif_transpose(image)
+        width, height = image.size
+
+        detail = requested if requested in ("low", "high") else self._choose_detail(image)
+        if detail == "low":
+            target = image.size if max(width, height) <= LOW_DETAIL_SIDE else (
+                round(width * LOW_DETAIL_SIDE / max(width, height)),
+                round(height * LOW_DETAIL_SIDE / max(width, height))
+            )
+        else:
+            target = _snap_to_tiles(*high_detail_size(width, height), self.tile_snap_tolerance)
+        if target != image.size:
+            image = image.resize(target, Image.Resampling.LANCZOS)
+
+        data, mime = self._encode(image)
+        size = image.size
+        if len(data) >= len(payload) and not has_exif and original_format in ("PNG", "JPEG", "WEBP", "GIF"):
+            # Already compact and nothing to strip; the model downsamples it the same way
+            data, mime, size = payload, f"image/{original_format.lower()}", original_size
+        encoded = f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+        return PreparedImage(
+            url=encoded,
+            detail=detail,
+            width=size[0],
+            height=size[1],
+            bytes_in=len(payload),
+            bytes_out=len(data),
+            tokens_before=vision_tokens(*original_size, "high"),
+            tokens_after=vision_tokens(*size, detail)
+        )
+
+    def _choose_detail(self, image: Any) -> str:
+        """Low detail for images that fit one tile or are mostly smooth, high for fine detail such as text."""
+        if max(image.size) <= LOW_DETAIL_SIDE:
+            return "low"
+        sample = image.convert("L")
+        sample.thumbnail((LOW_DETAIL_SIDE, LOW_DETAIL_SIDE))
+        edges = sample.filter(ImageFilter.FIND_EDGES).point(lambda value: 255 if value > 48 else 0)
+        density = edges.histogram()[255] / (edges.width * edges.height)
+        return "high" if density >= self.edge_density_threshold else "low"
+
+    def _encode(self, image: Any) -> tuple[bytes, str]:
+        """
+        Re-encode without metadata: PNG for transparency, JPEG for photos. Flat
+        graphics (at most 256 colours) become a lossless palette PNG unless JPEG
+        comes out smaller.
+        """
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        if has_alpha:
+            out = io.BytesIO()
+            image.convert("RGBA").save(out, format="PNG", optimize=True)
+            return out.getvalue(), "image/png"
+
+        image = image.convert("RGB")
+        jpeg = io.BytesIO()
+        image.save(jpeg, format="JPEG", quality=self.jpeg_quality, optimize=True)
+        colors = image.getcolors(maxcolors=256)
+        if colors is None:
+            return jpeg.getvalue(), "image/jpeg"
+
+        png = io.BytesIO()
+        image.convert("P", palette=Image.Palette.ADAPTIVE, colors=len(colors)).save(png, format="PNG", optimize=True)
+        if png.tell() <= jpeg.tell():
+            return png.getvalue(), "image/png"
+        return jpeg.getvalue(), "image/jpeg"
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "images": self.images,
+            "passed_through": self.passed_through,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_before - self.tokens_after,
+            "detail": dict(self.details),
+            "cache": self.cache.stats()
+        }
@@ -0,0 +1,66 @@
+"""Progress tracking for background knowledge-base indexing."""
+import time
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class IndexingProgress:
+    """Mutable progress of the latest indexing run (startup or a later sync), reported by health endpoints."""
+    state: str = "pending"  # pending | running | complete | failed
+    documents_total: int = 0
+    documents_done: int = 0
+    documents_failed: int = 0
+    chunks_embedded: int = 0
+    started_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+
+    def start(self) -> None:
+        """Begin a new run; counters from any previous run are discarded."""
+        self.state = "running"
+        self.documents_total = 0
+        self.documents_done = 0
+        self.documents_failed = 0
+        self.chunks_embedded = 0
+        self.started_at = time.time()
+        self.finished_at = None
+        self.error = None
+
+    def finish(self, error: str | None = None) -> None:
+        self.state = "failed" if error else "complete"
+        self.error = error
+        self.finished_at = time.time()
+
+    def document_finished(self, success: bool) -> None:
+        self.documents_done += 1
+        if not success:
+            self.documents_failed += 1
+
+    def add_chunks(self, count: int) -> None:
+        self.chunks_embedded += count
+
+    @property
+    def is_running(self) -> bool:
+        return self.state in ("pending", "running")
+
+    def eta_seconds(self) -> float | None:
+        """Estimate remaining time from the average time per finished document."""
+        if self.state != "running" or self.started_at is None or self.documents_done == 0:
+            return None
+        remaining = self.documents_total - self.documents_done
+        elapsed = time.time() - self.started_at
+        return round(elapsed / self.documents_done * remaining, 1)
+
+    def as_dict(self) -> dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "state": self.state,
+            "documents_total": self.documents_total,
+            "documents_done": self.documents_done,
+            "documents_failed": self.documents_failed,
+            "chunks_embedded": self.chunks_embedded,
+            "elapsed_seconds": round(end - self.started_at, 1) if self.started_at else 0.0,
+            "eta_seconds": self.eta_seconds(),
+            "error": self.error
+        }
@@ -0,0 +1,158 @@
+"""In-memory BM25 index over knowledge-base chunks, persisted next to the vector store."""
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+# Numbers with separators/ranges/units ("5-10", "€50-100b", "1.9"), then words incl. hyphenated ones
+_TOKEN_RE = re.compile(r"[€$£]?\d+(?:[.,]\d+)*(?:-\d+(?:[.,]\d+)*)?[a-z%]*|[a-z][a-z0-9]*(?:[-'][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase tokens; hyphenated terms are kept whole and also split into parts."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if "-" in token and not token[0].isdigit():
+            tokens.extend(part for part in token.split("-") if part)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """Fuse ranked ID lists: score(d) = sum over lists of 1 / (k + rank)."""
+    scores: dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _matches(metadata: dict[str, Any], where: dict[str, Any] | None) -> bool:
+    """Evaluate a simple equality filter (the subset of Chroma's 'where' the engine uses)."""
+    if not where:
+        return True
+    return all(metadata.get(key) == value for key, value in where.items())
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index kept in sync with the vector store.
+
+    Chunk text and metadata are stored alongside the postings so lexical-only
+    search can return results without touching the vector store or the network.
+    """
+
+    def __init__(self, path: Path, k1: float = 1.5, b: float = 0.75) -> None:
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.chunks: dict[str, dict[str, Any]] = {}
+        self._postings: dict[str, dict[str, int]] = defaultdict(dict)
+        self._lengths: dict[str, int] = {}
+        self._total_length = 0
+        self.loaded_from_disk = False
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_VERSION:
+                logger.warning(f"Ignoring lexical index {self.path} with unsupported version")
+                return
+            for chunk_id, chunk in data.get("chunks", {}).items():
+                self._index(chunk_id, chunk["text"], chunk["metadata"])
+            self.loaded_from_disk = True
+            logger.info(f"Loaded lexical index with {len(self.chunks)} chunks")
+        except Exception as e:
+            logger.warning(f"Failed to load lexical index {self.path}: {e}")
+            self.clear()
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Shallow copy of the stored chunks, safe to serialize off the event loop."""
+        return dict(self.chunks)
+
+    def save(self, snapshot: dict[str, dict[str, Any]] | None = None) -> None:
+        """Atomically write the index (write to a temp file, then rename)."""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({"version": INDEX_VERSION, "chunks": self.chunks if snapshot is None else snapshot}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Failed to save lexical index: {e}")
+
+    def clear(self) -> None:
+        self.chunks.clear()
+        self._postings.clear()
+        self._lengths.clear()
+        self._total_length = 0
+
+    def _index(self, chunk_id: str, text: str, metadata: dict[str, Any]) -> None:
+        if chunk_id in self.chunks:
+            self._unindex(chunk_id)
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            self._postings[term][chunk_id] = tf
+        length = sum(terms.values())
+        self._lengths[chunk_id] = length
+        self._total_length += length
+        self.chunks[chunk_id] = {"text": text, "metadata": metadata}
+
+    def _unindex(self, chunk_id: str) -> None:
+        chunk = self.chunks.pop(chunk_id)
+        for term in set(tokenize(chunk["text"])):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(chunk_id, 0)
+
+    def add(self, ids: list[str], texts: list[str], metadatas: list[dict[str, Any]]) -> None:
+        for chunk_id, text, metadata in zip(ids, texts, metadatas, strict=True):
+            self._index(chunk_id, text, metadata)
+
+    def remove_document(self, filename: str) -> int:
+        """Remove all chunks of a document. Returns the number removed."""
+        chunk_ids = [cid for cid, chunk in self.chunks.items() if chunk["metadata"].get("filename") == filename]
+        for chunk_id in chunk_ids:
+            self._unindex(chunk_id)
+        return len(chunk_ids)
+
+    def search(self, query: str, top_k: int, where: dict[str, Any] | None = None) -> list[tuple[str, float]]:
+        """Return (chunk_id, bm25_score) pairs, best first."""
+        if not self.chunks:
+            return []
+
+        n = len(self.chunks)
+        avg_length = self._total_length / n if n else 1.0
+        scores: dict[str, float] = defaultdict(float)
+
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[chunk_id] / avg_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if where:
+            ranked = [(cid, score) for cid, score in ranked if _matches(self.chunks[cid]["metadata"], where)]
+        return ranked[:top_k]
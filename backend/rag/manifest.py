@@ -0,0 +1,155 @@
+"""Persisted manifest of indexed documents for incremental knowledge-base sync."""
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+# Indexing parameters of documents indexed before the manifest existed; never current
+LEGACY_INDEX_PARAMS: dict[str, Any] = {"chunker": "legacy"}
+
+
+def file_sha256(path: Path, block_size: int = 1024 * 1024) -> str:
+    """Hash a file in fixed-size blocks so large documents are never fully buffered."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class ManifestEntry:
+    """What was indexed for a single document, and how."""
+    sha256: str
+    size: int
+    mtime: float
+    chunks: int
+    index_params: dict[str, Any]
+
+
+@dataclass
+class ManifestDiff:
+    """Result of comparing the manifest against the documents directory."""
+    added: list[Path] = field(default_factory=list)
+    changed: list[Path] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    unchanged: list[str] = field(default_factory=list)
+
+    @property
+    def to_ingest(self) -> list[Path]:
+        return self.added + self.changed
+
+
+class DocumentManifest:
+    """
+    JSON manifest keyed by filename, stored alongside the vector store.
+
+    The manifest records content hash, size, mtime and the indexing parameters
+    (chunking settings, embedding model) used for each document, so startup can
+    work out what changed without reading the collection back.
+    """
+
+    def __init__(self, path: Path, index_params: dict[str, Any]) -> None:
+        self.path = path
+        self.index_params = index_params
+        self.entries: dict[str, ManifestEntry] = {}
+        self.loaded_from_disk = False
+        self._load()
+
+    def _load(self) -> None:
+        """Load the manifest from disk; a missing or unreadable file means an empty manifest."""
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                logger.warning(f"Ignoring manifest {self.path} with unsupported version {data.get('version')}")
+                return
+            self.entries = {
+                filename: ManifestEntry(**entry)
+                for filename, entry in data.get("documents", {}).items()
+            }
+            self.loaded_from_disk = True
+        except Exception as e:
+            logger.warning(f"Failed to load index manifest {self.path}: {e}")
+            self.entries = {}
+
+    def save(self) -> None:
+        """Atomically write the manifest (write to a temp file, then rename)."""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "version": MANIFEST_VERSION,
+                    "documents": {name: asdict(entry) for name, entry in self.entries.items()}
+                }, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Failed to save index manifest: {e}")
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def record(
+        self, file_path: Path, chunks: int, sha256: str | None = None, index_params: dict[str, Any] | None = None
+    ) -> None:
+        """Record a document as indexed with the current parameters (or the given ones)."""
+        stats = file_path.stat()
+        self.entries[file_path.name] = ManifestEntry(
+            sha256=sha256 if sha256 is not None else file_sha256(file_path),
+            size=stats.st_size,
+            mtime=stats.st_mtime,
+            chunks=chunks,
+            index_params=dict(self.index_params if index_params is None else index_params)
+        )
+
+    def forget(self, filename: str) -> None:
+        self.entries.pop(filename, None)
+
+    def is_current(self, file_path: Path) -> bool:
+        """
+        Check whether a file is indexed as-is with the current parameters.
+
+        Size and mtime are compared first; the file is only hashed when they
+        differ, and a matching hash just refreshes the recorded mtime.
+        """
+        entry = self.entries.get(file_path.name)
+        if entry is None or entry.index_params != self.index_params:
+            return False
+
+        stats = file_path.stat()
+        if entry.size == stats.st_size and entry.mtime == stats.st_mtime:
+            return True
+
+        if entry.size == stats.st_size and entry.sha256 == file_sha256(file_path):
+            entry.mtime = stats.st_mtime
+            return True
+
+        return False
+
+    def diff(self, files: list[Path]) -> ManifestDiff:
+        """Compare the manifest against the given document files. Blocking; hashes files whose stats changed."""
+        result = ManifestDiff()
+        present = set()
+
+        for file_path in files:
+            present.add(file_path.name)
+            if file_path.name not in self.entries:
+                result.added.append(file_path)
+            elif self.is_current(file_path):
+                result.unchanged.append(file_path.name)
+            else:
+                result.changed.append(file_path)
+
+        # A snapshot: uploads may record documents while a diff runs in a thread
+        result.removed = [name for name in list(self.entries) if name not in present]
+        return result
@@ -0,0 +1,242 @@
+"""Shared OpenAI client: tuned connection pool, retries, hedged embedding calls and a circuit breaker."""
+import asyncio
+import logging
+import math
+import time
+from collections import Counter, deque
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import httpx
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, DefaultAsyncHttpxClient
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderUnavailable(Exception):
+    """The circuit breaker is open; calls fail fast until `retry_after` seconds have passed."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"OpenAI is unavailable, retrying in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def is_provider_outage(error: BaseException) -> bool:
+    """Whether an error means the provider is degraded (as opposed to a bad request)."""
+    if isinstance(error, ProviderUnavailable | APIConnectionError):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive provider failures and rejects
+    calls for `reset_seconds`. Then a single probe call is let through: success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def _retry_after(self) -> int:
+        remaining = self.reset_seconds - (time.monotonic() - (self.opened_at or 0.0))
+        return max(math.ceil(remaining), 1)
+
+    def raise_if_open(self) -> None:
+        """Fail fast while open, without taking the half-open probe."""
+        if self.state == "open":
+            self.rejected += 1
+            raise ProviderUnavailable(self._retry_after())
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+        self.rejected += 1
+        raise ProviderUnavailable(self._retry_after())
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("OpenAI circuit closed")
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self._probe_in_flight or (
+            self.opened_at is None and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+            logger.warning(
+                f"OpenAI circuit opened after {self.consecutive_failures} failures, "
+                f"failing fast for {self.reset_seconds:g}s"
+            )
+        self._probe_in_flight = False
+
+    def record_cancelled(self) -> None:
+        # A cancelled probe says nothing about the provider; let the next call probe
+        self._probe_in_flight = False
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+
+class OpenAIClient:
+    """
+    The one OpenAI client used for chat, summaries and embeddings.
+
+    Connections come from a keep-alive pool sized by settings. Retries on
+    connection errors, 429 and 5xx are left to the SDK, which backs off
+    exponentially with jitter and honours Retry-After. Small embedding
+    requests (query embeddings) are hedged: if the first attempt is slower
+    than the recent p95, a duplicate is sent and the first answer wins.
+    Every call goes through a circuit breaker so a degraded provider costs
+    callers nothing once it has tripped.
+    """
+
+    def __init__(self, api_key: str | None) -> None:
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.openai_max_connections,
+                max_keepalive_connections=settings.openai_max_keepalive_connections,
+                keepalive_expiry=settings.openai_keepalive_expiry_seconds
+            ),
+            timeout=httpx.Timeout(settings.openai_timeout_seconds, connect=settings.openai_connect_timeout_seconds),
+            event_hooks={"request": [self._on_request], "response": [self._on_response]}
+        )
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=settings.openai_base_url or None,
+            max_retries=settings.openai_max_retries,
+            http_client=http_client
+        )
+        self.breaker = CircuitBreaker(settings.openai_breaker_failure_threshold, settings.openai_breaker_reset_seconds)
+        self.calls: Counter[str] = Counter()
+        self.failures: Counter[str] = Counter()
+        self.http_attempts = 0
+        self.http_responses: Counter[str] = Counter()
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self._embedding_latencies: deque[float] = deque(maxlen=200)
+
+    async def _on_request(self, _request: httpx.Request) -> None:
+        self.http_attempts += 1
+
+    async def _on_response(self, response: httpx.Response) -> None:
+        status = response.status_code
+        self.http_responses["429" if status == 429 else f"{status // 100}xx"] += 1
+
+    async def _guarded(self, kind: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        self.breaker.before_call()
+        self.calls[kind] += 1
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            self.breaker.record_cancelled()
+            raise
+        except Exception as e:
+            if is_provider_outage(e):
+                self.failures[kind] += 1
+                self.breaker.record_failure()
+            else:
+                # The provider answered; the request itself was at fault
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def chat_completion(self, **kwargs: Any) -> Any:
+        """chat.completions.create through the breaker (streams count as up once they open)."""
+        return await self._guarded("chat", lambda: self.client.chat.completions.create(**kwargs))
+
+    async def create_embeddings(self, **kwargs: Any) -> Any:
+        """embeddings.create through the breaker, hedged for small inputs."""
+        inputs = kwargs.get("input")
+        size = len(inputs) if isinstance(inputs, list) else 1
+        if size > settings.openai_hedge_max_inputs:
+            return await self._guarded("embeddings", lambda: self.client.embeddings.create(**kwargs))
+        return await self._guarded("embeddings", lambda: self._hedged(kwargs))
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the first attempt before sending a duplicate."""
+        if settings.openai_hedge_delay_ms > 0:
+            return settings.openai_hedge_delay_ms / 1000
+        if len(self._embedding_latencies) < 20:
+            return 1.0
+        ordered = sorted(self._embedding_latencies)
+        return max(ordered[int(0.95 * (len(ordered) - 1))], 0.05)
+
+    async def _hedged(self, kwargs: dict[str, Any]) -> Any:
+        started = time.monotonic()
+        first = asyncio.ensure_future(self.client.embeddings.create(**kwargs))
+        attempts = [first]
+        pending: set[asyncio.Future[Any]] = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay())
+            if not done:
+                self.hedges_sent += 1
+                attempts.append(asyncio.ensure_future(self.client.embeddings.create(**kwargs)))
+                pending.add(attempts[-1])
+
+            error: BaseException | None = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedges_won += 1
+                        self._embedding_latencies.append(time.monotonic() - started)
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    assert error is not None
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # Mark a losing attempt's error as retrieved
+
+    def stats(self) -> dict[str, Any]:
+        latencies = sorted(self._embedding_latencies)
+        return {
+            "base_url": str(self.client.base_url),
+            "breaker": self.breaker.stats(),
+            "calls": dict(self.calls),
+            "failures": dict(self.failures),
+            "http_attempts": self.http_attempts,
+            "http_responses": dict(self.http_responses),
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won,
+            "embedding_p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1) if latencies else None
+        }
+
+    async def close(self) -> None:
+        await self.client.close()
@@ -1,17 +1,35 @@
+import asyncio
+import contextlib
 import json
 import logging
 import os
+import tempfile
+import uuid
 from collections.abc import AsyncIterator
 from pathlib import Path
 from typing import Any
 
-import chromadb
-from chromadb.utils import embedding_functions
-from openai import AsyncOpenAI
-from pypdf import PdfReader
-from docx import Document
-
+from .admission import AdmissionController, AdmissionPool
+from .answer_cache import AnswerCache, replay_chunks
+from .attachment_store import AttachmentStore, StoredAttachment
+from .attachments import AttachmentIndex, attachment_digest, decode_attachment
+from .chunking import CHUNKER_VERSION, MarkdownChunker
 from .config import settings
+from .context_packer import ContextPacker
+from .coordination import IndexVersionFile, IngestionLeadership, SyncRequest
+from .embedding_cache import CachedEmbedder, EmbeddingCache
+from .embeddings import Embedder, EmbeddingPipeline, OpenAIEmbedder
+from .extraction import DocumentExtractor
+from .images import ImagePreprocessor
+from .indexing import IndexingProgress
+from .lexical_index import LexicalIndex, reciprocal_rank_fusion
+from .manifest import LEGACY_INDEX_PARAMS, DocumentManifest, ManifestEntry, file_sha256
+from .openai_client import OpenAIClient, is_provider_outage
+from .retrieval_cache import RetrievalCache
+from .store_access import AsyncVectorStore
+from .summarizer import HistorySummarizer
+from .tokens import cached_prompt_tokens, count_tokens, load_tokenizers
+from .vector_store import create_vector_store
 
 # Import token tracker
 try:
@@ -46,51 +64,281 @@ class QueenRAGEngine:
         logger.info(f"API Key from settings: {settings.openai_api_key[:20] if settings.openai_api_key else 'Empty'}")
         logger.info(f"Final API key: {api_key[:20] if api_key else 'None/Empty'}")
 
-        # Initialize OpenAI client
-        self.openai_client = AsyncOpenAI(api_key=api_key)
+        # One pooled, retrying, circuit-broken OpenAI client for chat, summaries and embeddings
+        self.openai = OpenAIClient(api_key)
 
-        # Initialize ChromaDB with OpenAI embeddings
-        self.chroma_client = chromadb.PersistentClient(
-            path=settings.chroma_persist_directory
+        # Async embedder shared by ingestion and search, behind the persistent cache
+        self.embedder: Embedder = OpenAIEmbedder(
+            self.openai, settings.openai_embedding_model, settings.openai_embedding_dimensions
+        )
+        self.embedding_cache: EmbeddingCache | None = None
+        if settings.embedding_cache_enabled:
+            self.embedding_cache = EmbeddingCache(
+                settings.embedding_cache_path, settings.embedding_cache_max_entries
+            )
+            self.embedder = CachedEmbedder(
+                self.embedder, self.embedding_cache, settings.openai_embedding_dimensions
+            )
+        self.embedding_pipeline = EmbeddingPipeline(
+            self.embedder,
+            max_batch_tokens=settings.embedding_batch_max_tokens,
+            max_batch_inputs=settings.embedding_batch_max_inputs,
+            concurrency=settings.embedding_concurrency
         )
 
-        # Create embedding function
-        self.embedding_function = embedding_functions.OpenAIEmbeddingFunction(  # type: ignore[attr-defined]
-            api_key=api_key,
-            model_name=settings.openai_embedding_model
+        # In-process query embedding and search result caches
+        self.retrieval_cache: RetrievalCache | None = None
+        if settings.retrieval_cache_enabled:
+            self.retrieval_cache = RetrievalCache(
+                ttl_seconds=settings.retrieval_cache_ttl_seconds,
+                max_entries=settings.retrieval_cache_max_entries,
+                embedding_max_mb=settings.query_embedding_cache_max_mb,
+                results_max_mb=settings.result_cache_max_mb
+            )
+
+        # Opt-in semantic cache of complete answers for history-free questions
+        self.answer_cache: AnswerCache | None = None
+        if settings.answer_cache_enabled:
+            self.answer_cache = AnswerCache(
+                threshold=settings.answer_cache_similarity_threshold,
+                max_entries=settings.answer_cache_max_entries,
+                ttl_seconds=settings.answer_cache_ttl_seconds
+            )
+
+        # Incremented on every index change; cached search results are tagged with it
+        self.index_version = 0
+
+        # With several server workers only the holder of the ingest lock writes the index;
+        # it publishes the index version and the other workers reload when it changes
+        self.leadership = IngestionLeadership(self._index_file_path("ingest", ".lock"))
+        self.version_file = IndexVersionFile(self._index_file_path("version"))
+        self.sync_request = SyncRequest(self._index_file_path("sync", ".request"))
+        self._coordination_task: asyncio.Task[None] | None = None
+
+        # Process pool for CPU-bound PDF/DOCX extraction
+        self.extractor = DocumentExtractor(
+            max_workers=settings.extraction_max_workers or None,
+            timeout_seconds=settings.extraction_timeout_seconds,
+            memory_limit_mb=settings.extraction_memory_limit_mb,
+            pdf_pages_per_task=settings.extraction_pdf_pages_per_task
         )
 
-        # Collection will be initialized in async initialize()
-        self.collection: chromadb.Collection | None = None
+        # Vector store will be initialized in async initialize()
+        self.vector_store: AsyncVectorStore | None = None
+
+        # Startup indexing runs in the background while the API serves requests
+        self.indexing_progress = IndexingProgress()
+        self._indexing_task: asyncio.Task[None] | None = None
 
-        # Track loaded documents
+        # Track loaded documents, and documents claimed by an in-flight ingest
         self.loaded_documents: set[str] = set()
+        self._ingesting: set[str] = set()
+
+        # Manifest of what is indexed, keyed per store so a rename or backend switch starts fresh
+        self.manifest = DocumentManifest(
+            self._index_file_path("manifest"),
+            index_params={
+                "chunker": CHUNKER_VERSION,
+                "chunk_max_tokens": settings.rag_chunk_max_tokens,
+                "chunk_min_tokens": settings.rag_chunk_min_tokens,
+                "embedding_model": settings.openai_embedding_model
+            }
+        )
+
+        # BM25 index over the same chunks, for exact identifiers and figures
+        self.lexical_index = LexicalIndex(self._index_file_path("bm25"))
+
+        # Chunks follow markdown structure and are sized in embedding-model tokens
+        self.chunker = MarkdownChunker(
+            model=settings.openai_embedding_model,
+            max_tokens=settings.rag_chunk_max_tokens,
+            min_tokens=settings.rag_chunk_min_tokens
+        )
+
+        # Prompts are packed into a fixed input-token budget for predictable cost per turn
+        self.context_packer = ContextPacker(settings.openai_model, settings.chat_input_token_budget)
+
+        # Long histories are compacted into a rolling summary by a small model, in the background
+        self.summarizer: HistorySummarizer | None = None
+        if settings.history_summary_enabled:
+            self.summarizer = HistorySummarizer(
+                self.openai,
+                model=settings.history_summary_model,
+                threshold_turns=settings.history_summary_threshold_turns,
+                keep_recent_turns=settings.history_summary_keep_recent_turns,
+                max_tokens=settings.history_summary_max_tokens,
+                max_entries=settings.history_summary_cache_size,
+                usage_tracker=token_tracker
+            )
+
+        # Concurrency limits for API traffic; chat, search and ingestion queue separately
+        self.admission = AdmissionController([
+            AdmissionPool(
+                "chat",
+                settings.admission_chat_max_concurrent,
+                settings.admission_chat_max_queue,
+                settings.admission_chat_queue_timeout_seconds
+            ),
+            AdmissionPool(
+                "search",
+                settings.admission_search_max_concurrent,
+                settings.admission_search_max_queue,
+                settings.admission_search_queue_timeout_seconds
+            ),
+            AdmissionPool(
+                "ingest",
+                settings.admission_ingest_max_concurrent,
+                settings.admission_ingest_max_queue,
+                settings.admission_ingest_queue_timeout_seconds
+            )
+        ])
+
+        # Chat attachments, chunked and embedded per conversation instead of pasted into the prompt
+        self.attachment_index = AttachmentIndex(
+            ttl_seconds=settings.attachment_ttl_seconds,
+            max_conversations=settings.attachment_max_conversations,
+            max_chunks=settings.attachment_max_chunks
+        )
+
+        # Attachments uploaded once and referenced by ID across turns
+        self.attachment_store = AttachmentStore(
+            directory=settings.attachment_store_directory,
+            ttl_seconds=settings.attachment_store_ttl_seconds
+        )
+
+        # Chat images, downsampled and recompressed before they reach the vision model
+        self.image_preprocessor = ImagePreprocessor(
+            detail=settings.image_detail,
+            edge_density_threshold=settings.image_edge_density_threshold,
+            jpeg_quality=settings.image_jpeg_quality,
+            tile_snap_tolerance=settings.image_tile_snap_tolerance,
+            cache_max_entries=settings.image_cache_max_entries,
+            cache_max_mb=settings.image_cache_max_mb,
+            cache_ttl_seconds=settings.image_cache_ttl_seconds
+        )
+
+        # Searches answered from BM25 alone because embeddings were unavailable
+        self.lexical_fallbacks = 0
+
+        # Completed generations, and streamed ones cut short because the client disconnected
+        self.completed_generations = 0
+        self.aborted_generations = 0
+        self.aborted_completion_tokens = 0
 
         logger.info("QueenRAGEngine initialized")
 
+    @staticmethod
+    def _index_file_path(prefix: str, suffix: str = ".json") -> Path:
+        """Path of a sidecar index file belonging to the configured vector store."""
+        store = settings.chroma_collection_name
+        if settings.vector_store_backend != "chroma":
+            store = f"{settings.vector_store_backend}_{store}"
+        return Path(settings.chroma_persist_directory) / f"{prefix}_{store}{suffix}"
+
+    @property
+    def is_leader(self) -> bool:
+        """Whether this process owns ingestion (always true with a single worker)."""
+        return self.leadership.is_leader
+
+    def _bump_index_version(self) -> None:
+        """Record an index change and, as leader, publish it to the other workers."""
+        self.index_version += 1
+        if self.is_leader:
+            self.version_file.publish(self.index_version)
+
     async def initialize(self) -> None:
         """
         Async initialization of the RAG engine.
         """
         try:
-            # Get or create collection
-            self.collection = self.chroma_client.get_or_create_collection(
-                name=settings.chroma_collection_name,
-                embedding_function=self.embedding_function
+            # A cold tiktoken cache means a download; keep it (and its retries, offline) off the event loop
+            await asyncio.to_thread(load_tokenizers, settings.openai_model, settings.openai_embedding_model)
+
+            # Open the configured vector store (Chroma or in-process NumPy); all access is off-loop
+            store = await asyncio.to_thread(
+                create_vector_store,
+                settings.vector_store_backend,
+                settings.chroma_persist_directory,
+                settings.chroma_collection_name
             )
+            self.vector_store = AsyncVectorStore(store, max_workers=settings.vector_store_max_workers)
+
+            # Continue from the published version so it only ever increases across restarts
+            self.index_version = self.version_file.read()
+            if self.leadership.try_acquire():
+                # Index documents in the background; search and chat use whatever is indexed so far
+                self._indexing_task = asyncio.create_task(self._run_background_indexing())
+                logger.info("RAG engine initialized as ingestion leader, document indexing running in background")
+            else:
+                # Load after reading the version, so a concurrent publish is picked up by the next poll
+                await self._reload_index(self.index_version)
+                logger.info(f"RAG engine initialized as read-only worker ({len(self.loaded_documents)} documents indexed)")
 
-            # Load metadata of existing documents
-            await self._load_document_metadata()
-
-            logger.info(f"RAG engine initialized with {len(self.loaded_documents)} documents")
+            self._coordination_task = asyncio.create_task(self._coordinate())
 
         except Exception as e:
             logger.error(f"Failed to initialize RAG engine: {e}")
             raise
 
+    async def _run_background_indexing(self) -> None:
+        """Run the startup document sync and record its progress."""
+        self.indexing_progress.start()
+        try:
+            await self._load_document_metadata()
+            self.indexing_progress.finish()
+            logger.info(f"Background indexing complete: {len(self.loaded_documents)} documents available")
+        except asyncio.CancelledError:
+            self.indexing_progress.finish(error="cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Background indexing failed: {e}")
+            self.indexing_progress.finish(error=str(e))
+
+    async def _coordinate(self) -> None:
+        """
+        Background loop shared by all workers. The leader runs a directory sync
+        when a read-only worker asks for one; read-only workers reload when the
+        published index version changes, and take over if the leader exits.
+        """
+        while True:
+            await asyncio.sleep(settings.index_poll_interval_seconds)
+            try:
+                if self.is_leader:
+                    indexing = self._indexing_task is not None and not self._indexing_task.done()
+                    if not indexing and self.sync_request.consume():
+                        self._indexing_task = asyncio.create_task(self._run_background_indexing())
+                elif self.leadership.try_acquire():
+                    logger.info("Previous ingestion leader exited, taking over document indexing")
+                    await self._reload_index(self.version_file.read())
+                    self._indexing_task = asyncio.create_task(self._run_background_indexing())
+                else:
+                    version = self.version_file.read()
+                    if version != self.index_version:
+                        await self._reload_index(version)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Index coordination failed: {e}")
+
+    async def _reload_index(self, version: int) -> None:
+        """Re-read the vector store, lexical index and manifest written by the leader."""
+        if self.vector_store is None:
+            return
+        await self.vector_store.reload()
+        self.lexical_index = await asyncio.to_thread(LexicalIndex, self.lexical_index.path)
+        self.manifest = await asyncio.to_thread(DocumentManifest, self.manifest.path, self.manifest.index_params)
+        self.loaded_documents = set(self.manifest.entries)
+        # Result cache entries are keyed by version; answers can't be traced to what changed
+        self.index_version = version
+        if self.answer_cache:
+            self.answer_cache.clear()
+        logger.info(f"Reloaded index at version {version} ({len(self.loaded_documents)} documents)")
+
     async def _load_document_metadata(self) -> None:
         """
-        Load metadata about existing documents and process them into ChromaDB if needed.
+        Sync the documents directory into ChromaDB using the index manifest.
+        Only added or changed files are (re-)embedded, removed files are purged,
+        and unchanged files are skipped without reading the collection back.
         This enables pre-loaded documents in Docker images to work automatically.
         """
         doc_path = Path(settings.upload_directory)
@@ -98,110 +346,180 @@ class QueenRAGEngine:
             logger.info("No documents directory found, skipping auto-load")
             return
 
-        # Get all documents currently in ChromaDB
-        if self.collection is None:
-            logger.warning("Collection not initialized, cannot load documents")
+        if self.vector_store is None:
+            logger.warning("Vector store not initialized, cannot load documents")
             return
 
-        # Get existing document IDs from ChromaDB
-        try:
-            all_items = self.collection.get()
-            existing_docs = set()
-            if all_items['metadatas']:
-                for metadata in all_items['metadatas']:
-                    if isinstance(metadata, dict) and 'filename' in metadata:
-                        existing_docs.add(metadata['filename'])
-        except Exception as e:
-            logger.warning(f"Could not retrieve existing documents from ChromaDB: {e}")
-            existing_docs = set()
+        # temp_ files are uploads still being written
+        files = sorted(
+            file_path for file_path in doc_path.iterdir()
+            if file_path.is_file() and not file_path.name.endswith('.meta.json')
+            and not file_path.name.startswith('temp_')
+        )
 
-        # Process all documents in the directory
-        processed_count = 0
-        skipped_count = 0
+        # Reconcile the manifest with the vector store it describes
+        collection_count = await self.vector_store.count()
+        if not self.manifest.loaded_from_disk and collection_count > 0:
+            await self._seed_manifest_from_collection(files)
+        elif self.manifest.entries and collection_count == 0:
+            logger.warning("Index manifest present but collection is empty, re-indexing all documents")
+            self.manifest.clear()
 
-        for file_path in doc_path.iterdir():
-            if not file_path.is_file() or file_path.name.endswith('.meta.json'):
-                continue
+        # Off the loop: files whose size or mtime changed are hashed
+        diff = await asyncio.to_thread(self.manifest.diff, files)
 
-            filename = file_path.name
+        # Build the lexical index from already-embedded chunks the first time it is enabled
+        if not self.lexical_index.loaded_from_disk and diff.unchanged:
+            await self._rebuild_lexical_index()
 
-            # Check if already in ChromaDB
-            if filename in existing_docs:
-                self.loaded_documents.add(filename)
-                skipped_count += 1
-                continue
+        # Purge chunks of documents that no longer exist
+        for filename in diff.removed:
+            try:
+                await self._delete_chunks(filename)
+                logger.info(f"Purged removed document from index: {filename}")
+            except Exception as e:
+                logger.error(f"Error purging {filename}: {e}")
+            self.manifest.forget(filename)
+
+        self.loaded_documents.update(diff.unchanged)
 
-            # Load document into ChromaDB
+        # Drop stale chunks of changed documents before re-embedding them
+        for file_path in diff.changed:
             try:
-                logger.info(f"Auto-loading document: {filename}")
+                await self._delete_chunks(file_path.name)
+                self.manifest.forget(file_path.name)
+            except Exception as e:
+                logger.error(f"Error purging stale chunks of {file_path.name}: {e}")
 
-                # Load metadata if exists
-                metadata = None
-                metadata_path = file_path.with_suffix('.meta.json')
-                if metadata_path.exists():
-                    with open(metadata_path) as f:
-                        metadata = json.load(f)
+        # Ingest new and changed documents concurrently so extraction uses every core
+        self.indexing_progress.documents_total = len(diff.to_ingest)
+        semaphore = asyncio.Semaphore(self.extractor.max_workers)
 
-                # Add document to RAG (this will chunk, embed, and store it)
-                result = await self.add_document(str(file_path), metadata)
+        async def auto_load(file_path: Path) -> bool:
+            filename = file_path.name
+            async with semaphore:
+                try:
+                    logger.info(f"Auto-loading document: {filename}")
 
-                if result.get('status') == 'success':
-                    processed_count += 1
-                    logger.info(f"Successfully auto-loaded: {filename}")
-                else:
+                    # Load metadata if exists
+                    metadata = None
+                    metadata_path = file_path.with_suffix('.meta.json')
+                    if metadata_path.exists():
+                        with open(metadata_path) as f:
+                            metadata = json.load(f)
+
+                    # Add document to RAG (this will chunk, embed, and store it)
+                    result = await self.add_document(str(file_path), metadata)
+
+                    if result.get('status') == 'success':
+                        logger.info(f"Successfully auto-loaded: {filename}")
+                        self.indexing_progress.document_finished(success=True)
+                        return True
                     logger.warning(f"Failed to auto-load {filename}: {result.get('message')}")
 
-            except Exception as e:
-                logger.error(f"Error auto-loading {filename}: {e}")
+                except Exception as e:
+                    logger.error(f"Error auto-loading {filename}: {e}")
+                self.indexing_progress.document_finished(success=False)
+                return False
 
-        logger.info(f"Auto-load complete: {processed_count} documents processed, {skipped_count} already existed")
+        loaded = await asyncio.gather(*(auto_load(file_path) for file_path in diff.to_ingest))
+        processed_count = sum(loaded)
 
-    def _extract_content(self, file_path: str) -> str:
+        self.manifest.save()
+
+        logger.info(
+            f"Auto-load complete: {len(diff.added)} added, {len(diff.changed)} changed, "
+            f"{len(diff.removed)} removed, {len(diff.unchanged)} unchanged "
+            f"({processed_count} documents processed)"
+        )
+
+    async def _seed_manifest_from_collection(self, files: list[Path]) -> None:
         """
-        Extract content from various file formats.
-        Supports: PDF, DOCX, TXT, MD, and other text files.
+        One-time migration for collections indexed before the manifest existed.
+        Reads only chunk metadata, page by page, to find which documents are indexed.
+        Their chunking parameters are unknown, so they are recorded with legacy
+        parameters and re-indexed once by the sync that follows.
         """
-        file_path_obj = Path(file_path)
-        suffix = file_path_obj.suffix.lower()
-
-        try:
-            if suffix == '.pdf':
-                # Extract text from PDF
-                content = []
-                reader = PdfReader(file_path)
-                for page in reader.pages:
-                    content.append(page.extract_text())
-                return '\n'.join(content)
-
-            elif suffix == '.docx':
-                # Extract text from DOCX
-                doc = Document(file_path)
-                content = []
-                for para in doc.paragraphs:
-                    content.append(para.text)
-                return '\n'.join(content)
+        if self.vector_store is None:
+            return
 
+        chunk_counts: dict[str, int] = {}
+        page_size = 1000
+        offset = 0
+        while True:
+            page = await self.vector_store.get(include_documents=False, limit=page_size, offset=offset)
+            metadatas = page.metadatas
+            for metadata in metadatas:
+                if isinstance(metadata, dict) and 'filename' in metadata:
+                    filename = str(metadata['filename'])
+                    chunk_counts[filename] = chunk_counts.get(filename, 0) + 1
+            if len(metadatas) < page_size:
+                break
+            offset += page_size
+
+        files_by_name = {file_path.name: file_path for file_path in files}
+        for filename, chunks in chunk_counts.items():
+            if filename in files_by_name:
+                self.manifest.record(files_by_name[filename], chunks, sha256="", index_params=LEGACY_INDEX_PARAMS)
             else:
-                # Treat as text file (MD, TXT, etc.)
-                with open(file_path, encoding='utf-8') as f:
-                    return f.read()
+                # Orphaned chunks: keep an entry so the diff reports it as removed
+                self.manifest.entries[filename] = ManifestEntry(
+                    sha256="", size=0, mtime=0.0, chunks=chunks, index_params=dict(LEGACY_INDEX_PARAMS)
+                )
 
-        except UnicodeDecodeError:
-            # If UTF-8 fails, try with latin-1 encoding
-            logger.warning(f"UTF-8 decode failed for {file_path_obj.name}, trying latin-1")
-            with open(file_path, encoding='latin-1') as f:
-                return f.read()
+        logger.info(f"Seeded index manifest from existing collection ({len(chunk_counts)} documents)")
 
-    async def add_document(self, file_path: str, metadata: dict[str, Any] | None = None) -> dict[str, Any]:
+    async def _rebuild_lexical_index(self) -> None:
+        """Populate the BM25 index from chunk texts already stored in the collection."""
+        if self.vector_store is None:
+            return
+
+        self.lexical_index.clear()
+        page_size = 1000
+        offset = 0
+        while True:
+            page = await self.vector_store.get(limit=page_size, offset=offset)
+            self.lexical_index.add(page.ids, page.documents, page.metadatas)
+            if len(page.ids) < page_size:
+                break
+            offset += page_size
+
+        await asyncio.to_thread(self.lexical_index.save, self.lexical_index.snapshot())
+        logger.info(f"Rebuilt lexical index from collection ({len(self.lexical_index)} chunks)")
+
+    async def _delete_chunks(self, filename: str) -> None:
+        """Delete all chunks belonging to a document from the vector store and lexical index."""
+        if self.vector_store is None:
+            raise RuntimeError("Vector store not initialized")
+        await self.vector_store.delete(where={"filename": filename})
+        if self.lexical_index.remove_document(filename):
+            await asyncio.to_thread(self.lexical_index.save, self.lexical_index.snapshot())
+        self.loaded_documents.discard(filename)
+        self._bump_index_version()
+        if self.answer_cache:
+            self.answer_cache.invalidate_document(filename)
+
+    async def _extract_content(self, file_path: str) -> str:
+        """
+        Extract content from various file formats in the extraction process pool.
+        Supports: PDF, DOCX, TXT, MD, and other text files.
+        """
+        return await self.extractor.extract(file_path)
+
+    async def add_document(
+        self, file_path: str, metadata: dict[str, Any] | None = None, sha256: str | None = None
+    ) -> dict[str, Any]:
         """
         Add a new document to the RAG knowledge base.
+        Pass `sha256` when the file's hash is already known (e.g. computed while uploading).
         """
+        file_name = Path(file_path).name
+        claimed = False
         try:
             file_path_obj = Path(file_path)
-            file_name = file_path_obj.name
 
-            # Check if document already exists
-            if file_name in self.loaded_documents:
+            # Check if document already exists (or is being ingested by a concurrent request)
+            if file_name in self.loaded_documents or file_name in self._ingesting:
                 logger.warning(f"Document {file_name} already exists in knowledge base")
                 return {
                     "status": "exists",
@@ -209,11 +527,21 @@ class QueenRAGEngine:
                     "message": "Document already in knowledge base"
                 }
 
+            if not self.is_leader:
+                return self._queue_for_leader(file_path_obj, metadata)
+
+            self._ingesting.add(file_name)
+            claimed = True
+
+            if sha256 is None:
+                sha256 = await asyncio.to_thread(file_sha256, file_path_obj)
+
             # Read document content with proper file type handling
-            content = self._extract_content(file_path)
+            content = await self._extract_content(file_path)
 
-            # Split content into chunks
-            chunks = self._split_text(content)
+            # Split content into structure-aware chunks
+            doc_chunks = await asyncio.to_thread(self.chunker.split, content, file_path_obj.stem)
+            chunks = [chunk.text for chunk in doc_chunks]
 
             # Add to ChromaDB
             ids = [f"{file_name}_chunk_{i}" for i in range(len(chunks))]
@@ -222,21 +550,34 @@ class QueenRAGEngine:
                     "filename": file_name,
                     "chunk": i,
                     "total_chunks": len(chunks),
+                    "section": chunk.section,
                     **(metadata or {})
                 }
-                for i in range(len(chunks))
+                for i, chunk in enumerate(doc_chunks)
             ]
 
-            if self.collection is None:
-                raise RuntimeError("Collection not initialized")
-            self.collection.add(
-                documents=chunks,
-                ids=ids,
-                metadatas=metadatas  # type: ignore[arg-type]
-            )
+            if self.vector_store is None:
+                raise RuntimeError("Vector store not initialized")
+
+            try:
+                await self.embedding_pipeline.run(
+                    ids, chunks, metadatas, self.vector_store.add, on_batch=self.indexing_progress.add_chunks
+                )
+            except Exception:
+                # Don't leave a partially indexed document behind
+                await self._delete_chunks(file_name)
+                raise
+
+            self.lexical_index.add(ids, chunks, metadatas)
+            await asyncio.to_thread(self.lexical_index.save, self.lexical_index.snapshot())
 
             # Add to tracked documents
             self.loaded_documents.add(file_name)
+            self._bump_index_version()
+            if self.answer_cache:
+                self.answer_cache.invalidate_document(file_name)
+            self.manifest.record(file_path_obj, len(chunks), sha256=sha256)
+            self.manifest.save()
 
             # Store metadata if provided
             if metadata:
@@ -256,23 +597,22 @@ class QueenRAGEngine:
         except Exception as e:
             logger.error(f"Failed to add document {file_path}: {e}")
             raise
-
-    def _split_text(self, text: str, chunk_size: int | None = None, chunk_overlap: int | None = None) -> list[str]:
-        """
-        Split text into chunks.
-        """
-        chunk_size = chunk_size or settings.rag_chunk_size
-        chunk_overlap = chunk_overlap or settings.rag_chunk_overlap
-
-        chunks = []
-        start = 0
-
-        while start < len(text):
-            end = min(start + chunk_size, len(text))
-            chunks.append(text[start:end])
-            start += chunk_size - chunk_overlap
-
-        return chunks
+        finally:
+            if claimed:
+                self._ingesting.discard(file_name)
+
+    def _queue_for_leader(self, file_path: Path, metadata: dict[str, Any] | None) -> dict[str, Any]:
+        """Leave a saved upload for the ingestion leader to index on its next sync."""
+        if metadata:
+            with open(file_path.with_suffix('.meta.json'), 'w') as f:
+                json.dump(metadata, f)
+        self.sync_request.request()
+        logger.info(f"Queued {file_path.name} for indexing by the ingestion leader")
+        return {
+            "status": "queued",
+            "filename": file_path.name,
+            "message": "Document saved and queued for indexing"
+        }
 
     async def remove_document(self, filename: str) -> dict[str, Any]:
         """
@@ -281,6 +621,13 @@ class QueenRAGEngine:
         try:
             file_path = Path(settings.upload_directory) / filename
 
+            if filename in self._ingesting:
+                return {
+                    "status": "busy",
+                    "filename": filename,
+                    "message": "Document is still being ingested, try again shortly"
+                }
+
             if filename not in self.loaded_documents:
                 return {
                     "status": "not_found",
@@ -288,15 +635,9 @@ class QueenRAGEngine:
                     "message": "Document not found in knowledge base"
                 }
 
-            # Remove from ChromaDB
-            if self.collection is None:
-                raise RuntimeError("Collection not initialized")
-            results = self.collection.get(
-                where={"filename": filename}
-            )
-
-            if results['ids']:
-                self.collection.delete(ids=results['ids'])
+            # Read-only workers remove the file and let the leader purge its chunks
+            if self.is_leader:
+                await self._delete_chunks(filename)
 
             # Remove the file
             if file_path.exists():
@@ -309,6 +650,15 @@ class QueenRAGEngine:
 
             # Remove from tracked documents
             self.loaded_documents.discard(filename)
+            if not self.is_leader:
+                self.sync_request.request()
+                return {
+                    "status": "queued",
+                    "filename": filename,
+                    "message": "Document removed, index update queued"
+                }
+            self.manifest.forget(filename)
+            self.manifest.save()
 
             logger.info(f"Successfully removed document: {filename}")
 
@@ -392,6 +742,42 @@ class QueenRAGEngine:
 
         return "\n\n".join(insights) if insights else ""
 
+    @staticmethod
+    def _build_context_message(context_parts: list[str], contextual_insights: str) -> str:
+        """System message presenting retrieved sections with the synthesis instructions."""
+        context_text = "\n\n---\n\n".join(context_parts)
+
+        context_message = (
+            f"# Europe's Gate Knowledge Context\n\n"
+            f"Relevant sections from the Europe's Gate knowledge base (ranked by relevance):\n\n"
+            f"{context_text}\n\n"
+            f"---\n\n"
+            f"**CRITICAL - Cross-Document Synthesis Instructions:**\n\n"
+            f"You have {len(context_parts)} document sections above from different sources. Your job is to SYNTHESIZE:\n\n"
+            f"1. **CONNECT THE DOTS:**\n"
+            f"   - How do these documents relate? What's the narrative thread?\n"
+            f"   - What's consistent across documents? (validates the approach)\n"
+            f"   - What's complementary? (Doc A has strategy, Doc B has execution)\n\n"
+            f"2. **IDENTIFY CONFLICTS:**\n"
+            f"   - Do any sections contradict each other?\n"
+            f"   - Flag: 'Document A says X, but Document B suggests Y - this needs alignment'\n"
+            f"   - Are there version differences or evolving strategies?\n\n"
+            f"3. **SPOT THE GAPS:**\n"
+            f"   - What's missing between these documents?\n"
+            f"   - Doc A mentions X but doesn't detail it - is it covered elsewhere?\n"
+            f"   - What questions can't be fully answered with available docs?\n\n"
+            f"4. **BUILD THE NARRATIVE:**\n"
+            f"   - Don't just quote - synthesize into a coherent story\n"
+            f"   - Show cascading impacts: governance → finance → tech → operations\n"
+            f"   - Cite specifically: [Sources: Doc1.md Section X + Doc2.md Section Y]\n\n"
+            f"Remember: You're a strategic analyst, not a document summarizer. Synthesize insights across sources.\n"
+        )
+
+        # Add contextual insights if available
+        if contextual_insights:
+            context_message += f"\n**Strategic Insights for This Question:**\n\n{contextual_insights}"
+        return context_message
+
     async def web_search(self, query: str, max_results: int = 5) -> list[dict[str, Any]]:
         """
         Search the web for relevant information (Coming Soon).
@@ -407,42 +793,224 @@ class QueenRAGEngine:
         logger.info(f"Web search requested for: {query} (Coming Soon feature)")
         return []
 
-    async def search(self, query: str, top_k: int | None = None) -> list[dict[str, Any]]:
+    async def _embed_query(self, query: str) -> list[float]:
+        """Embed a search query, serving repeats from the in-process cache."""
+        if self.retrieval_cache:
+            cached = self.retrieval_cache.get_embedding(query)
+            if cached is not None:
+                return cached
+
+        embedding = (await self.embedder.embed([query]))[0]
+        if self.retrieval_cache:
+            self.retrieval_cache.put_embedding(query, embedding)
+        return embedding
+
+    async def _embed_texts(self, texts: list[str]) -> list[list[float]]:
+        """Embed texts in token-bounded batches through the shared (cached) embedder."""
+        ids = [str(i) for i in range(len(texts))]
+        vectors: dict[str, list[float]] = {}
+
+        async def collect(
+            batch_ids: list[str], embeddings: list[list[float]], _texts: list[str], _metadatas: list[dict[str, Any]]
+        ) -> None:
+            vectors.update(zip(batch_ids, embeddings, strict=True))
+
+        await self.embedding_pipeline.run(ids, texts, [{} for _ in texts], collect)
+        return [vectors[i] for i in ids]
+
+    async def _extract_attachment(self, filename: str, content: str) -> str:
+        """Text of a chat attachment, using the same extractors as uploaded documents."""
+        decoded = decode_attachment(content)
+        if isinstance(decoded, str):
+            return decoded
+
+        def write_temp() -> str:
+            with tempfile.NamedTemporaryFile(suffix=Path(filename).suffix, delete=False) as f:
+                f.write(decoded)
+                return f.name
+
+        temp_path = await asyncio.to_thread(write_temp)
+        try:
+            return await self._extract_content(temp_path)
+        finally:
+            Path(temp_path).unlink(missing_ok=True)
+
+    async def store_attachment(
+        self, temp_path: Path, digest: str, size: int, filename: str, content_type: str
+    ) -> StoredAttachment:
+        """
+        Keep an uploaded chat attachment under its content hash, extracting its
+        text (documents) or preprocessing it (images) once. Uploading the same
+        content again returns the existing handle. Raises ValueError for files
+        that can't be used.
+        """
+        existing = await asyncio.to_thread(self.attachment_store.get, digest)
+        if existing is not None:
+            self.attachment_store.reused += 1
+            await asyncio.to_thread(temp_path.unlink, True)
+            return existing
+
+        try:
+            if content_type.startswith("image/"):
+                payload = await asyncio.to_thread(temp_path.read_bytes)
+                try:
+                    image = await self.image_preprocessor.process(payload, settings.image_detail)
+                except Exception as e:
+                    raise ValueError(f"Could not read image {filename}: {e}") from e
+                attachment = StoredAttachment(digest, filename, content_type, "image", size, image=image)
+            else:
+                text = await self._extract_content(str(temp_path))
+                if not text.strip():
+                    raise ValueError(f"No text could be extracted from {filename}")
+                attachment = StoredAttachment(digest, filename, content_type, "document", size, text=text)
+            await asyncio.to_thread(self.attachment_store.put, attachment, temp_path)
+        except BaseException:
+            await asyncio.to_thread(temp_path.unlink, True)
+            raise
+
+        await asyncio.to_thread(self.attachment_store.sweep)
+        logger.info(f"Stored {attachment.kind} attachment {filename} as {digest[:12]}")
+        return attachment
+
+    async def get_attachments(self, attachment_ids: list[str]) -> list[StoredAttachment]:
+        """Stored attachments by ID, in order; raises KeyError naming the first unknown or expired one."""
+        attachments = []
+        for attachment_id in attachment_ids:
+            attachment = await asyncio.to_thread(self.attachment_store.get, attachment_id)
+            if attachment is None:
+                raise KeyError(attachment_id)
+            attachments.append(attachment)
+        return attachments
+
+    async def _index_attachments(self, key: str, attachments: list[dict[str, Any]]) -> None:
+        """
+        Chunk and embed document attachments not yet in the conversation's attachment index.
+        Each is either inline (`content`) or already extracted (`text`, with its `digest`).
+        """
+        for attachment in attachments:
+            filename = attachment.get('name') or 'attachment'
+            content = attachment.get('content') or ''
+            text = attachment.get('text')
+            digest = attachment.get('digest') or attachment_digest(filename, content)
+            if (not content and not text) or self.attachment_index.has(key, digest):
+                continue
+
+            if text is None:
+                text = await self._extract_attachment(filename, content)
+            # Don't pay to embed chunks past the per-conversation limit
+            chunks = (await asyncio.to_thread(self.chunker.split, text, filename))[
+                :self.attachment_index.remaining_chunks(key)
+            ]
+            embeddings = await self._embed_texts([chunk.text for chunk in chunks]) if chunks else []
+            self.attachment_index.add(key, digest, filename, chunks, embeddings)
+            logger.info(f"Indexed attachment {filename}: {len(chunks)} chunks")
+
+    async def _vector_search(self, query: str, top_k: int, where: dict[str, Any] | None) -> list[dict[str, Any]]:
+        """Dense retrieval: embed the query through the shared (cached) embedder and query the vector store."""
+        if self.vector_store is None:
+            raise RuntimeError("Vector store not initialized")
+
+        query_embedding = await self._embed_query(query)
+        hits = (await self.vector_store.query([query_embedding], n_results=top_k, where=where))[0]
+
+        # Format results
+        return [
+            {
+                "index": idx,
+                "id": hit.id,
+                "content": hit.document,
+                "metadata": hit.metadata,
+                "score": 1.0 - (hit.distance / 2.0)  # Convert distance to similarity score
+            }
+            for idx, hit in enumerate(hits)
+        ]
+
+    def _lexical_search(self, query: str, top_k: int, where: dict[str, Any] | None) -> list[dict[str, Any]]:
+        """BM25 retrieval from the in-memory index - no network call."""
+        ranked = self.lexical_index.search(query, top_k, where)
+        best = ranked[0][1] if ranked else 1.0
+        return [
+            {
+                "index": idx,
+                "id": chunk_id,
+                "content": self.lexical_index.chunks[chunk_id]["text"],
+                "metadata": self.lexical_index.chunks[chunk_id]["metadata"],
+                "score": score / best  # Relative to the best lexical match
+            }
+            for idx, (chunk_id, score) in enumerate(ranked)
+        ]
+
+    def _fuse_results(
+        self,
+        vector_results: list[dict[str, Any]],
+        lexical_results: list[dict[str, Any]],
+        top_k: int
+    ) -> list[dict[str, Any]]:
+        """Merge dense and lexical rankings with reciprocal rank fusion."""
+        by_id = {r["id"]: r for r in lexical_results}
+        by_id.update({r["id"]: r for r in vector_results})
+        fused = reciprocal_rank_fusion(
+            [[r["id"] for r in vector_results], [r["id"] for r in lexical_results]],
+            k=settings.rrf_k
+        )
+        # Normalise so a chunk ranked first by both retrievers scores 1.0
+        max_score = 2.0 / (settings.rrf_k + 1)
+        return [
+            {**by_id[chunk_id], "index": idx, "score": min(1.0, score / max_score)}
+            for idx, (chunk_id, score) in enumerate(fused[:top_k])
+        ]
+
+    async def search(
+        self,
+        query: str,
+        top_k: int | None = None,
+        where: dict[str, Any] | None = None
+    ) -> list[dict[str, Any]]:
         """
-        Search for relevant documents using semantic search.
+        Search for relevant documents using vector, lexical (BM25) or hybrid retrieval.
         """
         try:
             top_k = top_k or settings.rag_top_k_results
 
-            # Query ChromaDB - this creates embeddings and performs vector search
-            if self.collection is None:
-                raise RuntimeError("Collection not initialized")
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=top_k
-            )
+            if self.vector_store is None:
+                raise RuntimeError("Vector store not initialized")
 
-            # Format results
-            formatted_results = []
-            if (results['documents'] and results['documents'][0] and
-                results['metadatas'] and results['metadatas'][0] and
-                results['distances'] and results['distances'][0]):
-                for idx, (doc, metadata, distance) in enumerate(zip(
-                    results['documents'][0],
-                    results['metadatas'][0],
-                    results['distances'][0], strict=False
-                )):
-                    similarity_score = 1.0 - (distance / 2.0)  # Convert distance to similarity score
-                    formatted_results.append({
-                        "index": idx,
-                        "content": doc,
-                        "metadata": metadata,
-                        "score": similarity_score
-                    })
+            # Serve repeated searches against an unchanged index from cache
+            cache_key = RetrievalCache.result_key(query, top_k, where, self.index_version)
+            if self.retrieval_cache:
+                cached_results = self.retrieval_cache.results.get(cache_key)
+                if cached_results is not None:
+                    return [dict(r) for r in cached_results]
+
+            mode = settings.retrieval_mode
+            degraded = False
+            if mode == "lexical":
+                formatted_results = self._lexical_search(query, top_k, where)
+            else:
+                try:
+                    if mode == "vector":
+                        formatted_results = await self._vector_search(query, top_k, where)
+                    else:
+                        # Hybrid: fuse wider candidate lists from both retrievers with reciprocal rank fusion
+                        candidates = top_k * settings.hybrid_candidate_multiplier
+                        vector_results = await self._vector_search(query, candidates, where)
+                        lexical_results = self._lexical_search(query, candidates, where)
+                        formatted_results = self._fuse_results(vector_results, lexical_results, top_k)
+                except Exception as e:
+                    if not is_provider_outage(e):
+                        raise
+                    # Query embeddings are unavailable; BM25 needs no network call
+                    logger.warning(f"Vector retrieval unavailable, serving lexical results: {e}")
+                    self.lexical_fallbacks += 1
+                    degraded = True
+                    formatted_results = self._lexical_search(query, top_k, where)
 
             # Log search results with top-K info
             logger.debug(f"Search query: '{query}' returned top {len(formatted_results)} most similar results")
 
+            if self.retrieval_cache and not degraded:
+                self.retrieval_cache.results.put(cache_key, [dict(r) for r in formatted_results])
+
             return formatted_results
 
         except Exception as e:
@@ -455,13 +1023,47 @@ class QueenRAGEngine:
         history: list[dict[str, str]] | None = None,
         use_rag: bool = True,
         stream: bool = True,
-        images: list[dict[str, Any]] | None = None
+        images: list[dict[str, Any]] | None = None,
+        conversation_id: str | None = None,
+        attachments: list[dict[str, Any]] | None = None,
+        stored_attachments: list[StoredAttachment] | None = None
     ) -> AsyncIterator[str]:
         """
         Chat with the AI using RAG-enhanced context.
+        Document attachments are indexed for the conversation; only their chunks
+        relevant to the message are added to the context. Stored attachments
+        (uploaded once, see `store_attachment`) are used as already extracted
+        or preprocessed.
         """
+        # Without a session, attachments are only searchable for this request
+        attachment_key = f"session:{conversation_id}" if conversation_id else f"request:{uuid.uuid4().hex}"
         try:
             history = history or []
+            full_history = history
+
+            # Replace older turns with the conversation's rolling summary, when one is ready
+            conversation_key = HistorySummarizer.conversation_key(conversation_id, history)
+            if self.summarizer:
+                history = self.summarizer.apply(conversation_key, history)
+
+            image_parts = await self.image_preprocessor.prepare(images) if images else []
+            attachments = list(attachments or [])
+            for stored in stored_attachments or []:
+                if stored.image is not None:
+                    image_parts.append(self.image_preprocessor.use(stored.image))
+                elif stored.text is not None:
+                    attachments.append({'name': stored.filename, 'text': stored.text, 'digest': stored.id})
+
+            if attachments:
+                await self._index_attachments(attachment_key, attachments)
+            has_attachments = self.attachment_index.has(attachment_key)
+
+            # Only self-contained questions are answered from the semantic answer cache
+            answer_cache_key: tuple[list[float], list[str], set[str]] | None = None
+            cache_eligible = (
+                self.answer_cache is not None and use_rag and not history and not image_parts
+                and not has_attachments and settings.retrieval_mode != "lexical"
+            )
 
             # Build messages list
             messages = []
@@ -522,83 +1124,91 @@ class QueenRAGEngine:
                 "Remember: You're not a document reader - you're a strategic partner helping shape a transformative project. "
                 "Every response should move the project forward, not just inform."
             )
-            messages.append({"role": "system", "content": system_prompt})
-
             # Add RAG context if enabled
-            if use_rag and self.collection:
+            context_parts: list[str] = []
+            contextual_insights = ""
+
+            # Attachment chunks matching the question come first; the user attached them on purpose
+            if has_attachments:
+                query_embedding = await self._embed_query(message)
+                for chunk, score in self.attachment_index.search(
+                    attachment_key, query_embedding, settings.attachment_top_k
+                ):
+                    location = chunk.section if chunk.section != chunk.filename else f"Part {chunk.part}/{chunk.total}"
+                    context_parts.append(
+                        f"[📎 Attached: {chunk.filename} | {location} | Relevance: {score:.0%}]\n"
+                        f"{chunk.text}"
+                    )
+
+            if use_rag and self.vector_store:
                 # Perform vector search to find relevant context
                 context_results = await self.search(message, top_k=settings.rag_top_k_results)
 
+                if cache_eligible and context_results and self.answer_cache:
+                    query_embedding = await self._embed_query(message)
+                    chunk_ids = [r['id'] for r in context_results]
+                    cached_answer = self.answer_cache.lookup(query_embedding, chunk_ids, settings.openai_model)
+                    if cached_answer is not None:
+                        # Replay the stored answer through the same streaming interface
+                        logger.info("Serving answer from semantic answer cache")
+                        for piece in (replay_chunks(cached_answer) if stream else [cached_answer]):
+                            yield piece
+                        return
+                    filenames = {str(r['metadata'].get('filename', '')) for r in context_results}
+                    answer_cache_key = (query_embedding, chunk_ids, filenames)
+
                 if context_results:
                     # Build context from retrieved chunks with improved formatting
-                    context_parts = []
                     for _idx, r in enumerate(context_results, 1):
                         filename = r['metadata'].get('filename', 'Unknown')
                         chunk_num = r['metadata'].get('chunk', 0) + 1
                         total_chunks = r['metadata'].get('total_chunks', 'Unknown')
+                        section = r['metadata'].get('section')
                         score = r.get('score', 0)
+                        location = section or f"Section {chunk_num}/{total_chunks}"
 
                         # Include all top-K results with similarity scores for LLM to evaluate
                         context_parts.append(
-                            f"[📄 {filename} | Section {chunk_num}/{total_chunks} | Confidence: {score:.0%}]\n"
+                            f"[📄 {filename} | {location} | Confidence: {score:.0%}]\n"
                             f"{r['content']}"
                         )
 
-                    if context_parts:
-                        context_text = "\n\n---\n\n".join(context_parts)
-
-                        # Generate contextual insights for Europe's Gate
-                        contextual_insights = self._generate_contextual_insights(message)
-
-                        context_message = (
-                            f"# Europe's Gate Knowledge Context\n\n"
-                            f"Relevant sections from the Europe's Gate knowledge base (ranked by relevance):\n\n"
-                            f"{context_text}\n\n"
-                            f"---\n\n"
-                            f"**CRITICAL - Cross-Document Synthesis Instructions:**\n\n"
-                            f"You have {len(context_parts)} document sections above from different sources. Your job is to SYNTHESIZE:\n\n"
-                            f"1. **CONNECT THE DOTS:**\n"
-                            f"   - How do these documents relate? What's the narrative thread?\n"
-                            f"   - What's consistent across documents? (validates the approach)\n"
-                            f"   - What's complementary? (Doc A has strategy, Doc B has execution)\n\n"
-                            f"2. **IDENTIFY CONFLICTS:**\n"
-                            f"   - Do any sections contradict each other?\n"
-                            f"   - Flag: 'Document A says X, but Document B suggests Y - this needs alignment'\n"
-                            f"   - Are there version differences or evolving strategies?\n\n"
-                            f"3. **SPOT THE GAPS:**\n"
-                            f"   - What's missing between these documents?\n"
-                            f"   - Doc A mentions X but doesn't detail it - is it covered elsewhere?\n"
-                            f"   - What questions can't be fully answered with available docs?\n\n"
-                            f"4. **BUILD THE NARRATIVE:**\n"
-                            f"   - Don't just quote - synthesize into a coherent story\n"
-                            f"   - Show cascading impacts: governance → finance → tech → operations\n"
-                            f"   - Cite specifically: [Sources: Doc1.md Section X + Doc2.md Section Y]\n\n"
-                            f"Remember: You're a strategic analyst, not a document summarizer. Synthesize insights across sources.\n"
-                        )
+                    # Generate contextual insights for Europe's Gate
+                    contextual_insights = self._generate_contextual_insights(message)
 
-                        # Add contextual insights if available
-                        if contextual_insights:
-                            context_message += f"\n**Strategic Insights for This Question:**\n\n{contextual_insights}"
-
-                        messages.append({"role": "system", "content": context_message})
+            # Fit the prompt into the input budget: message, then top chunks, then recent history
+            packed = self.context_packer.pack(
+                system_prompt,
+                message,
+                context_parts,
+                self._build_context_message([], contextual_insights),
+                history
+            )
 
-            # Add chat history
-            messages.extend(history)
+            # Stable prefix first so the provider's prompt cache covers persona and history;
+            # retrieved context changes every turn and goes right before the user message
+            messages.append({"role": "system", "content": system_prompt})
+            messages.extend(packed.history)
+            if packed.context_parts:
+                messages.append({
+                    "role": "system",
+                    "content": self._build_context_message(packed.context_parts, contextual_insights)
+                })
 
             # Add current message (with images if present)
-            if images:
+            if image_parts:
                 # For vision models, create message with text and images
                 user_content = [{"type": "text", "text": message}]
-                user_content.extend(images)
+                user_content.extend(image_parts)
                 messages.append({"role": "user", "content": user_content})  # type: ignore[dict-item]
-                logger.info(f"Processing message with {len(images)} image(s)")
+                logger.info(f"Processing message with {len(image_parts)} image(s)")
                 logger.debug(f"Message structure for vision: {len(user_content)} content parts")
             else:
                 messages.append({"role": "user", "content": message})
 
             # Get response from OpenAI
             # gpt-4o has built-in vision capabilities
-            response = await self.openai_client.chat.completions.create(
+            response = await self.openai.chat_completion(
                 model=settings.openai_model,
                 messages=messages,  # type: ignore
                 stream=stream,
@@ -607,29 +1217,84 @@ class QueenRAGEngine:
                 stream_options={"include_usage": True} if stream else None
             )
 
+            answer_parts: list[str] = []
+
             if stream:
                 # Stream response chunks and track usage
-                async for chunk in response:  # type: ignore
-                    if chunk.choices[0].delta.content:
-                        yield chunk.choices[0].delta.content
-                    # Check for usage in final chunk
-                    if hasattr(chunk, 'usage') and chunk.usage:
-                        prompt_tokens = chunk.usage.prompt_tokens
-                        completion_tokens = chunk.usage.completion_tokens
-                        if token_tracker and prompt_tokens and completion_tokens:
-                            token_tracker.add_usage(prompt_tokens, completion_tokens, settings.openai_model)
+                usage_recorded = False
+                try:
+                    async for chunk in response:  # type: ignore
+                        # The final usage chunk has no choices
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            answer_parts.append(chunk.choices[0].delta.content)
+                            yield chunk.choices[0].delta.content
+                        # Check for usage in final chunk
+                        if hasattr(chunk, 'usage') and chunk.usage:
+                            usage_recorded = True
+                            prompt_tokens = chunk.usage.prompt_tokens
+                            completion_tokens = chunk.usage.completion_tokens
+                            if token_tracker and prompt_tokens and completion_tokens:
+                                token_tracker.add_usage(
+                                    prompt_tokens, completion_tokens, settings.openai_model,
+                                    cached_tokens=cached_prompt_tokens(chunk.usage)
+                                )
+                except (asyncio.CancelledError, GeneratorExit):
+                    # The client went away: stop the generation upstream and bill what was produced
+                    if not usage_recorded:
+                        await self._abort_generation(response, packed.prompt_tokens, answer_parts)
+                    raise
+                self.completed_generations += 1
             else:
                 # Return complete response and track usage
                 if hasattr(response, 'usage') and response.usage:
                     prompt_tokens = response.usage.prompt_tokens
                     completion_tokens = response.usage.completion_tokens
                     if token_tracker and prompt_tokens and completion_tokens:
-                        token_tracker.add_usage(prompt_tokens, completion_tokens, settings.openai_model)
+                        token_tracker.add_usage(
+                            prompt_tokens, completion_tokens, settings.openai_model,
+                            cached_tokens=cached_prompt_tokens(response.usage)
+                        )
+                answer_parts.append(response.choices[0].message.content or "")  # type: ignore
+                self.completed_generations += 1
                 yield response.choices[0].message.content  # type: ignore
 
+            # Fold older turns into the summary for the next request, off the critical path
+            if self.summarizer and answer_parts:
+                self.summarizer.schedule(
+                    conversation_key,
+                    [
+                        *full_history,
+                        {"role": "user", "content": message},
+                        {"role": "assistant", "content": "".join(answer_parts)}
+                    ]
+                )
+
+            # Only complete answers reach this point; remember them for similar questions
+            if answer_cache_key and self.answer_cache and answer_parts:
+                query_embedding, chunk_ids, filenames = answer_cache_key
+                self.answer_cache.store(
+                    query_embedding, chunk_ids, filenames, settings.openai_model, "".join(answer_parts)
+                )
+
         except Exception as e:
             logger.error(f"Chat failed for message '{message}': {e}")
             raise
+        finally:
+            if not conversation_id:
+                self.attachment_index.discard(attachment_key)
+
+    async def _abort_generation(self, response: Any, prompt_tokens: int, answer_parts: list[str]) -> None:
+        """Close an abandoned completion stream and record its estimated usage."""
+        # The final usage chunk never arrives, so estimate from the prompt and what was streamed
+        completion_tokens = count_tokens("".join(answer_parts), settings.openai_model) if answer_parts else 0
+        self.aborted_generations += 1
+        self.aborted_completion_tokens += completion_tokens
+        if token_tracker and prompt_tokens:
+            token_tracker.add_usage(prompt_tokens, completion_tokens, settings.openai_model)
+        logger.info(f"Generation aborted by client after ~{completion_tokens} completion tokens")
+
+        with contextlib.suppress(Exception):
+            await response.close()
 
     async def get_document_list(self) -> list[dict[str, Any]]:
         """
@@ -666,7 +1331,23 @@ class QueenRAGEngine:
         Cleanup resources when shutting down.
         """
         try:
+            if self.summarizer:
+                await self.summarizer.shutdown()
+
+            for task in (self._coordination_task, self._indexing_task):
+                if task and not task.done():
+                    task.cancel()
+                    with contextlib.suppress(asyncio.CancelledError):
+                        await task
+
             # ChromaDB handles its own cleanup
+            self.extractor.shutdown()
+            if self.vector_store:
+                self.vector_store.shutdown()
+            if self.embedding_cache:
+                self.embedding_cache.close()
+            await self.openai.close()
+            self.leadership.release()
             logger.info("QueenRAGEngine cleaned up successfully")
 
         except Exception as e:
@@ -677,10 +1358,32 @@ class QueenRAGEngine:
         Check health status of the RAG engine.
         """
         return {
-            "status": "healthy" if self.collection else "unhealthy",
+            "status": "healthy" if self.vector_store else "unhealthy",
             "documents_count": len(self.loaded_documents),
-            "vector_store": "chroma",
+            "vector_store": self.vector_store.name if self.vector_store else settings.vector_store_backend,
             "model": settings.openai_model,
             "embedding_model": settings.openai_embedding_model,
-            "initialized": self.collection is not None
+            "initialized": self.vector_store is not None,
+            "role": "leader" if self.is_leader else "reader",
+            "vector_store_access": self.vector_store.stats() if self.vector_store else {},
+            "indexing": self.indexing_progress.as_dict(),
+            "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else {"enabled": False},
+            "retrieval_cache": self.retrieval_cache.stats() if self.retrieval_cache else {"enabled": False},
+            "answer_cache": self.answer_cache.stats() if self.answer_cache else {"enabled": False},
+            "index_version": self.index_version,
+            "retrieval_mode": settings.retrieval_mode,
+            "context_packing": self.context_packer.stats(),
+            "history_summary": self.summarizer.stats() if self.summarizer else {"enabled": False},
+            "admission": self.admission.stats(),
+            "openai": self.openai.stats(),
+            "attachments": self.attachment_index.stats(),
+            "images": self.image_preprocessor.stats(),
+            "attachment_store": self.attachment_store.stats(),
+            "lexical_fallbacks": self.lexical_fallbacks,
+            "generations": {
+                "completed": self.completed_generations,
+                "aborted": self.aborted_generations,
+                "aborted_completion_tokens": self.aborted_completion_tokens
+            },
+            "lexical_index_chunks": len(self.lexical_index)
         }
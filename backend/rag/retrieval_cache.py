@@ -0,0 +1,131 @@
+"""In-process retrieval caches: query embeddings and versioned search results."""
+import json
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used as cache key."""
+    return " ".join(query.lower().split())
+
+
+def embedding_size(vector: list[float]) -> int:
+    """Approximate memory held by a list of Python floats."""
+    return sys.getsizeof(vector) + len(vector) * sys.getsizeof(0.0)
+
+
+def results_size(results: list[dict[str, Any]]) -> int:
+    """Approximate memory held by formatted search results."""
+    return sum(len(r.get("content", "")) + 512 for r in results) + 64
+
+
+class TTLCache:
+    """
+    LRU cache with per-entry expiry and a memory budget.
+
+    Not thread-safe: it is only touched from the event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        sizeof: Callable[[Any], int]
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sizeof = sizeof
+        self._entries: OrderedDict[Hashable, tuple[float, int, Any]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, _, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+        self._bytes += size
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_mb": round(self._bytes / (1024 * 1024), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+class RetrievalCache:
+    """
+    Two cache tiers in front of search.
+
+    Tier 1 maps normalized query text to its embedding. Tier 2 maps
+    (query, top_k, filters, index version) to formatted results; bumping the
+    index version on every add/remove makes stale results unreachable.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_entries: int,
+        embedding_max_mb: int,
+        results_max_mb: int
+    ) -> None:
+        self.embeddings = TTLCache(max_entries, embedding_max_mb * 1024 * 1024, ttl_seconds, embedding_size)
+        self.results = TTLCache(max_entries, results_max_mb * 1024 * 1024, ttl_seconds, results_size)
+
+    @staticmethod
+    def result_key(query: str, top_k: int, where: dict[str, Any] | None, index_version: int) -> Hashable:
+        filters = json.dumps(where, sort_keys=True, default=str) if where else ""
+        return (normalize_query(query), top_k, filters, index_version)
+
+    def get_embedding(self, query: str) -> list[float] | None:
+        value: list[float] | None = self.embeddings.get(normalize_query(query))
+        return value
+
+    def put_embedding(self, query: str, embedding: list[float]) -> None:
+        self.embeddings.put(normalize_query(query), embedding)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "query_embeddings": self.embeddings.stats(),
+            "results": self.results.stats()
+        }
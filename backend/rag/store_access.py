@@ -0,0 +1,160 @@
+"""
+Awaitable access to a VectorStore.
+
+Store operations are blocking (SQLite/HNSW for Chroma, file I/O for NumPy), so
+they run on a dedicated bounded thread pool. A reader/writer lock lets searches
+run in parallel while adds and deletes are serialized, and queue depth and wait
+times are tracked so slow ingestion shows up in health output.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, TypeVar
+
+from .vector_store import StoredChunks, VectorHit, VectorStore
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AsyncRWLock:
+    """Reader/writer lock for asyncio; waiting writers block new readers so ingestion can't starve."""
+
+    def __init__(self) -> None:
+        self._condition = asyncio.Condition()
+        self.readers = 0
+        self.writer_active = False
+        self.writers_waiting = 0
+
+    @asynccontextmanager
+    async def read(self) -> Any:
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self.writer_active and self.writers_waiting == 0)
+            self.readers += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.readers -= 1
+                self._condition.notify_all()
+
+    @asynccontextmanager
+    async def write(self) -> Any:
+        async with self._condition:
+            self.writers_waiting += 1
+            try:
+                await self._condition.wait_for(lambda: not self.writer_active and self.readers == 0)
+            finally:
+                self.writers_waiting -= 1
+            self.writer_active = True
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.writer_active = False
+                self._condition.notify_all()
+
+
+class AsyncVectorStore:
+    """VectorStore wrapper whose methods are coroutines running on a bounded executor."""
+
+    def __init__(self, store: VectorStore, max_workers: int) -> None:
+        self.store = store
+        self.name = store.name
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vector-store")
+        self._lock = AsyncRWLock()
+        self._counter_lock = threading.Lock()
+        self.max_workers = max_workers
+        self.queued = 0
+        self.running = 0
+        self.operations = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def _run(self, write: bool, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        enqueued_at = time.perf_counter()
+        started = False
+        with self._counter_lock:
+            self.queued += 1
+
+        def call() -> T:
+            nonlocal started
+            # Wait time covers both the lock and the executor queue
+            wait = time.perf_counter() - enqueued_at
+            with self._counter_lock:
+                started = True
+                self.queued -= 1
+                self.running += 1
+                self.total_wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._counter_lock:
+                    self.running -= 1
+                    self.operations += 1
+
+        try:
+            async with self._lock.write() if write else self._lock.read():
+                return await loop.run_in_executor(self._executor, call)
+        finally:
+            with self._counter_lock:
+                if not started:
+                    self.queued -= 1
+
+    async def add(
+        self,
+        ids: list[str],
+        embeddings: list[list[float]],
+        documents: list[str],
+        metadatas: list[dict[str, Any]]
+    ) -> None:
+        await self._run(True, self.store.add, ids, embeddings, documents, metadatas)
+
+    async def delete(self, ids: list[str] | None = None, where: dict[str, Any] | None = None) -> None:
+        await self._run(True, self.store.delete, ids=ids, where=where)
+
+    async def query(
+        self,
+        embeddings: list[list[float]],
+        n_results: int,
+        where: dict[str, Any] | None = None
+    ) -> list[list[VectorHit]]:
+        return await self._run(False, self.store.query, embeddings, n_results, where)
+
+    async def get(
+        self,
+        where: dict[str, Any] | None = None,
+        include_documents: bool = True,
+        limit: int | None = None,
+        offset: int = 0
+    ) -> StoredChunks:
+        return await self._run(False, self.store.get, where, include_documents, limit, offset)
+
+    async def count(self) -> int:
+        return await self._run(False, self.store.count)
+
+    async def reload(self) -> None:
+        await self._run(True, self.store.reload)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "queued": self.queued,
+            "running": self.running,
+            "active_readers": self._lock.readers,
+            "writer_active": self._lock.writer_active,
+            "writers_waiting": self._lock.writers_waiting,
+            "operations": self.operations,
+            "avg_wait_ms": round(self.total_wait_seconds / self.operations * 1000, 2) if self.operations else 0.0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 2)
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,167 @@
+"""Rolling summaries of long chat histories, computed off the request path."""
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from .tokens import cached_prompt_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between an executive and the Europe's Gate "
+    "Strategic Advisor. Update the summary with the new turns. Keep every decision, figure, open "
+    "question, document reference and stated preference; drop pleasantries and repetition. "
+    "Write compact bullet points, at most {max_words} words."
+)
+
+
+def _turns_digest(turns: list[dict[str, Any]]) -> str:
+    digest = hashlib.sha256()
+    for turn in turns:
+        digest.update(json.dumps([turn.get("role"), turn.get("content")], ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class HistorySummary:
+    """Summary of the first `covered_turns` turns of a conversation."""
+    covered_turns: int
+    prefix_digest: str
+    text: str
+
+
+class HistorySummarizer:
+    """
+    Replaces older turns with a summary once a conversation passes a threshold.
+
+    After each response, `schedule` starts a background task that folds turns
+    older than the most recent `keep_recent_turns` into the conversation's
+    summary with a small model. `apply` only uses a summary whose covered
+    turns still match the history exactly, so an edited history falls back
+    to raw turns rather than a wrong summary.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        model: str,
+        threshold_turns: int,
+        keep_recent_turns: int,
+        max_tokens: int,
+        max_entries: int,
+        usage_tracker: Any = None
+    ) -> None:
+        self.client = client
+        self.model = model
+        self.threshold_turns = threshold_turns
+        self.keep_recent_turns = keep_recent_turns
+        self.max_tokens = max_tokens
+        self.max_entries = max_entries
+        self.usage_tracker = usage_tracker
+        self._summaries: OrderedDict[str, HistorySummary] = OrderedDict()
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+        self.summaries_created = 0
+        self.turns_replaced = 0
+        self.failures = 0
+
+    @staticmethod
+    def conversation_key(conversation_id: str | None, history: list[dict[str, Any]]) -> str | None:
+        """Session ID when known, else a hash of the opening exchange."""
+        if conversation_id:
+            return f"session:{conversation_id}"
+        if len(history) < 2:
+            return None
+        return f"history:{_turns_digest(history[:2])}"
+
+    def apply(self, key: str | None, history: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Return history with summarized turns replaced by one summary message."""
+        if key is None or len(history) <= self.threshold_turns:
+            return history
+        summary = self._summaries.get(key)
+        if summary is None or summary.covered_turns > len(history):
+            return history
+        if _turns_digest(history[:summary.covered_turns]) != summary.prefix_digest:
+            return history
+
+        self._summaries.move_to_end(key)
+        self.turns_replaced += summary.covered_turns
+        return [
+            {"role": "system", "content": f"Summary of the earlier conversation:\n{summary.text}"},
+            *history[summary.covered_turns:]
+        ]
+
+    def schedule(self, key: str | None, history: list[dict[str, Any]]) -> None:
+        """Start a background summary update if enough unsummarized turns have built up."""
+        if key is None or len(history) <= self.threshold_turns or key in self._tasks:
+            return
+        target = len(history) - self.keep_recent_turns
+        summary = self._summaries.get(key)
+        if summary is not None and _turns_digest(history[:summary.covered_turns]) != summary.prefix_digest:
+            summary = None
+        covered = summary.covered_turns if summary else 0
+        # Re-summarize in steps, not after every turn
+        if target - covered < self.keep_recent_turns:
+            return
+
+        task = asyncio.create_task(self._summarize(key, history[:target], summary))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+
+    async def _summarize(self, key: str, turns: list[dict[str, Any]], previous: HistorySummary | None) -> None:
+        new_turns = turns[previous.covered_turns:] if previous else turns
+        transcript = "\n\n".join(f"{turn['role'].upper()}: {turn['content']}" for turn in new_turns)
+        prompt = (
+            f"Current summary:\n{previous.text}\n\nNew turns:\n{transcript}" if previous
+            else f"Conversation:\n{transcript}"
+        )
+        try:
+            response = await self.client.chat_completion(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT.format(max_words=int(self.max_tokens * 0.7))},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.2,
+                max_tokens=self.max_tokens
+            )
+            text = (response.choices[0].message.content or "").strip()
+            if response.usage and self.usage_tracker:
+                self.usage_tracker.add_usage(
+                    response.usage.prompt_tokens, response.usage.completion_tokens, self.model,
+                    cached_tokens=cached_prompt_tokens(response.usage)
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"History summarization failed: {e}")
+            return
+
+        if not text:
+            return
+        self._summaries[key] = HistorySummary(len(turns), _turns_digest(turns), text)
+        self._summaries.move_to_end(key)
+        while len(self._summaries) > self.max_entries:
+            self._summaries.popitem(last=False)
+        self.summaries_created += 1
+        logger.info(f"Summarized {len(turns)} turns of conversation {key[:24]}")
+
+    async def shutdown(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "model": self.model,
+            "cached_summaries": len(self._summaries),
+            "in_progress": len(self._tasks),
+            "summaries_created": self.summaries_created,
+            "turns_replaced": self.turns_replaced,
+            "failures": self.failures
+        }
@@ -0,0 +1,63 @@
+"""Token counting helpers shared by chunking, batching and prompt packing."""
+import logging
+from functools import lru_cache
+from typing import Any
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None  # Fallback to a character-based estimate
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for English text when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+_estimating = False
+
+
+def _use_estimate(reason: str) -> None:
+    global _estimating
+    if not _estimating:
+        _estimating = True
+        logger.warning(f"Estimating token counts at {CHARS_PER_TOKEN} characters per token: {reason}")
+
+
+@lru_cache(maxsize=16)
+def _get_encoding(model: str) -> Any:
+    """
+    Resolve (and cache) the tokenizer for a model, or None if unavailable.
+    tiktoken downloads its BPE file on first use, so call `load_tokenizers`
+    off the event loop at startup rather than letting a request do it.
+    """
+    if tiktoken is None:
+        _use_estimate("tiktoken is not installed")
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        _use_estimate(f"could not load the tokenizer for {model}: {e}")
+        return None
+
+
+def load_tokenizers(*models: str) -> None:
+    """Load the tokenizers for these models, downloading them if needed. Blocking; call off the event loop."""
+    for model in models:
+        _get_encoding(model)
+
+
+def cached_prompt_tokens(usage: Any) -> int:
+    """Prompt tokens served from the provider's prompt cache, from an OpenAI usage object."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or 0
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Count tokens in text using the model's tokenizer."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,441 @@
+"""
+Vector store abstraction with Chroma and in-process NumPy backends.
+
+All backends take precomputed embeddings - embedding happens in the engine -
+and report distances as squared L2 between unit vectors (0 = identical,
+2 = orthogonal), which is what Chroma's default space returns for
+normalized OpenAI embeddings.
+"""
+import contextlib
+import json
+import logging
+import mmap
+import os
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import chromadb
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Index reads retried when a compaction replaces the data files mid-load
+_LOAD_ATTEMPTS = 3
+
+
+@dataclass
+class VectorHit:
+    """A single query match."""
+    id: str
+    document: str
+    metadata: dict[str, Any]
+    distance: float
+
+
+@dataclass
+class StoredChunks:
+    """Chunks returned by a get(): parallel lists of ids, documents and metadatas."""
+    ids: list[str] = field(default_factory=list)
+    documents: list[str] = field(default_factory=list)
+    metadatas: list[dict[str, Any]] = field(default_factory=list)
+
+
+def matches_where(metadata: dict[str, Any], where: dict[str, Any] | None) -> bool:
+    """Evaluate a simple equality filter (the subset of Chroma's 'where' the engine uses)."""
+    if not where:
+        return True
+    return all(metadata.get(key) == value for key, value in where.items())
+
+
+class VectorStore(ABC):
+    """Storage and nearest-neighbour search over chunk embeddings."""
+
+    name: str
+
+    @abstractmethod
+    def add(
+        self,
+        ids: list[str],
+        embeddings: list[list[float]],
+        documents: list[str],
+        metadatas: list[dict[str, Any]]
+    ) -> None: ...
+
+    @abstractmethod
+    def delete(self, ids: list[str] | None = None, where: dict[str, Any] | None = None) -> None: ...
+
+    @abstractmethod
+    def query(
+        self,
+        embeddings: list[list[float]],
+        n_results: int,
+        where: dict[str, Any] | None = None
+    ) -> list[list[VectorHit]]:
+        """Return the n_results nearest chunks for each query embedding, nearest first."""
+
+    @abstractmethod
+    def get(
+        self,
+        where: dict[str, Any] | None = None,
+        include_documents: bool = True,
+        limit: int | None = None,
+        offset: int = 0
+    ) -> StoredChunks: ...
+
+    @abstractmethod
+    def count(self) -> int: ...
+
+    def reload(self) -> None:
+        """Pick up changes written to disk by another process (no-op by default)."""
+
+
+class ChromaVectorStore(VectorStore):
+    """VectorStore backed by a Chroma PersistentClient collection."""
+
+    name = "chroma"
+
+    def __init__(self, persist_directory: str, collection_name: str) -> None:
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        self._open()
+
+    def _open(self) -> None:
+        self.client = chromadb.PersistentClient(path=self.persist_directory)
+        # No embedding function: vectors are always supplied by the engine
+        self.collection = self.client.get_or_create_collection(
+            name=self.collection_name,
+            embedding_function=None
+        )
+
+    def add(
+        self,
+        ids: list[str],
+        embeddings: list[list[float]],
+        documents: list[str],
+        metadatas: list[dict[str, Any]]
+    ) -> None:
+        self.collection.add(
+            ids=ids,
+            embeddings=embeddings,  # type: ignore[arg-type]
+            documents=documents,
+            metadatas=metadatas  # type: ignore[arg-type]
+        )
+
+    def delete(self, ids: list[str] | None = None, where: dict[str, Any] | None = None) -> None:
+        self.collection.delete(ids=ids, where=where)
+
+    def query(
+        self,
+        embeddings: list[list[float]],
+        n_results: int,
+        where: dict[str, Any] | None = None
+    ) -> list[list[VectorHit]]:
+        results = self.collection.query(
+            query_embeddings=embeddings,  # type: ignore[arg-type]
+            n_results=n_results,
+            where=where
+        )
+        hits: list[list[VectorHit]] = []
+        for i in range(len(embeddings)):
+            hits.append([
+                VectorHit(id=chunk_id, document=doc or "", metadata=dict(metadata or {}), distance=distance)
+                for chunk_id, doc, metadata, distance in zip(
+                    results['ids'][i],
+                    (results['documents'] or [[]])[i],
+                    (results['metadatas'] or [[]])[i],
+                    (results['distances'] or [[]])[i], strict=False
+                )
+            ])
+        return hits
+
+    def get(
+        self,
+        where: dict[str, Any] | None = None,
+        include_documents: bool = True,
+        limit: int | None = None,
+        offset: int = 0
+    ) -> StoredChunks:
+        include = ["documents", "metadatas"] if include_documents else ["metadatas"]
+        page = self.collection.get(where=where, include=include, limit=limit, offset=offset)  # type: ignore[arg-type]
+        return StoredChunks(
+            ids=list(page['ids']),
+            documents=list(page['documents'] or []),
+            metadatas=[dict(m) for m in page['metadatas'] or []]
+        )
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def reload(self) -> None:
+        # Chroma keeps HNSW segments in memory per process; drop the cached system and reopen
+        chromadb.api.client.SharedSystemClient.clear_system_cache()
+        self._open()
+
+
+def _write_at(path: Path, offset: int, payload: bytes) -> None:
+    """Write `payload` at `offset` and drop anything after it."""
+    with open(path, "r+b" if path.exists() else "wb") as f:
+        f.seek(offset)
+        f.write(payload)
+        f.truncate()
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Exact brute-force search over a memory-mapped float32 matrix.
+
+    Layout under `directory`: vectors.f32 (row-major, unit-normalized rows),
+    texts.bin (concatenated UTF-8 chunk texts, memory-mapped) and index.json
+    (ids, metadatas, text offsets, generation). Adds append after the indexed
+    rows; deletes compact the remaining rows into a new generation of data
+    files (vectors.<n>.f32, texts.<n>.bin), which the index replace switches
+    readers to. For corpora up to ~100k chunks a single matrix product beats
+    HNSW and startup is just two mmaps.
+    """
+
+    name = "numpy"
+
+    def __init__(self, directory: str) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._generation = 0
+        self._vectors_path, self._texts_path = self._data_paths(0)
+        self._index_path = self.directory / "index.json"
+        self._lock = threading.RLock()
+
+        self.dimensions = 0
+        self._ids: list[str] = []
+        self._metadatas: list[dict[str, Any]] = []
+        self._offsets: list[tuple[int, int]] = []
+        self._vectors: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+        self._texts: mmap.mmap | None = None
+        self._load()
+
+    # -- persistence -------------------------------------------------------
+
+    def _data_paths(self, generation: int) -> tuple[Path, Path]:
+        """Vector and text files of a generation; generation 0 keeps the original names."""
+        if generation == 0:
+            return self.directory / "vectors.f32", self.directory / "texts.bin"
+        return self.directory / f"vectors.{generation}.f32", self.directory / f"texts.{generation}.bin"
+
+    def _load(self) -> None:
+        with self._lock:
+            if not self._index_path.exists():
+                self.dimensions = 0
+                self._ids, self._metadatas, self._offsets = [], [], []
+                self._map_files()
+                return
+            for attempt in range(_LOAD_ATTEMPTS):
+                with open(self._index_path) as f:
+                    index = json.load(f)
+                self.dimensions = index["dimensions"]
+                self._ids = index["ids"]
+                self._metadatas = index["metadatas"]
+                self._offsets = [tuple(o) for o in index["offsets"]]  # type: ignore[misc]
+                self._generation = index.get("generation", 0)
+                self._vectors_path, self._texts_path = self._data_paths(self._generation)
+                try:
+                    self._map_files()
+                    break
+                except FileNotFoundError:
+                    # Compacted into a new generation between reading the index and mapping its files
+                    if attempt == _LOAD_ATTEMPTS - 1:
+                        raise
+            logger.info(f"Mapped NumPy vector store with {len(self._ids)} chunks")
+
+    def _map_files(self) -> None:
+        """(Re)map the data files for the current row count."""
+        if self._texts is not None:
+            self._texts.close()
+            self._texts = None
+
+        rows = len(self._ids)
+        if rows and self.dimensions:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimensions))
+        else:
+            self._vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+
+        # Indexed text must be there; a missing file means a newer generation replaced it
+        if rows and sum(self._offsets[-1]) > 0:
+            with open(self._texts_path, "rb") as f:
+                self._texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _write_index(self) -> None:
+        tmp_path = self._index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "dimensions": self.dimensions,
+                "generation": self._generation,
+                "ids": self._ids,
+                "metadatas": self._metadatas,
+                "offsets": self._offsets
+            }, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _text(self, row: int) -> str:
+        start, length = self._offsets[row]
+        if self._texts is None:
+            return ""
+        return self._texts[start:start + length].decode("utf-8")
+
+    # -- VectorStore -------------------------------------------------------
+
+    def add(
+        self,
+        ids: list[str],
+        embeddings: list[list[float]],
+        documents: list[str],
+        metadatas: list[dict[str, Any]]
+    ) -> None:
+        if not ids:
+            return
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            existing = set(ids) & set(self._ids)
+            if existing:
+                self.delete(ids=list(existing))
+            if not self.dimensions:
+                self.dimensions = matrix.shape[1]
+            elif matrix.shape[1] != self.dimensions:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match store ({self.dimensions})")
+
+            # Write after the rows the index knows about, not at the end of the files: an add that
+            # crashed before its index write leaves rows behind that must not shift later ones
+            rows = len(self._ids)
+            text_offset = sum(self._offsets[-1]) if self._offsets else 0
+            encoded = [doc.encode("utf-8") for doc in documents]
+            _write_at(self._texts_path, text_offset, b"".join(encoded))
+            _write_at(self._vectors_path, rows * self.dimensions * 4, matrix.tobytes())
+
+            for chunk_id, data, metadata in zip(ids, encoded, metadatas, strict=True):
+                self._ids.append(chunk_id)
+                self._metadatas.append(dict(metadata))
+                self._offsets.append((text_offset, len(data)))
+                text_offset += len(data)
+
+            try:
+                self._write_index()
+            except BaseException:
+                del self._ids[rows:], self._metadatas[rows:], self._offsets[rows:]
+                raise
+            self._map_files()
+
+    def delete(self, ids: list[str] | None = None, where: dict[str, Any] | None = None) -> None:
+        with self._lock:
+            remove_ids = set(ids or [])
+            keep = [
+                row for row, (chunk_id, metadata) in enumerate(zip(self._ids, self._metadatas, strict=True))
+                if chunk_id not in remove_ids and not (where and matches_where(metadata, where))
+            ]
+            if len(keep) == len(self._ids):
+                return
+            self._rewrite(keep)
+
+    def _rewrite(self, keep: list[int]) -> None:
+        """
+        Compact the data files down to the given rows. They are written as a new
+        generation and switched to by the index write, so a reader never maps
+        compacted data against the old row offsets.
+        """
+        vectors = np.array(self._vectors[keep], dtype=np.float32) if keep else np.zeros((0, self.dimensions))
+        texts = [self._text(row).encode("utf-8") for row in keep]
+
+        self._ids = [self._ids[row] for row in keep]
+        self._metadatas = [self._metadatas[row] for row in keep]
+        self._offsets = []
+        offset = 0
+        for data in texts:
+            self._offsets.append((offset, len(data)))
+            offset += len(data)
+
+        previous = (self._vectors_path, self._texts_path)
+        self._generation += 1
+        self._vectors_path, self._texts_path = self._data_paths(self._generation)
+        for path, payload in ((self._vectors_path, vectors.astype(np.float32).tobytes()), (self._texts_path, b"".join(texts))):
+            with open(path, "wb") as f:
+                f.write(payload)
+
+        self._write_index()
+        self._map_files()
+        # Readers that mapped the previous generation keep their (unlinked) copy until they reload
+        for path in previous:
+            with contextlib.suppress(OSError):
+                path.unlink(missing_ok=True)
+
+    def query(
+        self,
+        embeddings: list[list[float]],
+        n_results: int,
+        where: dict[str, Any] | None = None
+    ) -> list[list[VectorHit]]:
+        with self._lock:
+            if not self._ids:
+                return [[] for _ in embeddings]
+
+            queries = np.asarray(embeddings, dtype=np.float32)
+            queries /= np.where((norms := np.linalg.norm(queries, axis=1, keepdims=True)) == 0, 1, norms)
+
+            rows = np.arange(len(self._ids))
+            if where:
+                rows = np.array([r for r in rows if matches_where(self._metadatas[r], where)], dtype=np.int64)
+                if rows.size == 0:
+                    return [[] for _ in embeddings]
+            matrix = self._vectors if not where else self._vectors[rows]
+
+            # One matrix product scores every chunk against every query
+            similarities = queries @ matrix.T
+            k = min(n_results, similarities.shape[1])
+
+            hits: list[list[VectorHit]] = []
+            for scores in similarities:
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                hits.append([
+                    VectorHit(
+                        id=self._ids[int(rows[i])],
+                        document=self._text(int(rows[i])),
+                        metadata=dict(self._metadatas[int(rows[i])]),
+                        distance=float(2.0 - 2.0 * scores[i])
+                    )
+                    for i in top
+                ])
+            return hits
+
+    def get(
+        self,
+        where: dict[str, Any] | None = None,
+        include_documents: bool = True,
+        limit: int | None = None,
+        offset: int = 0
+    ) -> StoredChunks:
+        with self._lock:
+            rows = [r for r in range(len(self._ids)) if matches_where(self._metadatas[r], where)]
+            rows = rows[offset:offset + limit if limit is not None else None]
+            return StoredChunks(
+                ids=[self._ids[r] for r in rows],
+                documents=[self._text(r) for r in rows] if include_documents else [],
+                metadatas=[dict(self._metadatas[r]) for r in rows]
+            )
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def reload(self) -> None:
+        # Appends never move existing rows and compaction writes a new generation, so a re-read is consistent
+        self._load()
+
+
+def create_vector_store(backend: str, persist_directory: str, collection_name: str) -> VectorStore:
+    """Instantiate the configured vector store backend."""
+    if backend == "numpy":
+        return NumpyVectorStore(str(Path(persist_directory) / f"numpy_{collection_name}"))
+    if backend == "chroma":
+        return ChromaVectorStore(persist_directory, collection_name)
+    raise ValueError(f"Unknown vector store backend: {backend}")
@@ -0,0 +1,51 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from rag.attachment_store import AttachmentStore, StoredAttachment
+
+
+def store_json(store: AttachmentStore, payload: bytes) -> StoredAttachment:
+    digest = hashlib.sha256(payload).hexdigest()
+    upload = store.upload_path("token", "data.json")
+    upload.write_bytes(payload)
+    attachment = StoredAttachment(digest, "data.json", "application/json", "document", len(payload), text="x")
+    store.put(attachment, upload)
+    return attachment
+
+
+def test_json_attachment_round_trips(tmp_path: Path) -> None:
+    store = AttachmentStore(str(tmp_path), ttl_seconds=3600)
+    payload = json.dumps({"rows": [1, 2, 3]}).encode()
+
+    attachment = store_json(store, payload)
+
+    assert store.blob_path(attachment.id, attachment.filename).read_bytes() == payload
+    assert store.get(attachment.id) == attachment
+
+
+def test_sweep_only_reads_sidecars(tmp_path: Path) -> None:
+    store = AttachmentStore(str(tmp_path), ttl_seconds=3600)
+    attachment = store_json(store, b'{"kept": true}')
+    in_progress = store.upload_path("other", "upload.json")
+    in_progress.write_bytes(b"{}")
+
+    assert store.sweep() == 0
+
+    assert store.get(attachment.id) == attachment
+    assert in_progress.exists()
+
+
+def test_sweep_removes_expired_attachment(tmp_path: Path) -> None:
+    store = AttachmentStore(str(tmp_path), ttl_seconds=60)
+    attachment = store_json(store, b'{"expired": true}')
+    stale = time.time() - 120
+    for path in tmp_path.iterdir():
+        os.utime(path, (stale, stale))
+
+    assert store.sweep() == 1
+
+    assert list(tmp_path.iterdir()) == []
+    assert store.get(attachment.id) is None
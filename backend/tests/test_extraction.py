@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import pytest
+
+from rag import extraction
+from rag.extraction import DocumentExtractor, ExtractionError
+
+# Stand-ins for the PDF functions; module level so spawned workers can import them.
+# "long" has 3 page ranges of 0.6s, "hang" never finishes, anything else is quick.
+PAGE_SECONDS = {"long": 0.6, "hang": 60.0}
+
+
+def fake_count_pdf_pages(file_path: str) -> int:
+    return 3 if file_path.startswith("long") else 1
+
+
+def fake_extract_pdf_pages(file_path: str, start: int, stop: int) -> list[str]:
+    time.sleep(PAGE_SECONDS.get(file_path.removesuffix(".pdf"), 0.05))
+    return [f"{file_path} page {page}" for page in range(start, stop)]
+
+
+@pytest.fixture
+def extractor(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(extraction, "count_pdf_pages", fake_count_pdf_pages)
+    monkeypatch.setattr(extraction, "extract_pdf_pages", fake_extract_pdf_pages)
+    # One worker, so everything queues behind the long file; its 1.8s in total
+    # is over the timeout, but no single task is
+    extractor = DocumentExtractor(max_workers=1, timeout_seconds=1.0, memory_limit_mb=0, pdf_pages_per_task=1)
+    yield extractor
+    extractor.shutdown()
+
+
+def test_queueing_behind_a_long_file_does_not_count_against_the_timeout(extractor: DocumentExtractor) -> None:
+    async def run() -> list[str]:
+        # Start the pool first, so worker start-up isn't part of what's measured
+        await extractor.extract("warm.pdf")
+        return await asyncio.gather(extractor.extract("long.pdf"), extractor.extract("short.pdf"))
+
+    long_text, short_text = asyncio.run(run())
+
+    assert long_text.splitlines() == [f"long.pdf page {page}" for page in range(3)]
+    assert short_text == "short.pdf page 0"
+
+
+def test_timeout_fails_only_the_slow_file(extractor: DocumentExtractor) -> None:
+    async def run() -> list[str | BaseException]:
+        await extractor.extract("warm.pdf")
+        pool = extractor._pool
+        results = await asyncio.gather(
+            extractor.extract("hang.pdf"), extractor.extract("short.pdf"), return_exceptions=True
+        )
+        assert extractor._pool is pool  # The worker survived the timeout
+        return results
+
+    hung, short = asyncio.run(run())
+
+    assert isinstance(hung, ExtractionError)
+    assert "timed out" in str(hung)
+    assert short == "short.pdf page 0"
@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import pytest
+
+from rag.vector_store import NumpyVectorStore
+
+EMBEDDINGS = {"a": [1.0, 0.0, 0.0], "b": [0.0, 1.0, 0.0], "c": [0.0, 0.0, 1.0]}
+
+
+def fill(store: NumpyVectorStore) -> None:
+    store.add(
+        ids=list(EMBEDDINGS),
+        embeddings=list(EMBEDDINGS.values()),
+        documents=[f"text of {chunk_id}" for chunk_id in EMBEDDINGS],
+        metadatas=[{"source": chunk_id} for chunk_id in EMBEDDINGS]
+    )
+
+
+def nearest(store: NumpyVectorStore, chunk_id: str) -> tuple[str, str]:
+    hit = store.query([EMBEDDINGS[chunk_id]], n_results=1)[0][0]
+    return hit.id, hit.document
+
+
+def test_follower_reload_during_compaction(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    leader = NumpyVectorStore(str(tmp_path))
+    fill(leader)
+    follower = NumpyVectorStore(str(tmp_path))
+
+    # The leader compacts after the follower has read the index but before it maps the data files
+    map_files = follower._map_files
+    compacted = False
+
+    def compact_then_map() -> None:
+        nonlocal compacted
+        if not compacted:
+            compacted = True
+            leader.delete(ids=["a"])
+        map_files()
+
+    monkeypatch.setattr(follower, "_map_files", compact_then_map)
+    follower.reload()
+
+    assert follower.count() == 2
+    assert nearest(follower, "b") == ("b", "text of b")
+    assert nearest(follower, "c") == ("c", "text of c")
+
+
+def test_compaction_replaces_previous_generation(tmp_path: Path) -> None:
+    leader = NumpyVectorStore(str(tmp_path))
+    fill(leader)
+    follower = NumpyVectorStore(str(tmp_path))
+
+    leader.delete(ids=["b"])
+    leader.add(ids=["d"], embeddings=[[1.0, 1.0, 0.0]], documents=["text of d"], metadatas=[{"source": "d"}])
+
+    # Mapped before the compaction, the follower still answers from the old generation
+    assert nearest(follower, "b") == ("b", "text of b")
+    follower.reload()
+    assert follower.count() == 3
+    assert nearest(follower, "c") == ("c", "text of c")
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["index.json", "texts.1.bin", "vectors.1.f32"]
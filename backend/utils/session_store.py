@@ -0,0 +1,183 @@
+"""Persistent chat sessions in an async SQL database, with an in-memory cache of hot sessions."""
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import Float, ForeignKey, Integer, String, Text, UniqueConstraint, delete, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+logger = logging.getLogger(__name__)
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class ChatSession(Base):
+    __tablename__ = "chat_sessions"
+
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    created_at: Mapped[float] = mapped_column(Float, nullable=False)
+    updated_at: Mapped[float] = mapped_column(Float, nullable=False)
+    turn_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class ChatTurn(Base):
+    __tablename__ = "chat_turns"
+    __table_args__ = (UniqueConstraint("session_id", "seq"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    session_id: Mapped[str] = mapped_column(
+        String(64), ForeignKey("chat_sessions.id", ondelete="CASCADE"), index=True, nullable=False
+    )
+    seq: Mapped[int] = mapped_column(Integer, nullable=False)
+    role: Mapped[str] = mapped_column(String(16), nullable=False)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+class SessionStore:
+    """
+    Conversation turns keyed by session ID.
+
+    Hot sessions are kept in an LRU so loading history costs one primary-key
+    lookup of the turn count, however long the conversation is. If another
+    worker appended turns in the meantime, only the missing ones are read.
+    """
+
+    def __init__(self, database_url: str, cache_size: int) -> None:
+        self.database_url = database_url
+        self.cache_size = cache_size
+        self._engine: AsyncEngine | None = None
+        self._sessionmaker: async_sessionmaker[Any] | None = None
+        self._cache: OrderedDict[str, list[dict[str, str]]] = OrderedDict()
+        self._locks: dict[str, asyncio.Lock] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    async def initialize(self) -> None:
+        url = make_url(self.database_url)
+        if url.get_backend_name() == "sqlite" and url.database and url.database != ":memory:":
+            Path(url.database).parent.mkdir(parents=True, exist_ok=True)
+        self._engine = create_async_engine(self.database_url, pool_pre_ping=True)
+        self._sessionmaker = async_sessionmaker(self._engine, expire_on_commit=False)
+        async with self._engine.begin() as conn:
+            if url.get_backend_name() == "sqlite":
+                await conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+            await conn.run_sync(Base.metadata.create_all)
+        logger.info(f"Session store ready ({url.get_backend_name()})")
+
+    def _db(self) -> Any:
+        if self._sessionmaker is None:
+            raise RuntimeError("Session store not initialized")
+        return self._sessionmaker()
+
+    def _lock(self, session_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(session_id, asyncio.Lock())
+
+    def _remember(self, session_id: str, turns: list[dict[str, str]]) -> None:
+        self._cache[session_id] = turns
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            evicted, _ = self._cache.popitem(last=False)
+            lock = self._locks.get(evicted)
+            if lock is not None and not lock.locked():
+                del self._locks[evicted]
+
+    async def create(self, session_id: str | None = None) -> str:
+        """Create an empty session (with a generated ID unless one is given)."""
+        session_id = session_id or uuid.uuid4().hex
+        now = time.time()
+        async with self._db() as db, db.begin():
+            db.add(ChatSession(id=session_id, created_at=now, updated_at=now, turn_count=0))
+        self._remember(session_id, [])
+        return session_id
+
+    async def get_history(self, session_id: str) -> list[dict[str, str]] | None:
+        """Return the session's turns in order, or None if it doesn't exist."""
+        async with self._lock(session_id):
+            async with self._db() as db:
+                turn_count = await db.scalar(select(ChatSession.turn_count).where(ChatSession.id == session_id))
+                if turn_count is None:
+                    self._cache.pop(session_id, None)
+                    self._locks.pop(session_id, None)
+                    return None
+
+                cached = self._cache.get(session_id)
+                if cached is not None and len(cached) == turn_count:
+                    self.cache_hits += 1
+                    self._cache.move_to_end(session_id)
+                    return list(cached)
+
+                self.cache_misses += 1
+                known = cached if cached is not None and len(cached) < turn_count else []
+                rows = await db.execute(
+                    select(ChatTurn.role, ChatTurn.content)
+                    .where(ChatTurn.session_id == session_id, ChatTurn.seq >= len(known))
+                    .order_by(ChatTurn.seq)
+                )
+                turns = known + [{"role": role, "content": content} for role, content in rows]
+            self._remember(session_id, turns)
+            return list(turns)
+
+    async def append(self, session_id: str, turns: list[dict[str, str]]) -> None:
+        """Append turns to a session, creating it if needed."""
+        if not turns:
+            return
+        async with self._lock(session_id):
+            now = time.time()
+            async with self._db() as db, db.begin():
+                session = await db.get(ChatSession, session_id, with_for_update=True)
+                if session is None:
+                    session = ChatSession(id=session_id, created_at=now, updated_at=now, turn_count=0)
+                    db.add(session)
+                    await db.flush()
+                start = session.turn_count
+                db.add_all(
+                    ChatTurn(session_id=session_id, seq=start + i, role=turn["role"], content=turn["content"], created_at=now)
+                    for i, turn in enumerate(turns)
+                )
+                await db.execute(
+                    update(ChatSession)
+                    .where(ChatSession.id == session_id)
+                    .values(turn_count=start + len(turns), updated_at=now)
+                )
+
+            cached = self._cache.get(session_id)
+            if cached is not None and len(cached) == start:
+                cached.extend(dict(turn) for turn in turns)
+                self._cache.move_to_end(session_id)
+            else:
+                # Out of step with another worker; reload on next read
+                self._cache.pop(session_id, None)
+
+    async def delete(self, session_id: str) -> bool:
+        """Delete a session and its turns. Returns False if it didn't exist."""
+        async with self._lock(session_id):
+            async with self._db() as db, db.begin():
+                await db.execute(delete(ChatTurn).where(ChatTurn.session_id == session_id))
+                result = await db.execute(delete(ChatSession).where(ChatSession.id == session_id))
+            self._cache.pop(session_id, None)
+        self._locks.pop(session_id, None)
+        return bool(result.rowcount)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "cached_sessions": len(self._cache),
+            "cache_size": self.cache_size,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "hit_rate": round(self.cache_hits / lookups, 3) if lookups else 0.0
+        }
+
+    async def close(self) -> None:
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
@@ -0,0 +1,312 @@
+"""Append-only SQLite ledger of OpenAI token usage with precomputed daily aggregates."""
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+USAGE_FIELDS = (
+    "prompt_tokens", "completion_tokens", "total_tokens", "requests", "cost_eur", "cached_tokens", "cache_savings_eur"
+)
+
+# Columns added after the first release of the ledger: (name, SQL type and default)
+_ADDED_COLUMNS = (
+    ("cached_tokens", "INTEGER NOT NULL DEFAULT 0"),
+    ("cache_savings_eur", "REAL NOT NULL DEFAULT 0"),
+)
+
+
+def empty_usage() -> dict[str, Any]:
+    return {name: 0.0 if name.endswith("_eur") else 0 for name in USAGE_FIELDS}
+
+
+@dataclass
+class UsageRecord:
+    """Usage of a single completion request."""
+    timestamp: float
+    day: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    cost_eur: float
+    cached_tokens: int = 0
+    cache_savings_eur: float = 0.0
+
+    def add_to(self, usage: dict[str, Any]) -> None:
+        """Accumulate this record into an aggregate dict."""
+        usage["prompt_tokens"] += self.prompt_tokens
+        usage["completion_tokens"] += self.completion_tokens
+        usage["total_tokens"] += self.prompt_tokens + self.completion_tokens
+        usage["requests"] += 1
+        usage["cost_eur"] += self.cost_eur
+        usage["cached_tokens"] += self.cached_tokens
+        usage["cache_savings_eur"] += self.cache_savings_eur
+
+
+class UsageLedger:
+    """
+    Per-request usage records in SQLite (WAL), safe for several server processes.
+
+    Records are buffered in memory and written by a background thread in one
+    transaction per flush interval, so callers never wait on disk. The same
+    transaction folds them into `daily_usage`, which is what readers query.
+    Ledger rows older than `retention_days` are compacted into
+    `usage_snapshot`, and `daily_usage` is rebuilt from snapshot plus ledger
+    at startup.
+    """
+
+    def __init__(self, path: str, flush_interval_seconds: float = 1.0, retention_days: int = 90) -> None:
+        self.path = Path(path)
+        self.flush_interval_seconds = flush_interval_seconds
+        self.retention_days = retention_days
+        self._pending: list[UsageRecord] = []
+        self._pending_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._last_compaction = 0.0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS usage_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp REAL NOT NULL,
+                day TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                cost_eur REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_usage_events_day ON usage_events (day);
+            CREATE TABLE IF NOT EXISTS usage_snapshot (
+                day TEXT PRIMARY KEY,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                total_tokens INTEGER NOT NULL,
+                requests INTEGER NOT NULL,
+                cost_eur REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS daily_usage (
+                day TEXT PRIMARY KEY,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                total_tokens INTEGER NOT NULL,
+                requests INTEGER NOT NULL,
+                cost_eur REAL NOT NULL
+            );
+            """
+        )
+        self._add_missing_columns()
+        self._conn.commit()
+        self.rebuild_aggregates()
+
+        self._thread = threading.Thread(target=self._flush_loop, name="usage-ledger", daemon=True)
+        self._thread.start()
+
+    def _add_missing_columns(self) -> None:
+        """Upgrade tables created by an older version in place."""
+        for table in ("usage_events", "usage_snapshot", "daily_usage"):
+            existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            for name, definition in _ADDED_COLUMNS:
+                if name not in existing:
+                    try:
+                        self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+                    except sqlite3.OperationalError as e:
+                        # Another worker added it first
+                        if "duplicate column" not in str(e):
+                            raise
+
+    # -- writes ------------------------------------------------------------
+
+    def record(
+        self,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cost_eur: float,
+        cached_tokens: int = 0,
+        cache_savings_eur: float = 0.0
+    ) -> None:
+        """Buffer a usage record; it reaches the database on the next flush."""
+        now = time.time()
+        record = UsageRecord(
+            timestamp=now,
+            day=datetime.fromtimestamp(now).strftime("%Y-%m-%d"),
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cost_eur=cost_eur,
+            cached_tokens=cached_tokens,
+            cache_savings_eur=cache_savings_eur
+        )
+        with self._pending_lock:
+            self._pending.append(record)
+
+    def flush(self) -> int:
+        """Write buffered records and update the daily aggregates in one transaction."""
+        with self._pending_lock:
+            records, self._pending = self._pending, []
+        if not records:
+            return 0
+
+        try:
+            with self._db_lock, self._conn:
+                self._conn.executemany(
+                    "INSERT INTO usage_events (timestamp, day, model, prompt_tokens, completion_tokens, cost_eur, "
+                    "cached_tokens, cache_savings_eur) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (r.timestamp, r.day, r.model, r.prompt_tokens, r.completion_tokens, r.cost_eur,
+                         r.cached_tokens, r.cache_savings_eur)
+                        for r in records
+                    ]
+                )
+                self._conn.executemany(
+                    f"""
+                    INSERT INTO daily_usage (day, {', '.join(USAGE_FIELDS)})
+                    VALUES (?, ?, ?, ?, 1, ?, ?, ?)
+                    ON CONFLICT(day) DO UPDATE SET
+                        {', '.join(f'{name} = {name} + excluded.{name}' for name in USAGE_FIELDS)}
+                    """,
+                    [
+                        (r.day, r.prompt_tokens, r.completion_tokens, r.prompt_tokens + r.completion_tokens,
+                         r.cost_eur, r.cached_tokens, r.cache_savings_eur)
+                        for r in records
+                    ]
+                )
+        except Exception as e:
+            # Keep the records for the next attempt rather than losing usage
+            logger.error(f"Failed to flush {len(records)} usage records: {e}")
+            with self._pending_lock:
+                self._pending[:0] = records
+            return 0
+        return len(records)
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval_seconds):
+            self.flush()
+            if time.time() - self._last_compaction > 3600:
+                self.compact()
+
+    def compact(self) -> None:
+        """Fold ledger rows past the retention window into the snapshot table."""
+        self._last_compaction = time.time()
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+        try:
+            with self._db_lock, self._conn:
+                self._conn.execute(
+                    f"""
+                    INSERT INTO usage_snapshot (day, {', '.join(USAGE_FIELDS)})
+                    SELECT day, SUM(prompt_tokens), SUM(completion_tokens), SUM(prompt_tokens + completion_tokens),
+                           COUNT(*), SUM(cost_eur), SUM(cached_tokens), SUM(cache_savings_eur)
+                    FROM usage_events WHERE day < ? GROUP BY day
+                    ON CONFLICT(day) DO UPDATE SET
+                        {', '.join(f'{name} = {name} + excluded.{name}' for name in USAGE_FIELDS)}
+                    """,
+                    (cutoff,)
+                )
+                removed = self._conn.execute("DELETE FROM usage_events WHERE day < ?", (cutoff,)).rowcount
+            if removed:
+                logger.info(f"Compacted {removed} usage records older than {cutoff}")
+        except Exception as e:
+            logger.error(f"Usage ledger compaction failed: {e}")
+
+    def rebuild_aggregates(self) -> None:
+        """Recompute daily_usage from the compacted snapshot plus the ledger."""
+        with self._db_lock, self._conn:
+            self._conn.execute("DELETE FROM daily_usage")
+            self._conn.execute(
+                f"""
+                INSERT INTO daily_usage (day, {', '.join(USAGE_FIELDS)})
+                SELECT day, {', '.join(f'SUM({name})' for name in USAGE_FIELDS)}
+                FROM (
+                    SELECT day, {', '.join(USAGE_FIELDS)} FROM usage_snapshot
+                    UNION ALL
+                    SELECT day, prompt_tokens, completion_tokens, prompt_tokens + completion_tokens, 1, cost_eur,
+                           cached_tokens, cache_savings_eur
+                    FROM usage_events
+                )
+                GROUP BY day
+                """
+            )
+
+    def import_snapshot(self, daily_usage: dict[str, dict[str, Any]]) -> bool:
+        """
+        Seed an empty ledger with per-day totals from an older store.
+        Returns False (and imports nothing) if the ledger already has data.
+        """
+        with self._db_lock, self._conn:
+            has_data = self._conn.execute(
+                "SELECT EXISTS(SELECT 1 FROM usage_snapshot) OR EXISTS(SELECT 1 FROM usage_events)"
+            ).fetchone()[0]
+            if has_data:
+                return False
+            self._conn.executemany(
+                f"INSERT INTO usage_snapshot (day, {', '.join(USAGE_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' * len(USAGE_FIELDS))})",
+                [
+                    (day, *(usage.get(name, 0) for name in USAGE_FIELDS))
+                    for day, usage in daily_usage.items()
+                ]
+            )
+        self.rebuild_aggregates()
+        return True
+
+    def reset(self) -> None:
+        """Delete all usage data."""
+        with self._pending_lock:
+            self._pending.clear()
+        with self._db_lock, self._conn:
+            self._conn.execute("DELETE FROM usage_events")
+            self._conn.execute("DELETE FROM usage_snapshot")
+            self._conn.execute("DELETE FROM daily_usage")
+
+    def close(self) -> None:
+        """Stop the flush thread and write anything still buffered."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+    # -- reads -------------------------------------------------------------
+
+    def daily_usage(self, since_day: str | None = None) -> dict[str, dict[str, Any]]:
+        """Per-day aggregates, including this process's not yet flushed records."""
+        with self._db_lock:
+            rows = self._conn.execute(
+                f"SELECT day, {', '.join(USAGE_FIELDS)} FROM daily_usage WHERE day >= ?",
+                (since_day or "",)
+            ).fetchall()
+        days = {row[0]: dict(zip(USAGE_FIELDS, row[1:], strict=True)) for row in rows}
+
+        with self._pending_lock:
+            pending = list(self._pending)
+        for r in pending:
+            if since_day and r.day < since_day:
+                continue
+            r.add_to(days.setdefault(r.day, empty_usage()))
+        return days
+
+    def totals(self) -> dict[str, Any]:
+        """All-time totals, including this process's not yet flushed records."""
+        with self._db_lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(f'COALESCE(SUM({name}), 0)' for name in USAGE_FIELDS)} FROM daily_usage"
+            ).fetchone()
+        totals = dict(zip(USAGE_FIELDS, row, strict=True))
+
+        with self._pending_lock:
+            pending = list(self._pending)
+        for r in pending:
+            r.add_to(totals)
+        return totals